@@ -0,0 +1,80 @@
+import os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+from card_codec import DecodeText
+
+# Benchmark: card pass decoding per tap
+# Compares the old hex-string round trip from getCardPass with card_codec.
+# Runs on the host (CPython + tracemalloc) or on the Pico itself (gc.mem_alloc
+# with the garbage collector disabled).
+TAPS = 2000
+
+
+def OldGetCardPass(raw):
+    data = [hex(x)[2:] for x in raw]
+    return f"{bytearray.fromhex(''.join(data)+'0').decode() if len(''.join(data))%2 else bytearray.fromhex(''.join(data)).decode()}".replace("\x00","")
+
+
+pass_text = bytearray(16)
+
+def NewGetCardPass(raw):
+    return DecodeText(raw, into=pass_text)
+
+
+def Allocated(decode, raw):
+    try:
+        import tracemalloc
+    except ImportError:
+        tracemalloc = None
+
+    decode(raw)  # warm up (imports, caches)
+    if tracemalloc:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        decode(raw)
+        allocated = tracemalloc.get_traced_memory()[1] - base
+        tracemalloc.stop()
+    else:
+        import gc
+        gc.collect()
+        gc.disable()
+        before = gc.mem_alloc()
+        decode(raw)
+        allocated = gc.mem_alloc() - before
+        gc.enable()
+
+    return allocated
+
+
+def Measure(name, decode, raw):
+    # The cost of an empty call (frame, arguments) is subtracted
+    allocated = Allocated(decode, raw) - Allocated(lambda raw: None, raw)
+    memory = f"{allocated} bytes/tap"
+
+    started = time.monotonic_ns()
+    for i in range(TAPS):
+        decode(raw)
+    us = (time.monotonic_ns() - started) / TAPS / 1000
+
+    print(f"{name:<12} {memory:<28} {us:.1f} us/tap")
+
+
+def Block(text):
+    return bytearray(text) + bytearray(16 - len(text))
+
+
+print("Correctness (pass contains a tab = 0x09):")
+raw = Block(b"DevPass42\tabc")
+try:
+    old = OldGetCardPass(raw)
+except Exception as e:
+    old = f"<{type(e).__name__}>"
+print(f"  old: {old!r}")
+print(f"  new: {NewGetCardPass(raw)!r}")
+print()
+
+raw = Block(b"DevPass42")
+print(f"Decoding a 16 byte pass, {TAPS} taps:")
+Measure("hex strings", OldGetCardPass, raw)
+Measure("card_codec", NewGetCardPass, raw)
@@ -0,0 +1,166 @@
+import os, sys, io, random
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+
+# Benchmark: card detection latency
+# Compares the 0.5 s read_passive_target() loop with IRQ based detection
+# (CardWatcher) on a simulated PN532. Everything runs on a simulated clock, so
+# the numbers are the model below and not a measurement of real hardware:
+# - every I2C frame takes I2C_FRAME seconds
+# - while the host waits for a PN532 response it checks the status byte every
+#   10 ms over I2C (like adafruit_pn532 _wait_ready)
+# - the PN532 needs ACTIVATE seconds to select a card once it sees one
+# - between detection attempts the scanner runs mqtt_client.loop() (IDLE seconds),
+#   in the asyncio scanner the watcher checks every CardWatcher.step seconds
+#   (the IRQ pin, or the status byte over I2C without one) and MQTT runs in its
+#   own task in between
+# Next to the tap latency it shows how much I2C traffic waiting for a card costs
+# and the longest time MQTT went without being serviced while waiting.
+#
+# Usage: python Benchmarks/bench_card_detect.py [taps] [idle seconds]
+TAPS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+IDLE = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+I2C_FRAME = 0.001
+ACTIVATE = 0.005
+STATUS_POLL = 0.01
+UID = bytearray([4, 23, 188, 12])
+
+
+class SimClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def monotonic_ns(self):
+        return int(self.now * 1000000000)
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class SimPin:
+    def __init__(self, reader):
+        self.reader = reader
+
+    @property
+    def value(self):
+        # IRQ is active low
+        return not self.reader.irq_low()
+
+
+class SimReader:
+    def __init__(self, clock):
+        self.clock = clock
+        self.arrival = None  # time the next card enters the field
+        self.search = None  # (command, started, period) of a pending search
+        self.i2c = 0
+
+    def _frame(self, frames=1):
+        self.i2c += frames
+        self.clock.now += frames * I2C_FRAME
+
+    def _found_at(self):
+        # When the pending search finds the card (None = not yet known)
+        command, started, period = self.search
+        begin = max(started, self.arrival)
+        if period:
+            ticks = -(-(begin - started) // period)
+            begin = started + ticks * period
+        return begin + ACTIVATE
+
+    def irq_low(self):
+        return self.search is not None and self._found_at() <= self.clock.now
+
+    def _wait_ready(self, timeout=1):
+        # Status byte over I2C (CardWatcher without an IRQ pin)
+        self._frame()
+        return self.irq_low()
+
+    # Software polling (read_passive_target)
+    def read_passive_target(self, timeout=1):
+        self._frame(2)  # command + ACK
+        started = self.clock.now
+        found = max(started, self.arrival) + ACTIVATE
+        if found <= started + timeout:
+            self.i2c += int((found - started) / STATUS_POLL) + 1
+            self.clock.now = found
+            self._frame()  # response
+            return UID
+        self.i2c += int(timeout / STATUS_POLL)
+        self.clock.now = started + timeout
+        return None
+
+    # IRQ based search (CardWatcher)
+    def listen_for_passive_target(self, timeout=1):
+        self._frame(2)
+        self.search = (0x4A, self.clock.now, 0)
+        return True
+
+    def send_command(self, command, params=[], timeout=1):
+        self._frame(2)
+        self.search = (command, self.clock.now, params[1] * 0.15)
+        return True
+
+    def get_passive_target(self, timeout=1):
+        self._frame()
+        self.search = None
+        return UID
+
+    def process_response(self, command, response_length=0, timeout=1):
+        self._frame()
+        self.search = None
+        return bytearray([1, 0x10, 9, 1, 0, 4, 8, len(UID)]) + UID
+
+
+def Percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def Run(name, watcher_options, asynchronous=False, pin=True):
+    import card_session, card_watcher
+    clock = SimClock()
+    card_session.time = clock
+    card_watcher.time = clock
+    reader = SimReader(clock)
+    rng = random.Random(1)
+
+    watcher = None
+    if watcher_options is not None:
+        watcher = card_watcher.CardWatcher(reader, SimPin(reader) if pin else None, **watcher_options)
+    step = watcher.step if asynchronous else None
+    serviced = [0.0, 0.0]  # [last mqtt_client.loop(), longest gap]
+
+    def idle():
+        serviced[1] = max(serviced[1], clock.now - serviced[0])
+        clock.sleep(step or IDLE)
+        serviced[0] = clock.now
+
+    session = card_session.CardSession(reader, idle=idle, watcher=watcher)
+
+    latencies = []
+    waiting, waiting_i2c = 0.0, 0
+    for tap in range(TAPS):
+        # Next card shows up 1-5 s after the previous tap was handled
+        reader.arrival = clock.now + rng.uniform(1, 5)
+        started, i2c = clock.now, reader.i2c
+        serviced[0] = clock.now
+        with redirect_stdout(io.StringIO()):
+            session.detect()
+        latencies.append((clock.now - reader.arrival) * 1000)
+        waiting += reader.arrival - started
+        waiting_i2c += reader.i2c - i2c
+        clock.sleep(0.5)  # auth, read, publish
+
+    print(f"{name:<28} p50 {Percentile(latencies, 50):6.1f} ms   p95 {Percentile(latencies, 95):6.1f} ms   max {max(latencies):6.1f} ms   I2C {waiting_i2c / waiting:5.1f} frames/s   MQTT gap {serviced[1]*1000:5.0f} ms")
+
+
+print(f"{TAPS} taps, mqtt_client.loop() = {IDLE*1000:.0f} ms, simulated PN532")
+Run("read_passive_target loop", None)
+Run("IRQ + InListPassiveTarget", {})
+Run("IRQ + InAutoPoll (150 ms)", {"autopoll": True})
+Run("IRQ pin + asyncio (1 ms)", {}, asynchronous=True)
+Run("I2C status + asyncio (20 ms)", {}, asynchronous=True, pin=False)
@@ -0,0 +1,224 @@
+import os, sys, io, random
+from contextlib import redirect_stdout
+
+folder = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(folder, "..", "lib"))
+sys.path.insert(0, os.path.join(folder, "..", "Simulation", "shim"))
+
+# Benchmark + regression: card session on the PN532 emulator
+# Runs the NFC code of the scanner (CardSession, CardWatcher) against the
+# emulated PN532 of Simulation/shim, through the same frames as the real
+# driver. Everything runs on a simulated clock, so the numbers follow the
+# emulator's timing model (see pn532_emulator.py) and not real hardware.
+#
+# First the regression part: provisioning and the read/auth/write paths on
+# cards with known keys and access bits, every case has an expected result and
+# the script exits with 1 when one changes. Then the benchmark: taps like the
+# scanner does them (detect, read the pass) for several RF error rates.
+#
+# Usage: python Benchmarks/bench_card_session.py [taps] [pass blocks]
+TAPS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+PASS_BLOCKS = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+PASS_BLOCK = 8
+FACTORY_KEY = bytearray(b"\xff" * 6)
+KEY_A = bytearray(b"SimKyA")
+KEY_B = bytearray(b"SimKyB")
+CARD_BITS = bytearray([8, 119, 143, 255])  # default_access_bits of Components Testing/NFC.py
+UID = bytes([4, 213, 6, 90])
+
+import card_session, card_watcher
+from adafruit_pn532 import i2c as pn532_i2c
+from pn532_emulator import PN532Emulator, MifareClassic
+
+
+class SimClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def monotonic_ns(self):
+        return int(self.now * 1000000000)
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class Field:
+    # The card in front of the reader between `arrival` and `departure`
+    def __init__(self, clock):
+        self.clock = clock
+        self.card = None
+        self.arrival = 0.0
+        self.departure = float("inf")
+
+    def __call__(self):
+        if self.card is not None and self.arrival <= self.clock.now < self.departure:
+            return self.card
+        return None
+
+
+def Setup(latency=None, rf_errors=0, seed=1):
+    clock = SimClock()
+    card_session.time = clock
+    card_watcher.time = clock
+    pn532_i2c.time = clock
+    field = Field(clock)
+    emulator = PN532Emulator(field, latency=latency, rf_errors=rf_errors, clock=clock, seed=seed)
+    nfc = pn532_i2c.PN532_I2C(None, emulator=emulator)
+    nfc.SAM_configuration()
+    watcher = card_watcher.CardWatcher(nfc, None)
+    return clock, field, emulator, nfc, card_session.CardSession(nfc, watcher=watcher)
+
+
+def ProvisionedCard():
+    card = MifareClassic(UID)
+    card.blocks[PASS_BLOCK][:] = b"DevPass42" + bytes(7)
+    for sector in range(16):
+        card.blocks[4 * sector + 3][:] = KEY_A + CARD_BITS + KEY_B
+    return card
+
+
+# -------------
+# Regression
+# -------------
+def Tap(session, field, card):
+    field.card = card
+    field.arrival = session.scanner.emulator.clock.now
+    field.departure = float("inf")
+    return session.detect()
+
+
+def CaseFactoryRead(session, field):
+    Tap(session, field, MifareClassic(UID))
+    return session.read_blocks(block=PASS_BLOCK, count=1, key_a=FACTORY_KEY) is not None
+
+
+def CaseFactoryTrailerKeyB(session, field):
+    # Key B is readable on a factory card, so it can't be used to write the trailer
+    Tap(session, field, MifareClassic(UID))
+    return session.create_trailer(sector=3, key_b=FACTORY_KEY, new_key_a=KEY_A, new_key_b=KEY_B, access_bits=CARD_BITS)
+
+
+def CaseShortKey(session, field):
+    # Create Card's "factory default" key_b is only 4 bytes long
+    card = MifareClassic(UID)
+    Tap(session, field, card)
+    return session.authenticate(block=PASS_BLOCK, key=bytearray([255, 255, 255, 255]), b=True)
+
+
+def CaseRekeyAndWrite(session, field):
+    # Provisioned card gets new keys, then the pass is written and read back with them
+    card = ProvisionedCard()
+    Tap(session, field, card)
+    new_a, new_b = bytearray(b"NewKyA"), bytearray(b"NewKyB")
+    if not session.create_trailer(sector=3, key_b=KEY_B, new_key_a=new_a, new_key_b=new_b, access_bits=CARD_BITS):
+        return False
+    if not session.write_blocks(block=PASS_BLOCK, key_b=new_b, data=b"NewPass77"):
+        return False
+    data = session.read_blocks(block=PASS_BLOCK, count=1, key_a=new_a)
+    return data is not None and bytes(data[:9]) == b"NewPass77"
+
+
+def CaseKeyAWrite(session, field):
+    # With CARD_BITS only key B may write data blocks
+    card = ProvisionedCard()
+    Tap(session, field, card)
+    session.authenticate(block=PASS_BLOCK, key=KEY_A)
+    return session._write(PASS_BLOCK, bytearray(16))
+
+
+def CaseWrongKeyThenRight(session, field):
+    # A failed authentication halts the card, the session selects it again
+    Tap(session, field, ProvisionedCard())
+    session.authenticate(block=PASS_BLOCK, key=FACTORY_KEY)
+    return session.read_blocks(block=PASS_BLOCK, count=1, key_a=KEY_A) is not None
+
+
+def CaseSpanTrailer(session, field):
+    # 4 pass blocks from block 8: 8, 9, 10, (trailer 11 skipped), 12
+    card = ProvisionedCard()
+    Tap(session, field, card)
+    if not session.write_blocks(block=PASS_BLOCK, key_b=KEY_B, data=bytes(range(64))):
+        return False
+    data = session.read_blocks(block=PASS_BLOCK, count=4, key_a=KEY_A)
+    return data is not None and bytes(data) == bytes(range(64)) and card.blocks[11][:6] == KEY_A
+
+
+def CaseMalformedBits(session, field):
+    # Access bits whose inverted copies don't match block the sector for good
+    card = ProvisionedCard()
+    Tap(session, field, card)
+    session.create_trailer(sector=3, key_b=KEY_B, new_key_a=KEY_A, new_key_b=KEY_B, access_bits=bytearray([8, 119, 142, 255]))
+    return session.read_blocks(block=PASS_BLOCK, count=1, key_a=KEY_A) is not None
+
+
+def CaseCardLeaves(session, field):
+    card = ProvisionedCard()
+    Tap(session, field, card)
+    field.departure = field.clock.now
+    return session.read_blocks(block=PASS_BLOCK, count=1, key_a=KEY_A) is not None
+
+
+CASES = [
+    ("factory card: read with factory key A", CaseFactoryRead, True),
+    ("factory card: trailer with factory key B", CaseFactoryTrailerKeyB, False),
+    ("4-byte key B (Create Card default)", CaseShortKey, False),
+    ("new keys, write and read back the pass", CaseRekeyAndWrite, True),
+    ("CARD_BITS: write a data block with key A", CaseKeyAWrite, False),
+    ("wrong key A, then the right one", CaseWrongKeyThenRight, True),
+    ("4 pass blocks over a trailer", CaseSpanTrailer, True),
+    ("malformed access bits block the sector", CaseMalformedBits, False),
+    ("card leaves the field before the read", CaseCardLeaves, False),
+]
+
+
+def Regression():
+    failed = 0
+    for name, case, expected in CASES:
+        clock, field, emulator, nfc, session = Setup()
+        with redirect_stdout(io.StringIO()):
+            result = bool(case(session, field))
+        ok = result == expected
+        failed += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name:<44} {'success' if result else 'refused'} ({clock.now * 1000:.0f} ms)")
+    return failed
+
+
+# -------------
+# Benchmark
+# -------------
+def Percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def Run(name, rf_errors):
+    clock, field, emulator, nfc, session = Setup(rf_errors=rf_errors)
+    rng = random.Random(1)
+    card = ProvisionedCard()
+    field.card = card
+    into = bytearray(PASS_BLOCKS * 16)
+    latencies, read_ok = [], 0
+    for tap in range(TAPS):
+        # A card is held in front of the reader for 0.3-1 s, 1-5 s after the previous one
+        field.arrival = clock.now + rng.uniform(1, 5)
+        field.departure = field.arrival + rng.uniform(0.3, 1)
+        with redirect_stdout(io.StringIO()):
+            session.detect()
+            data = session.read_blocks(block=PASS_BLOCK, count=PASS_BLOCKS, key_a=KEY_A, into=into)
+        if data is not None:
+            read_ok += 1
+            latencies.append((clock.now - field.arrival) * 1000)
+        clock.now = max(clock.now, field.departure)
+    print(f"{name:<12} pass read {read_ok * 100 / TAPS:5.1f}%   p50 {Percentile(latencies, 50):5.1f} ms   p95 {Percentile(latencies, 95):5.1f} ms   max {max(latencies):5.1f} ms   I2C {emulator.i2c_bytes / TAPS:5.0f} bytes/tap")
+
+
+print(f"Regression ({len(CASES)} cases)")
+failed = Regression()
+print()
+print(f"{TAPS} taps, {PASS_BLOCKS} pass block(s), emulated PN532 (status polled every 10 ms)")
+for rate in (0, 0.01, 0.05):
+    Run(f"RF errors {rate * 100:.0f}%", rate)
+sys.exit(1 if failed else 0)
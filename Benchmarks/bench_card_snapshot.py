@@ -0,0 +1,111 @@
+import os, sys, json, time, random, socket, tempfile, subprocess
+
+folder = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(folder, "..", "lib"))
+sys.path.insert(0, os.path.join(folder, "..", "Server"))
+from payload_codec import PayloadEncoder
+from access_store import AccessStore
+from card_snapshot import Build, CardSnapshot
+
+# Benchmark: decision service restart with a card snapshot
+# 1. Opening: loading the store (JSON + card file) next to mapping a snapshot,
+#    with an empty WAL and with WAL_CHANGES changes in it.
+# 2. lookup() on the snapshot (binary search) next to the loaded store (dict).
+# 3. Restart: the decision service is started as its own process, the time
+#    from starting it to the scanner.action of the first tap.
+#
+# Usage: python Benchmarks/bench_card_snapshot.py [cards] [wal changes]
+CARDS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+WAL_CHANGES = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+LOOKUPS = 100000
+USER = "bench"
+
+
+def Uid(i):
+    return bytes([4, i >> 16 & 0xFF, i >> 8 & 0xFF, i & 0xFF])
+
+
+def Timed(make):
+    started = time.perf_counter()
+    result = make()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def LookupRate(name, store):
+    rng = random.Random(1)
+    taps = [(Uid(i), f"Pass{i:08d}") for i in (rng.randrange(CARDS) for n in range(LOOKUPS))]
+    started = time.perf_counter()
+    allowed = sum(store.lookup(uid, card_pass) is not None for uid, card_pass in taps)
+    seconds = time.perf_counter() - started
+    print(f"lookup {name:<9} {LOOKUPS / seconds:9.0f} /s   {seconds / LOOKUPS * 1000000:4.1f} us   {allowed} allowed")
+
+
+def FreePort():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def Restart(name, port, args):
+    # Starts the service and taps until the first answer comes back
+    tap = PayloadEncoder().checkcard(Uid(1), "Pass00000001", "10.0.0.1", request_id="first", reply=USER + "/feeds/scanner.action-bench").encode()
+    client = socket.create_connection(("127.0.0.1", port))
+    client.sendall((json.dumps({"op": "sub", "topic": USER + "/feeds/scanner.action-bench"}) + "\n").encode())
+    client.settimeout(0.002)
+    started = time.perf_counter()
+    service = subprocess.Popen([sys.executable, os.path.join(folder, "..", "Server", "decision_service.py"), *args, "--user", USER, "--port", str(port), "--report", "3600"], stdout=subprocess.DEVNULL)
+    try:
+        while True:
+            client.sendall((json.dumps({"op": "pub", "topic": USER + "/feeds/scanner.checkcard", "payload": tap.decode("latin-1")}) + "\n").encode())
+            try:
+                if client.recv(4096):
+                    break
+            except socket.timeout:
+                pass
+        print(f"restart {name:<8} {(time.perf_counter() - started) * 1000:7.0f} ms to the first scanner.action (python start-up included)")
+    finally:
+        service.terminate()
+        service.wait()
+        client.close()
+
+
+store = AccessStore()
+for i in range(CARDS):
+    store.add_card(Uid(i), f"Pass{i:08d}", i + 1)
+store.add_scanner("10.0.0.1", "10.1.0.1")
+work = tempfile.mkdtemp(prefix="snapshot-")
+store_path = os.path.join(work, "store.json")
+snapshot_path = os.path.join(work, "store.snap")
+store.save(store_path)
+del store
+built, ms = Timed(lambda: Build(AccessStore.load(store_path), snapshot_path))
+print(f"{CARDS} cards, snapshot {os.path.getsize(snapshot_path) / 1e6:.1f} MB, built in {ms / 1000:.1f} s")
+
+store, ms = Timed(lambda: AccessStore.load(store_path))
+print(f"open store     {ms:8.1f} ms")
+snapshot, ms = Timed(lambda: CardSnapshot(snapshot_path))
+print(f"open snapshot  {ms:8.1f} ms")
+LookupRate("store", store)
+LookupRate("snapshot", snapshot)
+del store
+
+writer = CardSnapshot(snapshot_path, sync=False)
+for n in range(WAL_CHANGES):
+    writer.add_card(Uid(CARDS + n), f"Pass{CARDS + n:08d}", CARDS + n + 1)
+writer.close()
+snapshot.close()
+snapshot, ms = Timed(lambda: CardSnapshot(snapshot_path))
+print(f"open + WAL     {ms:8.1f} ms   ({WAL_CHANGES} changes)")
+snapshot, ms = Timed(snapshot.compact)
+print(f"compact        {ms:8.1f} ms   {len(snapshot)} cards")
+snapshot.close()
+
+port = FreePort()
+broker = subprocess.Popen([sys.executable, os.path.join(folder, "..", "Simulation", "broker.py"), "--port", str(port), "--stats", "3600"], stdout=subprocess.DEVNULL)
+time.sleep(0.5)
+try:
+    Restart("store", port, ["--store", store_path])
+    Restart("snapshot", port, ["--snapshot", snapshot_path])
+finally:
+    broker.terminate()
+    broker.wait()
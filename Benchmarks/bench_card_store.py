@@ -0,0 +1,71 @@
+import os, sys, time, random, tempfile, tracemalloc
+
+folder = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(folder, "..", "Server"))
+from card_store import CardStore
+
+# Benchmark: card store (Server/card_store.py)
+# 1. Loading a store of CARDS cards from its file, and the file size.
+# 2. check() per second for a known card, a wrong pass and an unknown card,
+#    the three should take the same time (constant-time compare).
+# 3. Memory of the store next to the old way (dict text UID -> (pass, user)).
+#
+# Usage: python Benchmarks/bench_card_store.py [cards]
+CARDS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+CHECKS = 100000
+
+
+def Uid(i):
+    return bytes([4, i >> 16 & 0xFF, i >> 8 & 0xFF, i & 0xFF])
+
+
+def Build():
+    started = time.perf_counter()
+    cards = CardStore()
+    for i in range(CARDS):
+        cards.add(Uid(i), f"Pass{i:012d}", i + 1)
+    print(f"build     {time.perf_counter() - started:6.2f} s")
+    return cards
+
+
+def Memory(make):
+    tracemalloc.start()
+    kept = make()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return size
+
+
+def TextDict():
+    # The firmware's UID text and the plain pass, as the store looked before
+    return {str(list(Uid(i))).replace(", ", "."): (f"Pass{i:012d}", i + 1) for i in range(CARDS)}
+
+
+def CheckRate(cards):
+    rng = random.Random(1)
+    known = [rng.randrange(CARDS) for i in range(CHECKS)]
+    cases = (
+        ("known", [(Uid(i), f"Pass{i:012d}") for i in known]),
+        ("wrong pass", [(Uid(i), f"Pass{i:012d}"[:-1] + "x") for i in known]),
+        ("unknown", [(bytes([4, 255, 255, 255 - i % 200]), "Pass") for i in known]),
+    )
+    for name, taps in cases:
+        started = time.perf_counter()
+        allowed = sum(cards.check(uid, card_pass) is not None for uid, card_pass in taps)
+        seconds = time.perf_counter() - started
+        print(f"check {name:<10} {CHECKS / seconds:9.0f} /s   {seconds / CHECKS * 1000000:4.1f} us   {allowed} allowed")
+
+
+cards = Build()
+path = os.path.join(tempfile.mkdtemp(prefix="cards-"), "store.cards")
+cards.save(path)
+started = time.perf_counter()
+cards = CardStore.load(path)
+print(f"load      {(time.perf_counter() - started) * 1000:6.0f} ms   {CARDS} cards, {os.path.getsize(path) / 1e6:.1f} MB on disk")
+CheckRate(cards)
+del cards
+store_bytes = Memory(lambda: CardStore.load(path))
+text_bytes = Memory(TextDict)
+print(f"memory    {store_bytes / CARDS:6.0f} bytes/card (card store)   {text_bytes / CARDS:6.0f} bytes/card (text dict)")
+os.remove(path)
@@ -0,0 +1,130 @@
+import os, sys, json, time, random, socket, asyncio, tempfile, subprocess
+
+folder = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(folder, "..", "lib"))
+sys.path.insert(0, os.path.join(folder, "..", "Server"))
+from payload_codec import PayloadEncoder
+from access_store import AccessStore
+from decision_service import DecisionService
+
+# Benchmark: decision service throughput
+# 1. handle() on its own: how many checkcard messages (JSON and binary) one
+#    core decides per second, broker and network left out.
+# 2. End to end: the broker stand-in (Simulation/broker.py) and the decision
+#    service each run as their own process, this script taps with WINDOW taps
+#    in flight and waits for every scanner.action. The broker is Python too, so
+#    this is a lower bound for the service.
+#
+# Usage: python Benchmarks/bench_decision_service.py [cards] [taps] [window]
+CARDS = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+TAPS = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+WINDOW = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+SCANNERS = 50
+USER = "bench"
+
+
+def Uid(i):
+    return bytes([4, i >> 16 & 0xFF, i >> 8 & 0xFF, i & 0xFF])
+
+
+def MakeStore():
+    store = AccessStore()
+    for i in range(CARDS):
+        store.add_card(Uid(i), f"Pass{i:08d}", i + 1)
+    for i in range(SCANNERS):
+        store.add_scanner(f"10.0.0.{i + 1}", f"10.1.0.{i + 1}")
+    return store
+
+
+def Taps(binary: bool, count: int):
+    # 90% known cards, the rest unknown or with a wrong pass
+    rng = random.Random(1)
+    encoder = PayloadEncoder(binary=binary)
+    taps = []
+    for n in range(count):
+        i = rng.randrange(CARDS)
+        card_pass = f"Pass{i:08d}" if rng.random() < 0.9 else "Wrong"
+        tap = encoder.checkcard(Uid(i), card_pass, f"10.0.0.{1 + n % SCANNERS}", request_id=f"bench-{n}", reply=USER + "/feeds/scanner.action-bench")
+        taps.append(tap.encode() if isinstance(tap, str) else tap)  # as it comes from the broker
+    return taps
+
+
+def Percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def HandleRate(store):
+    topic = USER + "/feeds/scanner.checkcard"
+    for name, binary in (("JSON", False), ("binary", True)):
+        service = DecisionService(store, USER)
+        taps = Taps(binary, 50000)
+        started = time.perf_counter()
+        for payload in taps:
+            service.handle(topic, payload)
+        seconds = time.perf_counter() - started
+        print(f"handle() {name:<7} {len(taps) / seconds:9.0f} taps/s   {seconds / len(taps) * 1000000:5.1f} us/tap   {service.stats}")
+
+
+def FreePort():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def Drive(port: int, taps):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write((json.dumps({"op": "sub", "topic": USER + "/feeds/scanner.action-bench"}) + "\n").encode())
+    await asyncio.sleep(0.2)
+    sent = {}
+    latencies = []
+    in_flight = asyncio.Semaphore(WINDOW)
+    done = asyncio.Event()
+
+    async def receive():
+        while len(latencies) < len(taps):
+            line = await reader.readline()
+            if not line:
+                break
+            request_id = json.loads(json.loads(line)["payload"])["id"]
+            latencies.append(time.perf_counter() - sent.pop(request_id))
+            in_flight.release()
+        done.set()
+
+    receiving = asyncio.create_task(receive())
+    started = time.perf_counter()
+    for n, payload in enumerate(taps):
+        await in_flight.acquire()
+        sent[f"bench-{n}"] = time.perf_counter()
+        writer.write((json.dumps({"op": "pub", "topic": USER + "/feeds/scanner.checkcard", "payload": payload.decode("latin-1")}) + "\n").encode())
+        if n % 50 == 0:
+            await writer.drain()
+    await done.wait()
+    seconds = time.perf_counter() - started
+    receiving.cancel()
+    writer.close()
+    ms = [latency * 1000 for latency in latencies]
+    print(f"end to end {len(latencies) / seconds:9.0f} taps/s   p50 {Percentile(ms, 50):5.1f} ms   p95 {Percentile(ms, 95):5.1f} ms   p99 {Percentile(ms, 99):5.1f} ms   ({WINDOW} in flight)")
+
+
+def EndToEnd(store):
+    port = FreePort()
+    path = os.path.join(tempfile.mkdtemp(prefix="decision-"), "store.json")
+    store.save(path)
+    broker = subprocess.Popen([sys.executable, os.path.join(folder, "..", "Simulation", "broker.py"), "--port", str(port), "--stats", "3600"], stdout=subprocess.DEVNULL)
+    time.sleep(0.5)
+    service = subprocess.Popen([sys.executable, os.path.join(folder, "..", "Server", "decision_service.py"), "--store", path, "--user", USER, "--port", str(port), "--report", "3600"], stdout=subprocess.DEVNULL)
+    try:
+        time.sleep(2 + CARDS / 200000)  # loading the store
+        asyncio.run(Drive(port, Taps(False, TAPS)))
+    finally:
+        service.terminate()
+        broker.terminate()
+        service.wait()
+        broker.wait()
+
+
+store = MakeStore()
+print(f"{CARDS} cards, {SCANNERS} scanners")
+HandleRate(store)
+EndToEnd(store)
@@ -0,0 +1,75 @@
+import os, sys, time, random, tracemalloc
+
+folder = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(folder, "..", "Server"))
+from door_permissions import DoorPermissions
+
+# Benchmark: door permissions (Server/door_permissions.py)
+# USERS users, DOORS doors, GROUPS groups with 5-60 doors each, every user in
+# 1-3 groups and some users with their own grants.
+# 1. may_open() per second next to checking the door sets of the user's groups
+#    on every tap (the straightforward way).
+# 2. A group gets a new door list: recomputing its members next to
+#    recomputing every user.
+#
+# Usage: python Benchmarks/bench_door_permissions.py [users] [doors] [groups]
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+DOORS = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+GROUPS = int(sys.argv[3]) if len(sys.argv) > 3 else 40
+CHECKS = 1000000
+
+rng = random.Random(1)
+doors = [f"10.1.{n // 250}.{n % 250 + 1}" for n in range(DOORS)]
+group_doors = {f"group{g}": rng.sample(doors, rng.randint(5, 60)) for g in range(GROUPS)}
+user_groups = {user: rng.sample(sorted(group_doors), rng.randint(1, 3)) for user in range(1, USERS + 1)}
+own_doors = {user: rng.sample(doors, 2) for user in rng.sample(range(1, USERS + 1), USERS // 50)}
+
+groups = {group: {"doors": door_ips, "users": []} for group, door_ips in group_doors.items()}
+for user, names in user_groups.items():
+    for group in names:
+        groups[group]["users"].append(user)
+
+tracemalloc.start()
+traced = DoorPermissions(DOORS)
+traced.load(own_doors, groups)
+size = tracemalloc.get_traced_memory()[0]
+tracemalloc.stop()
+del traced
+started = time.perf_counter()
+permissions = DoorPermissions(DOORS)
+permissions.load(own_doors, groups)
+seconds = time.perf_counter() - started
+print(f"{USERS} users x {DOORS} doors, {GROUPS} groups: built in {seconds:.2f} s, rows {len(permissions.rows) / 1e6:.1f} MB ({permissions.stride} bytes/user), {size / 1e6:.0f} MB with the group members")
+
+checks = [(rng.randint(1, USERS), rng.choice(doors)) for n in range(CHECKS)]
+started = time.perf_counter()
+allowed = sum(permissions.may_open(user, door_ip) for user, door_ip in checks)
+seconds = time.perf_counter() - started
+print(f"may_open      {CHECKS / seconds:10.0f} /s   {seconds / CHECKS * 1e9:5.0f} ns   {allowed} allowed")
+
+door_sets = {group: set(door_ips) for group, door_ips in group_doors.items()}
+own_sets = {user: set(door_ips) for user, door_ips in own_doors.items()}
+started = time.perf_counter()
+scanned = sum(door_ip in own_sets.get(user, ()) or any(door_ip in door_sets[group] for group in user_groups[user]) for user, door_ip in checks)
+seconds = time.perf_counter() - started
+print(f"group scan    {CHECKS / seconds:10.0f} /s   {seconds / CHECKS * 1e9:5.0f} ns   {scanned} allowed")
+assert scanned == allowed
+
+changed = rng.sample(sorted(group_doors), 10)
+started = time.perf_counter()
+users = 0
+for group in changed:
+    door_ips = group_doors[group][2:] + rng.sample(doors, 3)
+    users += permissions.set_group(group, door_ips)
+    group_doors[group] = door_ips
+seconds = time.perf_counter() - started
+print(f"group update  {seconds / len(changed) * 1000:8.1f} ms per group ({users // len(changed)} members recomputed)")
+started = time.perf_counter()
+for user in permissions.user_rows:
+    permissions._refresh(user)
+seconds = time.perf_counter() - started
+print(f"recompute all {seconds * 1000:8.1f} ms ({len(permissions)} users)")
+
+door_sets = {group: set(door_ips) for group, door_ips in group_doors.items()}
+for user, door_ip in checks[:100000]:
+    assert permissions.may_open(user, door_ip) == (door_ip in own_sets.get(user, ()) or any(door_ip in door_sets[group] for group in user_groups[user]))
@@ -0,0 +1,65 @@
+import os, sys, time, random
+
+folder = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(folder, "..", "Server"))
+from door_schedules import DoorSchedules, MinuteOfWeek, ParseDays, ParseTime, MINUTES_PER_DAY
+
+# Benchmark: door schedules (Server/door_schedules.py)
+# DOORS doors with 2-6 rules each, TAPS taps spread over one week at random
+# doors. Per tap:
+# - scan: the rules of the door are checked one by one (already parsed)
+# - bitmap: minute of the week + one bit test, no cache
+# - is_open: bitmap with the answer cached until the next change of the door
+#
+# Usage: python Benchmarks/bench_door_schedules.py [doors] [taps]
+DOORS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+TAPS = int(sys.argv[2]) if len(sys.argv) > 2 else 1000000
+
+rng = random.Random(1)
+day_sets = ("mon-fri", "sat", "sun", "sat,sun", "daily", "mon,wed,fri", "tue-thu")
+
+
+def RandomRule():
+    start = rng.randrange(0, 22 * 60, 15)
+    end = (start + rng.randrange(60, 14 * 60, 15)) % MINUTES_PER_DAY
+    return {"days": rng.choice(day_sets), "from": f"{start // 60:02d}:{start % 60:02d}", "to": f"{end // 60:02d}:{end % 60:02d}"}
+
+
+rules = {f"10.1.{n // 250}.{n % 250 + 1}": [RandomRule() for i in range(rng.randint(2, 6))] for n in range(DOORS)}
+started = time.perf_counter()
+schedules = DoorSchedules()
+for door_ip, door_rules in rules.items():
+    schedules.set(door_ip, door_rules)
+print(f"{DOORS} doors, {sum(len(door_rules) for door_rules in rules.values())} rules compiled in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+week = time.mktime((2026, 10, 19, 0, 0, 0, 0, 0, -1))  # a monday
+doors = list(rules)
+taps = [(rng.choice(doors), week + n * 7 * 86400 / TAPS) for n in range(TAPS)]
+
+
+def Scan(door_ip, now, parsed):
+    minute, seconds = MinuteOfWeek(now)
+    day, minute = divmod(minute, MINUTES_PER_DAY)
+    for days, start, end in parsed[door_ip]:
+        if start < end:
+            if day in days and start <= minute < end:
+                return True
+        elif (day in days and minute >= start) or ((day - 1) % 7 in days and minute < end):
+            return True
+    return False
+
+
+def Bitmap(door_ip, now):
+    minute, seconds = MinuteOfWeek(now)
+    return schedules._bit(schedules.bitmaps[door_ip], minute) == 1
+
+
+parsed = {door_ip: [(set(ParseDays(rule["days"])), ParseTime(rule["from"]), ParseTime(rule["to"])) for rule in door_rules] for door_ip, door_rules in rules.items()}
+results = {}
+for name, check in (("scan", lambda door_ip, now: Scan(door_ip, now, parsed)), ("bitmap", Bitmap), ("is_open", schedules.is_open)):
+    started = time.perf_counter()
+    results[name] = [check(door_ip, now) for door_ip, now in taps]
+    seconds = time.perf_counter() - started
+    print(f"{name:<8} {TAPS / seconds:10.0f} taps/s   {seconds / TAPS * 1e9:5.0f} ns   {sum(results[name])} open")
+assert results["scan"] == results["bitmap"] == results["is_open"]
+print(f"cache    {schedules.stats['cached'] / schedules.stats['checks'] * 100:.1f}% of the checks answered from the cache")
@@ -0,0 +1,104 @@
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+from lcd_framebuffer import FramebufferLCD
+
+# Benchmark: LCD bus writes
+# Counts the bytes sent to the HD44780 for the scanner screens, once the way
+# Scanner-Final.py did it (lcd.clear() + full lcd.message) and once through
+# FramebufferLCD. CountingLCD follows what adafruit_character_lcd does for
+# clear(), cursor_position() and message: every command or character is one
+# _write8() = two nibbles on the 4-bit bus, clear() also sleeps 3 ms.
+_LCD_ROW_OFFSETS = (0x00, 0x40, 0x14, 0x54)
+
+
+class CountingLCD:
+    def __init__(self, columns=16, rows=2):
+        self.columns = columns
+        self.rows = rows
+        self.writes = 0
+        self.clears = 0
+        self.cells = [[" "] * columns for i in range(rows)]
+        self.address = 0
+        self.backlight = False
+        self._message = ""
+
+    def _write8(self, value, char_mode=False):
+        self.writes += 1
+        if not char_mode:
+            self.address = value & 0x7F
+            return
+        row = 1 if self.address >= 0x40 else 0
+        column = self.address - _LCD_ROW_OFFSETS[row]
+        if column < self.columns:
+            self.cells[row][column] = chr(value)
+        self.address += 1
+
+    def clear(self):
+        self._write8(0x01)
+        self.clears += 1
+        self.cells = [[" "] * self.columns for i in range(self.rows)]
+        self.address = 0
+
+    def cursor_position(self, column, row):
+        self._write8(0x80 | (column + _LCD_ROW_OFFSETS[row]))
+
+    @property
+    def message(self):
+        return self._message
+
+    @message.setter
+    def message(self, message):
+        self._message = message
+        line = 0
+        self.cursor_position(0, line)
+        for character in message:
+            if character == "\n":
+                line += 1
+                self.cursor_position(0, line)
+            else:
+                self._write8(ord(character), True)
+
+    def screen(self):
+        return "\n".join(["".join(row) for row in self.cells])
+
+
+def NavigateOptions(lcd, presses):
+    # navigate_options(): every press redraws "Select Action:" + the option
+    options = ["Start Scanner", "Card Info", "192.168.0.23"]
+    index = 0
+    for press in range(presses):
+        lcd.clear()
+        if isinstance(lcd, FramebufferLCD):
+            # Scanner-Final.py now sets the whole screen at once
+            lcd.message = "Select Action:\n" + options[index]
+        else:
+            lcd.message = "Select Action:\n"
+            lcd.message += options[index]
+        index = (index + 1) % len(options)
+
+
+def Taps(lcd, taps):
+    # Start Scanner loop: waiting screen, loading screen, decision screen
+    results = ["Opening Door...\nPlease wait", "ERROR\nNo access!", "Checking out...\nPlease wait"]
+    for tap in range(taps):
+        for screen in ("Scan Your\nAccess Card", "Loading...\nPlease wait", results[tap % len(results)]):
+            lcd.clear()
+            lcd.message = screen
+
+
+def Run(name, scenario, count):
+    old = CountingLCD()
+    scenario(old, count)
+
+    hardware = CountingLCD()
+    new = FramebufferLCD(hardware)
+    scenario(new, count)
+    assert hardware.screen() == old.screen(), "framebuffer shows something else than the LCD"
+
+    print(f"{name:<24} old {old.writes:6} writes ({old.clears} clears)   framebuffer {hardware.writes:6} writes ({hardware.clears} clears)   {100 - 100 * hardware.writes // old.writes}% less")
+
+
+print("Bytes sent to the LCD (1 byte = 2 nibbles on the 4-bit bus, clear = +3 ms):")
+Run("navigate_options x60", NavigateOptions, 60)
+Run("tap screens x60", Taps, 60)
@@ -0,0 +1,126 @@
+import os, sys, time, json
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+from payload_codec import PayloadEncoder, DecodePayload
+
+# Benchmark: MQTT payloads
+# Bytes per message and bytes allocated per publish for the three device
+# messages, built the old way (str({...}).replace), with json.dumps and with
+# PayloadEncoder (JSON and binary). Runs on the host (CPython + tracemalloc) or
+# on the Pico itself (gc.mem_alloc with the garbage collector disabled).
+MESSAGES = 2000
+
+uid = bytearray([4, 213, 6, 90])
+card_pass = "DevPass42"
+ip = "192.168.0.23"
+door_ip = "192.168.0.11"
+request_id = "a1b2c3-17"
+reply = "user/feeds/scanner.action-a1b2c3"
+
+json_encoder = PayloadEncoder()
+binary_encoder = PayloadEncoder(binary=True)
+
+
+def OldCheckcard():
+    card_uid = f"{[i for i in uid]}".replace(" ", "")
+    return str({"uid": card_uid.replace(",", "."), "pass": card_pass, "ip": ip, "id": request_id, "reply": reply}).replace("'", '"')
+
+
+def DumpsCheckcard():
+    card_uid = f"{[i for i in uid]}".replace(" ", "")
+    return json.dumps({"uid": card_uid.replace(",", "."), "pass": card_pass, "ip": ip, "id": request_id, "reply": reply})
+
+
+def OldAction():
+    return str({"id": request_id, "user": 0, "action": 0, "door_ip": 0}).replace("'", '"')
+
+
+def DumpsAction():
+    return json.dumps({"id": request_id, "user": 0, "action": 0, "door_ip": 0})
+
+
+def OldStatus():
+    return str({"door_ip": door_ip, "status": 2, "age_ms": 35}).replace("'", '"')
+
+
+def DumpsStatus():
+    return json.dumps({"door_ip": door_ip, "status": 2, "age_ms": 35})
+
+
+CASES = (
+    ("scanner.checkcard", (
+        ("str().replace", OldCheckcard),
+        ("json.dumps", DumpsCheckcard),
+        ("encoder JSON", lambda: json_encoder.checkcard(uid, card_pass, ip, request_id=request_id, reply=reply)),
+        ("encoder binary", lambda: binary_encoder.checkcard(uid, card_pass, ip, request_id=request_id, reply=reply)),
+    )),
+    ("scanner.action", (
+        ("str().replace", OldAction),
+        ("json.dumps", DumpsAction),
+        ("encoder JSON", lambda: json_encoder.action(request_id, 0, 0)),
+        ("encoder binary", lambda: binary_encoder.action(request_id, 0, 0)),
+    )),
+    ("lock.status", (
+        ("str().replace", OldStatus),
+        ("json.dumps", DumpsStatus),
+        ("encoder JSON", lambda: json_encoder.lock_status(door_ip, 2, 35)),
+        ("encoder binary", lambda: binary_encoder.lock_status(door_ip, 2, 35)),
+    )),
+)
+
+
+def Allocated(build):
+    try:
+        import tracemalloc
+    except ImportError:
+        tracemalloc = None
+
+    build()  # warm up (imports, caches)
+    if tracemalloc:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        build()
+        allocated = tracemalloc.get_traced_memory()[1] - base
+        tracemalloc.stop()
+    else:
+        import gc
+        gc.collect()
+        gc.disable()
+        before = gc.mem_alloc()
+        build()
+        allocated = gc.mem_alloc() - before
+        gc.enable()
+
+    return allocated
+
+
+def Measure(name, build):
+    payload = build()
+    size = len(payload.encode() if isinstance(payload, str) else payload)
+    # The cost of an empty call is subtracted
+    allocated = Allocated(build) - Allocated(lambda: None)
+
+    started = time.monotonic_ns()
+    for i in range(MESSAGES):
+        build()
+    us = (time.monotonic_ns() - started) / MESSAGES / 1000
+
+    print(f"  {name:<16} {size:4} bytes/message   {allocated:5} bytes allocated/publish   {us:6.1f} us")
+    return payload
+
+
+print("A value with a quote in it:")
+card_pass = 'Dev"Pass'
+print(f"  str().replace: {OldCheckcard()}")
+print(f"  encoder JSON:  {json_encoder.checkcard(uid, card_pass, ip)}  -> {DecodePayload(json_encoder.checkcard(uid, card_pass, ip))['pass']!r}")
+card_pass = "DevPass42"
+print()
+
+for topic, builders in CASES:
+    print(f"{topic}, {MESSAGES} messages:")
+    decoded = []
+    for name, build in builders:
+        payload = Measure(name, build)
+        decoded.append(DecodePayload(payload))
+    assert all([d == decoded[0] for d in decoded]), "the formats don't hold the same message"
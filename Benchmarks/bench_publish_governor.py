@@ -0,0 +1,79 @@
+import os, sys, json, tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+import publish_governor, event_queue
+from publish_governor import PublishGovernor
+from event_queue import EventQueue
+
+# Benchmark: telemetry through the publish governor (lib/publish_governor.py)
+# A door that flaps: CHANGES lock.status messages, one every GAP seconds, while
+# connected, on a simulated clock with the default budget (30/min, burst 5).
+# - send_now: every status that can't go out right away ends up on flash and
+#   is drained from there one by one
+# - hand_over: the governor keeps it and batches what doesn't fit into one
+#   message on <user>/groups/lock
+# Then the connection drops with a batch waiting: unsent() has to hand it to
+# the flash queue.
+#
+# Usage: python Benchmarks/bench_publish_governor.py [changes] [gap seconds]
+CHANGES = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+GAP = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+USER = "sim"
+TOPIC = USER + "/feeds/lock.status"
+
+
+class SimClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+class SimClient:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, payload):
+        self.published.append((topic, payload))
+
+
+def Run(name, send):
+    clock = SimClock()
+    publish_governor.time = clock
+    event_queue.time = clock
+    client = SimClient()
+    governor = PublishGovernor(client, USER)
+    events = EventQueue((TOPIC,), folder=tempfile.mkdtemp(), flush_every=1)
+    for n in range(CHANGES):
+        events.send(getattr(governor, send), TOPIC, f'{{"ip":"192.168.0.21","status":{n % 2 + 1},"n":{n}}}')
+        for tick in range(int(GAP / 0.01)):
+            clock.now += 0.01
+            governor.service()
+            events.service(governor.send_now if governor.idle() else None)
+    for tick in range(12000):  # one more minute to send what is left
+        clock.now += 0.01
+        governor.service()
+        events.service(governor.send_now if governor.idle() else None)
+    groups = [json.loads(payload) for topic, payload in client.published if topic == USER + "/groups/lock"]
+    last = groups[-1]["feeds"]["status"] if groups else None
+    print(f"{name:<10} {len(client.published):3} messages ({len(groups)} on groups/lock), {events.stats['writes']:3} flash writes, {events.stats['queued']:3} events queued on flash")
+    return client, groups, last, events
+
+
+print(f"{CHANGES} lock.status changes, one every {GAP} s, 30/min with a burst of 5")
+Run("send_now", "send_now")
+client, groups, last, events = Run("hand_over", "hand_over")
+assert groups, "no group feed message went out"
+assert json.loads(last)["n"] == CHANGES - 1, "the group feed does not hold the last status"
+assert not events.waiting(), "telemetry went to flash while connected"
+
+# The connection drops while the governor holds a batch
+governor = PublishGovernor(SimClient(), USER)
+governor.tokens = 0
+events.send(governor.hand_over, TOPIC, '{"ip":"192.168.0.21","status":2}')
+assert governor.batches
+for topic, payload in governor.unsent(events.topics):
+    events.put(topic, payload)
+assert not governor.batches and events.waiting(), "the held status did not go to flash"
+print("Held telemetry goes to flash when the connection drops")
@@ -3,6 +3,7 @@ import busio
 from digitalio import DigitalInOut
 from adafruit_pn532.i2c import PN532_I2C
 from adafruit_pn532.adafruit_pn532 import MIFARE_CMD_AUTH_A, MIFARE_CMD_AUTH_B
+from card_codec import EncodeText, DecodeText, HexToBytes
 
 # -------------
 # Functions
@@ -19,15 +20,7 @@ def InitiateNFC(i2c_sda: Pin, i2c_scl: Pin):
 
 
 def StringToByteArray(input_str: str, max_len: int):
-    if len(input_str) > max_len:
-        print(f"ERROR: Length is longer than the max ({max_len})! \n")
-        return 
-    data = [ord(char) for char in input_str]
-    for i in range(max_len - len(data)):
-        data.append(0)
-    data_bytes = bytearray(data)
-    
-    return data_bytes
+    return EncodeText(input_str, max_len)
 
 
 def BytesToByteArray(length: int):
@@ -49,15 +42,7 @@ def BytesToByteArray(length: int):
 
 
 def HexArrayToString(array: []):
-    array_over = []
-    for i in array:
-        if i == '0':
-            array_over.append(i)
-        if len(array_over)%2 != 0:
-            array.append('0')
-    data_string = bytearray.fromhex(''.join(array)).decode()
-    
-    return data_string
+    return DecodeText(HexToBytes(array))
 
 
 def GetCardUID(scanner: PN532_I2C):
@@ -3,6 +3,8 @@ import busio
 from digitalio import DigitalInOut
 from adafruit_pn532.i2c import PN532_I2C
 from adafruit_pn532.adafruit_pn532 import MIFARE_CMD_AUTH_A, MIFARE_CMD_AUTH_B
+from card_session import CardSession, DataBlocksOf, TrailerOf
+from card_codec import EncodeText, DecodeText, BytesToHex
 
 # -------------
 # Functions
@@ -19,15 +21,7 @@ def InitiateNFC(i2c_sda: Pin, i2c_scl: Pin):
 
 
 def StringToByteArray(input_str: str, max_len: int):
-    if len(input_str) > max_len:
-        print(f"ERROR: Length is longer than the max ({max_len})! \n")
-        return 
-    data = [ord(char) for char in input_str]
-    for i in range(max_len - len(data)):
-        data.append(0)
-    data_bytes = bytearray(data)
-    
-    return data_bytes
+    return EncodeText(input_str, max_len)
 
 
 def BitsToByteArray(length: int):
@@ -78,8 +72,7 @@ def ReadBlock(scanner: PN532_I2C, block: int, key_a: bytearray):
     if authenticated:
         print(f"Reading block {block}...")
         try:
-            value = [hex(x)[2:] for x in scanner.mifare_classic_read_block(block)]
-            return value
+            return scanner.mifare_classic_read_block(block)
         except:
             print("ERROR: Something went wrong while reading.")
             return False 
@@ -120,6 +113,7 @@ nfc = InitiateNFC(i2c_sda=nfc_sda, i2c_scl=nfc_scl)
 while True:
     print("\n|--------------------------------------------------------------------------------|")
     print("| Actions: r = Reading, w = writing, t = change sector trailer, u = Get card uid |")
+    print("|          s = Read full sector, S = Write full sector                           |")
     print("|--------------------------------------------------------------------------------|\n")
     action = input("Enter action: ")
 
@@ -142,11 +136,9 @@ while True:
         
         data = ReadBlock(scanner=nfc, block=block, key_a=key)
         if data:
-            print(f"Data (bytes in hex): {data}")
-            try:
-                print(f"Data (text): {bytearray.fromhex(''.join(data)+'0').decode() if len(''.join(data))%2 else bytearray.fromhex(''.join(data)).decode()}")
-            except:
-                print("Data (text): [ERROR Converting]")
+            print(f"Data (bytes in hex): {BytesToHex(data)}")
+            text = DecodeText(data)
+            print(f"Data (text): {text if text is not None else '[ERROR Converting]'}")
 
     elif action.lower() == "w":  # Writing option
         block = None 
@@ -215,6 +207,60 @@ while True:
         
         CreateNewTrailer(scanner=nfc, sector=sector, key_b=key, new_key_a=new_key_a, new_key_b=new_key_b, access_bits=access_bits)
         
+    elif action == "s":  # Read full sector option (one authentication)
+        sector = None
+        while not sector:
+            user_input = input("Enter the sector number: ")
+            try:
+                sector = int(user_input)
+            except:
+                print("ERROR: Please enter an integer.")
+
+        key = None
+        while not key:
+            user_input = input(f"Enter key A for sector {sector} (Enter 'b' for bits mode): ")
+            if user_input.lower() == "b":
+                key = BitsToByteArray(length=6)
+            else:
+                key = StringToByteArray(input_str=user_input, max_len=6)
+
+        session = CardSession(nfc)
+        session.detect()
+        data = session.read_sector(sector=sector, key=key, trailer=True)
+        if data:
+            blocks = DataBlocksOf(sector) + [TrailerOf(sector)]
+            for i, block in enumerate(blocks):
+                print(f"Block {block}: {BytesToHex(data[16*i:16*(i+1)])}")
+        session.report()
+
+    elif action == "S":  # Write full sector option (one authentication)
+        sector = None
+        while not sector:
+            user_input = input("Enter the sector number: ")
+            try:
+                sector = int(user_input)
+            except:
+                print("ERROR: Please enter an integer.")
+
+        key = None
+        while not key:
+            user_input = input(f"Enter key B for sector {sector} (Enter 'b' for bits mode): ")
+            if user_input.lower() == "b":
+                key = BitsToByteArray(length=6)
+            else:
+                key = StringToByteArray(input_str=user_input, max_len=6)
+
+        max_len = 16*len(DataBlocksOf(sector))
+        data = None
+        while not data:
+            user_input = input(f"Enter the data to write to sector {sector} (max {max_len}): ")
+            data = StringToByteArray(input_str=user_input, max_len=max_len)
+
+        session = CardSession(nfc)
+        session.detect()
+        session.write_sector(sector=sector, key_b=key, data=data)
+        session.report()
+
     elif action.lower() == "u":  # Get card UID option
         GetCardUID(scanner=nfc)
         
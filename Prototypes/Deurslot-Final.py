@@ -1,7 +1,15 @@
-import board, time, digitalio, pwmio
+import board, digitalio, pwmio
 import os, ssl, socketpool, wifi
 import adafruit_minimqtt.adafruit_minimqtt as MQTT
 import asyncio, random
+from door_topics import DoorId, OpenTopic, BroadcastTopic
+from actuators import ActuatorScheduler
+from buzzer_player import BuzzerPlayer, Tone
+from reed_input import ReedInput
+from mqtt_keepalive import MqttKeepalive
+from event_queue import EventQueue
+from publish_governor import PublishGovernor
+from payload_codec import PayloadEncoder
 # Connect to WiFi
 print("Connecting to WiFi")
 print(os.getenv("WIFI_SSID"))
@@ -24,6 +32,15 @@ print("logged in")
 
 mqtt_topic = aio_user+"/feeds/lock.status"
 
+# This door only gets its own open commands (lock.open-<door id>, the id comes from the IP
+# like on the backend). LOCK_BROADCAST=1 also listens on the old shared lock.open feed, only
+# for an old backend that still sends there.
+ip = str(wifi.radio.ipv4_address)
+door_id = DoorId(ip)
+open_topic = OpenTopic(aio_user, door_id)
+broadcast_topic = BroadcastTopic(aio_user)
+listen_broadcast = str(os.getenv("LOCK_BROADCAST", 0)).strip().lower() in ("1", "true", "yes", "on")
+
 #Initializing pins
 #=============================================================
 print("initializing pins")
@@ -37,23 +54,33 @@ slot.value = False
 
 buzzer = pwmio.PWMOut(board.GP16, variable_frequency=True)
 
-reed = digitalio.DigitalInOut(board.GP28)
-reed.direction = digitalio.Direction.INPUT
+# Scanned in the background by keypad, a door change only counts after REED_DEBOUNCE ms
+reed = ReedInput(board.GP28, debounce_ms=os.getenv("REED_DEBOUNCE", 30))
 print("succes")
 #===============================================================
+# Outputs are switched off again by the actuator task, nothing here blocks the loop
+open_time = os.getenv("DOOR_OPEN_TIME", 4)
+
+player = BuzzerPlayer(buzzer)
+door_tone = Tone(300, open_time, duty_cycle=2**14)
+
+def SlotOff():
+    slot.value = False
+    print("done")
+
+actuators = ActuatorScheduler()
+actuators.add_pin("led", led)
+actuators.add("slot", lambda: setattr(slot, "value", True), SlotOff)
+
 def ToneBuzz():
-    buzzer.duty_cycle = 2**14
-    buzzer.frequency = 300
-    time.sleep(4)
-    buzzer.duty_cycle = 0
+    # Starting the tone again restarts it, so it also lasts the extended open window
+    player.play(door_tone)
     
-async def OpenDoor():
-    led.value = True
-    slot.value = True
+def OpenDoor():
+    # Opening while the door is already open extends the open window
+    actuators.hold("led", open_time)
+    actuators.hold("slot", open_time)
     ToneBuzz()
-    led.value = False
-    slot.value = False
-    print("done")
     
 # Define callback methods which are called when events occur
 #===========================================================
@@ -68,6 +95,7 @@ def disconnect(mqtt_client, userdata, rc):
     # This method is called when the mqtt_client disconnects
     # from the broker.
     print("Disconnected from MQTT Broker!")
+    keepalive.lost()
 
 
 def subscribe(mqtt_client, userdata, topic, granted_qos):
@@ -86,9 +114,11 @@ def publish(mqtt_client, userdata, topic, pid):
 
 
 def message(client, topic, message):
-    print(str(wifi.radio.ipv4_address))
-    if message == str(wifi.radio.ipv4_address):
-        asyncio.create_task(OpenDoor())
+    if topic == throttle_topic:
+        governor.throttled(message)
+    elif (topic == open_topic or topic == broadcast_topic) and message == ip:
+        # The payload is the ip of the door that has to open, anything else on the feed is ignored
+        OpenDoor()
         print("open")
         
 #===========================================================
@@ -111,6 +141,12 @@ mqtt_client.on_disconnect = disconnect
 
 print("Attempting to connect to %s" % mqtt_client.broker)
 mqtt_client.connect()  
+# Reconnects when the connection drops, door changes from that time are queued on flash
+keepalive = MqttKeepalive(mqtt_client, unserviced=())
+# lock.status is telemetry for the governor: batched into the lock group feed when the rate runs out
+governor = PublishGovernor(mqtt_client, aio_user, rate=os.getenv("PUBLISH_RATE", 30), burst=os.getenv("PUBLISH_BURST", 5))
+encoder = PayloadEncoder(binary=os.getenv("PAYLOAD_FORMAT") == "binary")
+events = EventQueue((mqtt_topic,), folder=os.getenv("EVENT_QUEUE_DIR", "/queue"))
 
 # Define callback methods which are called when events occur
 
@@ -122,34 +158,39 @@ def subscribe_to(topics: []):
         mqtt_client.subscribe(topic,1)
 
 # Setup topics to subscribe to here
-topics = ["open"]
+topics = [f"open-{door_id}"]
+if listen_broadcast:
+    topics.append("open")
 subscribe_to(topics)
+throttle_topic = aio_user + "/throttle"
+mqtt_client.subscribe(throttle_topic)
 
-async def ListenReed(interval):
-    prevVal = None
-    status = 0
-    ip = str(wifi.radio.ipv4_address)
-    
-    status = 2 if reed.value == True else 1
-    mqtt_client.publish(mqtt_topic,str({"door_ip": ip, "status": status}).replace("'",'"'))
-    
-    while True:
-        val = reed.value
-        if prevVal != val:
-            status = 2 if val == True else 1
-            mqtt_client.publish(mqtt_topic,str({"door_ip": ip, "status": status}).replace("'",'"'))
-    
-        prevVal = val
-        await asyncio.sleep(interval)
+def PublishStatus(value, age_ms=0):
+    # age_ms: how long ago the door really changed, the backend can work out the exact time
+    status = 2 if value == True else 1
+    events.send(governor.hand_over, mqtt_topic, encoder.lock_status(ip, status, age_ms), connected=keepalive.connected)
+
+async def ListenReed():
+    PublishStatus(reed.value)
+    await reed.run(PublishStatus)
 
 async def ListenMQTTRequest(interval):
     while True:
-        mqtt_client.loop()
+        connected = keepalive.service()
+        if connected:
+            governor.service()
+        else:
+            # lock.status the governor still held goes to flash, from there it is sent once the connection is back
+            for topic, payload in governor.unsent(events.topics):
+                events.put(topic, payload)
+        events.service(governor.send_now if connected and governor.idle() else None)
         await asyncio.sleep(interval)
         
 async def main():
-    Reed_task = asyncio.create_task(ListenReed(1))
+    Reed_task = asyncio.create_task(ListenReed())
     MQTT_task = asyncio.create_task(ListenMQTTRequest(0.01))
-    await asyncio.gather(Reed_task,MQTT_task)
+    Actuator_task = asyncio.create_task(actuators.run())
+    Buzzer_task = asyncio.create_task(player.run())
+    await asyncio.gather(Reed_task,MQTT_task,Actuator_task,Buzzer_task)
 
 asyncio.run(main())
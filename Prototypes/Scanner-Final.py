@@ -1,11 +1,25 @@
-import board, time, json
-import busio, pwmio, digitalio
+import board, time, sys
+import busio, pwmio, digitalio, supervisor
 import os, ssl, socketpool, wifi, math
+import asyncio
 import adafruit_minimqtt.adafruit_minimqtt as MQTT
 import adafruit_character_lcd.character_lcd as characterlcd
 from digitalio import DigitalInOut
 from adafruit_pn532.i2c import PN532_I2C
-from adafruit_pn532.adafruit_pn532 import MIFARE_CMD_AUTH_A, MIFARE_CMD_AUTH_B
+from card_session import CardSession
+from card_codec import EncodeText, DecodeText
+from card_watcher import CardWatcher
+from access_cache import AccessCache, ACTION_SUCCESSFUL
+from mqtt_rpc import MqttRpc
+from door_topics import DoorId, OpenTopic
+from buzzer_player import BuzzerPlayer, SUCCESS, FAIL
+from lcd_framebuffer import FramebufferLCD
+from button_events import ButtonEvents
+from loop_monitor import LoopMonitor
+from mqtt_keepalive import MqttKeepalive
+from event_queue import EventQueue
+from publish_governor import PublishGovernor, COMMAND, REQUEST
+from payload_codec import CheckcardSize, PayloadEncoder, MAX_STR
 
 # -------------
 # Functions
@@ -22,88 +36,17 @@ def InitiateNFC(i2c_sda: Pin, i2c_scl: Pin):
     return pn532
 
 
-def GetCardUID(scanner: PN532_I2C):
-    print("Waiting for card...")
-    while True:
-        uid = scanner.read_passive_target(timeout=0.5)
-        if uid is not None:
-            break
-        mqtt_client.loop()
-    print(f"\nFound card with UID: {[i for i in uid]}")
-    
-    return uid
-    
-
-def AuthBlock(scanner: PN532_I2C, block: int, key: bytearray, b: bool = False):
-    uid = GetCardUID(scanner=scanner)
-    print(f"Authenticating block {block} ...")
-    authenticated = scanner.mifare_classic_authenticate_block(uid, block, MIFARE_CMD_AUTH_B if b else MIFARE_CMD_AUTH_A, key)
-    if authenticated:
-        print("Authentication SUCCESFUL! \n")
-    else:
-        print("Authentication FAILED!")
-        
-    return authenticated 
-
-
-def ReadBlock(scanner: PN532_I2C, block: int, key_a: bytearray):
-    authenticated = AuthBlock(scanner=scanner, block=block, key=key_a)
-    if authenticated:
-        print(f"Reading block {block}...")
-        try:
-            value = [hex(x)[2:] for x in scanner.mifare_classic_read_block(block)]
-            return value
-        except:
-            print("ERROR: Something went wrong while reading.")
-            return False 
-
-
-def WriteBlock(scanner: PN532_I2C, block: int, key_b: bytearray, data: bytearray):
-    authenticated = AuthBlock(scanner=scanner, block=block, key=key_b, b=True)
-    if authenticated:
-        print(f"Writing data to block {block}...")
-        try:
-            scanner.mifare_classic_write_block(block, data)
-            print(f"Wrote to block {block}")
-            return True 
-        except:
-            print("ERROR: Something went wrong while writing the data.")
-            return False 
-            
-            
-def CreateNewTrailer(scanner: PN532_I2C, sector: int,  key_b: bytearray, new_key_a: bytearray, new_key_b: bytearray, access_bits: bytearray):
-    trailer = new_key_a + access_bits + new_key_b
-    block = 4*sector - 1
-    authenticated = AuthBlock(scanner=scanner, block=block,  key=key_b, b=True)
-    if authenticated:
-        print(f"Writing new trailer for sector {sector}...")
-        if WriteBlock(scanner=scanner, block=block, key_b=key_b, data=trailer):
-            print("Key A\t Access Bits\t Key B")
-            print(f"{new_key_a}\t {access_bits}\t {new_key_b}")
-            return True
-    else:
-        return False
-    
-
 # Converters
 def StringToByteArray(input_str: str, max_len: int):
-    if len(input_str) > max_len:
-        print(f"ERROR: Length is longer than the max ({max_len})! \n")
-        return 
-    data = [ord(char) for char in input_str]
-    for i in range(max_len - len(data)):
-        data.append(0)
-    data_bytes = bytearray(data)
-    
-    return data_bytes
+    return EncodeText(input_str, max_len)
 
 
-def BitsToByteArray(length: int):
+async def BitsToByteArray(length: int):
     bits = []
     for i in range(length):
         bit = None
         while not bit:
-            user_bit = input(f"Enter bit {i+1}: ")
+            user_bit = await ask(f"Enter bit {i+1}: ")
             try:
                 if 0 <= int(user_bit) <= 255:
                     bit = int(user_bit)
@@ -116,31 +59,48 @@ def BitsToByteArray(length: int):
 
     return bytes
 
-# Buzzer Sounds
+# Buzzer Sounds (played in the background by the player task)
 def toneSuccess():
-    buzzer.duty_cycle=2**15
-    buzzer.frequency = 850
-    time.sleep(0.06) 
-    buzzer.duty_cycle=0
-    time.sleep(0.06)
+    player.play(SUCCESS)
 
 def toneFail():
-    buzzer.duty_cycle=2**15
-    buzzer.frequency = 300
-    time.sleep(0.3)
-    buzzer.duty_cycle=0
+    player.play(FAIL)
+
+async def ask(prompt: str):
+    # input() would stop every task, the serial bytes are read one by one instead
+    state = keepalive.state
+    keepalive.enter("prompt")
+    print(prompt, end="")
+    line = ""
+    while True:
+        if not supervisor.runtime.serial_bytes_available:
+            await asyncio.sleep(0.02)
+            continue
+        character = sys.stdin.read(1)
+        if character in "\r\n":
+            print()
+            keepalive.enter(state)
+            return line
+        if character in "\x08\x7f":  # backspace
+            if line:
+                line = line[:-1]
+                print("\b \b", end="")
+            continue
+        line += character
+        print(character, end="")
 
 # Other
-def getCardPass(scanner):
-    key_a =StringToByteArray(os.getenv("CARD_KEY_A"), max_len=6)
-    pass_block = os.getenv("CARD_PASS_BLOCK")
-    data = ReadBlock(scanner=scanner, block=pass_block, key_a=key_a)
-    if data:
-        card_pass = f"{bytearray.fromhex(''.join(data)+'0').decode() if len(''.join(data))%2 else bytearray.fromhex(''.join(data)).decode()}".replace("\x00","")
+def getCardPass(session: CardSession):
+    # Longer passes span several blocks, all read with one authentication per sector.
+    # The blocks and the decoded pass reuse the same buffers on every tap.
+    with monitor.timed("nfc"):
+        raw = session.read_blocks(block=pass_block, count=pass_blocks, key_a=key_a, into=pass_data)
+    if raw:
+        card_pass = DecodeText(raw, into=pass_text)
         print(f"[DEBUG] Card Pass: {card_pass}")
         return card_pass
 
-def configureNewCard():
+async def configureNewCard(session: CardSession):
     lcd.clear()
     lcd.message = "Connect to PC\n& Follow Steps!"
 
@@ -152,20 +112,20 @@ def configureNewCard():
 
     key_b = None
     while not key_b:
-        user_input = input("[1] Enter Admin Key (key_b): ")
+        user_input = await ask("[1] Enter Admin Key (key_b): ")
         key_b = StringToByteArray(user_input, max_len=6)
     
-    user_input = input("[2] Should the current admin key on this card be updated? This should be run if this is a completely new card! (y/N): ")
+    user_input = await ask("[2] Should the current admin key on this card be updated? This should be run if this is a completely new card! (y/N): ")
     if user_input.lower() == "y":
         key_a = StringToByteArray(os.getenv("CARD_KEY_A"), max_len=6)
         bits = bytearray(list(map(int, (os.getenv("CARD_BITS")).split(","))))
         
         prev_key_b = None
         while not prev_key_b:
-            user_input = input("[2.1] Enter current key_b (Press enter for factory default or enter 'b' for bits mode): ")
+            user_input = await ask("[2.1] Enter current key_b (Press enter for factory default or enter 'b' for bits mode): ")
             if len(user_input):
                 if user_input.lower() == "b":
-                    prev_key_b = BitsToByteArray(length=6)
+                    prev_key_b = await BitsToByteArray(length=6)
                 else:
                     prev_key_b = StringToByteArray(user_input, max_len=6)
             else:
@@ -173,63 +133,65 @@ def configureNewCard():
 
         lcd.clear()
         lcd.message = "Creating Trailer\nPlease wait..."
-        if not CreateNewTrailer(scanner=nfc, sector=sector, key_b=prev_key_b, new_key_a=key_a, new_key_b=key_b, access_bits=bits):
+        await wait_for_card()
+        with monitor.timed("nfc"):
+            created = session.create_trailer(sector=sector, key_b=prev_key_b, new_key_a=key_a, new_key_b=key_b, access_bits=bits)
+        if not created:
             lcd.clear()
             lcd.message = "Trailer Creation\nFailed!"
             toneFail()
-            time.sleep(1)
+            await asyncio.sleep(1)
             return False
 
     card_pass = None
     while not card_pass:
-        user_input = input("[3] Enter a card pass. This will be used to identify the card: ")
-        card_pass = StringToByteArray(user_input, max_len=16)
+        user_input = await ask("[3] Enter a card pass. This will be used to identify the card: ")
+        card_pass = StringToByteArray(user_input, max_len=16*pass_blocks)
 
     lcd.clear()
     lcd.message = "Creating Card\nPlease wait..."
-    uid = GetCardUID(scanner=nfc)
-    card_uid = card_uid = f"{[i for i in uid]}".replace(" ", "")
-    if WriteBlock(scanner=nfc, block=block, key_b=key_b, data=card_pass):
+    uid = await wait_for_card()
+    card_uid = f"{[i for i in uid]}".replace(" ", "")
+    with monitor.timed("nfc"):
+        written = session.write_blocks(block=block, key_b=key_b, data=card_pass)
+    if written:
         lcd.clear()
         lcd.message = "Card Creation\nSuccessful!"
         toneSuccess()
-        card_pass = getCardPass(scanner=nfc)
+        card_pass = getCardPass(session)
         return {"uid":card_uid, "pass":card_pass}
     else:
         lcd.clear()
         lcd.message = "Card Creation\nFailed!"
         toneFail()
-        time.sleep(1)
+        await asyncio.sleep(1)
         return False
 
 # Button + lcd nav funtions
-def wait_for_button_press():
-    while True:        
-        if button_up.value or button_down.value or button_confirm.value:
-            time.sleep(0.1)
-            if button_up.value:
-                toneSuccess()
-                return "up"
-            if button_down.value:
-                toneSuccess()
-                return "down"
-            if button_confirm.value:
-                toneSuccess()
-                return "confirm"
-
-def navigate_options(options):
+async def wait_for_button_press():
+    # Presses come debounced from the keypad queue, the other tasks run until there is one
+    action = await buttons.next()
+    toneSuccess()
+    return action
+
+async def navigate_options(options):
+    keepalive.enter("menu")
+    buttons.clear()  # presses made while the scanner or card screens were shown aren't for the menu
     index = 0
     while True:
         lcd.clear()
-        lcd.message = "Select Action:\n"
-        lcd.message += options[index]
-        action = wait_for_button_press()
+        lcd.message = "Select Action:\n" + options[index]
+        action = await wait_for_button_press()
         if action == "up":
             index = (index - 1) % len(options)
         elif action == "down":
             index = (index + 1) % len(options)
         elif action == "confirm":
             lcd.clear()
+            print(f"[BUTTONS] {buttons.stats()}")
+            print(f"[LOOP] {monitor.report()}")
+            print(f"[MQTT] {keepalive.stats()}")
+            print(f"[MQTT] Governor: {governor.report()}")
             return index
         
 
@@ -238,14 +200,30 @@ def navigate_options(options):
 # ---------------
 
 # MQTT Functions
-waiting_for_action = False  
-def wait_for_action():
-    global waiting_for_action
-    waiting_for_action = True
+def mqtt_service():
+    # MQTT loop (keepalive + reconnect) + retries and deadlines of the scanner.checkcard requests
+    connected = keepalive.service()
+    # Events queued while the connection was gone go out in batches once it is back
+    if connected:
+        governor.service()
+    else:
+        # Telemetry the governor still held goes to flash instead of being lost
+        for topic, payload in governor.unsent(events.topics):
+            events.put(topic, payload)
+    events.service(governor.send_now if connected and governor.idle() else None)
+    for request_id, context in rpc.service(send=connected):
+        print(f"[MQTT] No reply for {request_id} within {rpc.deadline} s")
+        if context["shown"] is None:  # nothing shown for this tap yet
+            lcd.clear()
+            lcd.message = "No response\nTry again"
+            toneFail()
+
+async def wait_for_action(request_id: str):
+    # The reply is handled by the MQTT task, we only wait for it
     print("[DEBUG] Waiting for MQTT action...")
 
-    while waiting_for_action:
-        mqtt_client.loop()
+    while rpc.waiting(request_id):
+        await asyncio.sleep(0.01)
         
 def subscribe_to(topics: []):
     for topic in topics:
@@ -258,6 +236,7 @@ def connect(mqtt_client, userdata, flags, rc):
 
 def disconnect(mqtt_client, userdata, rc):
     print("[MQTT] Disconnected from MQTT Broker!")
+    keepalive.lost()
 
 def subscribe(mqtt_client, userdata, topic, granted_qos):
     print(f"[MQTT] Subscribed to {topic} with QOS level {granted_qos}")
@@ -268,40 +247,82 @@ def unsubscribe(mqtt_client, userdata, topic, pid):
 def publish(mqtt_client, userdata, topic, pid):
     print(f"[MQTT] Published to {topic} with PID {pid}")
 
-def message(client, topic, message):
-    global waiting_for_action
-    print(f"[MQTT] New message on topic {topic}: {message}")
+def showAction(action_id: int):
+    action = ["failed", "successful", "checkout"][action_id] if 0 <= action_id <= 2 else "invalid"
 
-    if topic == aio_user + "/feeds/scanner.action" and waiting_for_action:
-        data = json.loads(message)  # {"user":1, "action":1, "door_ip":"192.168.0.11"}
-        action_id = data["action"]
-        action = ["failed", "successful", "checkout"][action_id]
+    if action == "failed":  # not allowed
+        print("[DEBUG] Access not allowed")
+        toneFail()
+        lcd.clear()
+        lcd.message = "ERROR\nNo access!"
         
-        if action == "failed":  # not allowed
-            print("[DEBUG] Access not allowed")
-            toneFail()
-            lcd.clear()
-            lcd.message = "ERROR\nNo access!"
-            
-        elif action == "successful":  # allowed => open door
-            print("[DEBUG] Access allowed => opening door")
-            toneSuccess()
-            lcd.clear()
-            lcd.message = "Opening Door...\nPlease wait"
-            
-        elif action == "checkout":  # check out
-            print("[DEBUG] User checked out")
-            toneSuccess()
-            lcd.clear()
-            lcd.message = "Checking out...\nPlease wait"
-            
-        else:  # invalid action
-            print("[DEBUG] Invalid action")
-            lcd.clear()
-            lcd.message = "ERROR\nTry again"
-            toneFail()
+    elif action == "successful":  # allowed => open door
+        print("[DEBUG] Access allowed => opening door")
+        toneSuccess()
+        lcd.clear()
+        lcd.message = "Opening Door...\nPlease wait"
+        
+    elif action == "checkout":  # check out
+        print("[DEBUG] User checked out")
+        toneSuccess()
+        lcd.clear()
+        lcd.message = "Checking out...\nPlease wait"
         
-        waiting_for_action = False
+    else:  # invalid action
+        print("[DEBUG] Invalid action")
+        lcd.clear()
+        lcd.message = "ERROR\nTry again"
+        toneFail()
+
+def ValidAction(data):
+    # A reply without an int "action" (or with a door_ip that isn't text) is dropped,
+    # showAction() and the cache need them
+    action_id, door_ip = data.get("action"), data.get("door_ip")
+    return isinstance(action_id, int) and not isinstance(action_id, bool) and (not door_ip or isinstance(door_ip, str))
+
+def message(client, topic, message):
+    print(f"[MQTT] New message on topic {topic}: {message}")
+
+    if topic == throttle_topic:
+        governor.throttled(message)
+
+    elif topic == action_feed or topic == reply_feed:
+        reply = rpc.handle(topic, message)  # None if it isn't a reply to one of our requests
+        if reply:
+            request_id, context, data, seconds = reply  # data: {"id":"..", "user":1, "action":1, "door_ip":"192.168.0.11"}
+            print(f"[MQTT] Reply for {request_id} after {int(seconds*1000)} ms")
+            action_id = data["action"]
+            access_cache.put(context["key"], action_id, data.get("door_ip"))
+
+            if context["shown"] is None:
+                showAction(action_id)
+            elif action_id != context["shown"]:
+                # The backend doesn't agree with the cached answer, show the real one
+                print("[CACHE] Backend changed the cached decision")
+                showAction(action_id)
+
+# Tasks
+# Every part of the scanner is its own task, nothing may block the loop for longer
+# than LOOP_BUDGET ms (the loop monitor prints it when something does)
+async def mqtt_task():
+    while True:
+        with monitor.timed("mqtt"):
+            mqtt_service()
+        await asyncio.sleep(0.01)
+
+async def nfc_task():
+    # Searches for a card whenever the program asks for one (wait_for_card)
+    while True:
+        await card_wanted.wait()
+        card_wanted.clear()
+        await session.detect_async()
+        card_found.set()
+
+async def wait_for_card():
+    card_found.clear()
+    card_wanted.set()
+    await card_found.wait()
+    return session.uid
 
 # Connect to WiFi
 print(f"[WIFI] Connecting to WiFi ({os.getenv('WIFI_SSID')})")
@@ -337,10 +358,17 @@ mqtt_client.on_message = message
 # Create MQTT Connection
 print(f"[MQTT] Attempting to connect to {mqtt_client.broker}")
 mqtt_client.connect()
+# Keeps the connection alive in every state (menu, prompts, scanner) and reconnects when it drops
+keepalive = MqttKeepalive(mqtt_client)
 
 # Setup topics to subscribe to here
-topics = ["action"]
+# Replies for this scanner come on its own feed (scanner.action-<scanner id>)
+scanner_id = os.getenv("SCANNER_ID") or "".join([f"{b:02x}" for b in wifi.radio.mac_address[3:]])
+topics = ["action", f"action-{scanner_id}"]
 subscribe_to(topics)
+# Adafruit IO tells us here when we publish too much
+throttle_topic = aio_user + "/throttle"
+mqtt_client.subscribe(throttle_topic)
 
 # -------------
 # Pin Setup
@@ -349,6 +377,15 @@ subscribe_to(topics)
 nfc_sda = board.GP14
 nfc_scl = board.GP15
 nfc = InitiateNFC(i2c_sda=nfc_sda, i2c_scl=nfc_scl)
+# The PN532 searches for cards itself and pulls its IRQ pin low when it found one
+# (NFC_IRQ_PIN, "GP16" in settings.toml.example). With NFC_IRQ_PIN="" the watcher
+# asks the PN532 over I2C instead, every 20 ms
+nfc_irq, nfc_irq_pin = None, None
+if os.getenv("NFC_IRQ_PIN"):
+    nfc_irq_pin = getattr(board, os.getenv("NFC_IRQ_PIN"))
+    nfc_irq = DigitalInOut(nfc_irq_pin)
+    nfc_irq.switch_to_input(pull=digitalio.Pull.UP)
+nfc_watcher = CardWatcher(nfc, nfc_irq, irq_pin=nfc_irq_pin, autopoll=str(os.getenv("NFC_AUTOPOLL", 0)).strip().lower() in ("1", "true", "yes", "on"))
 
 # LCD Setup
 # PIN Setup
@@ -367,19 +404,16 @@ contrast.duty_cycle = int(65535 * (1 - contrast_percentage/100))
 lcd_columns = 16
 lcd_rows = 2
 # Initialize lcd
-lcd = characterlcd.Character_LCD_Mono(lcd_rs, lcd_en, lcd_d4, lcd_d5, lcd_d6, lcd_d7, lcd_columns, lcd_rows, lcd_backlight)
+# Only the characters that change are sent to the LCD, by the LCD task
+lcd = FramebufferLCD(characterlcd.Character_LCD_Mono(lcd_rs, lcd_en, lcd_d4, lcd_d5, lcd_d6, lcd_d7, lcd_columns, lcd_rows, lcd_backlight), lcd_columns, lcd_rows, auto_flush=False)
 
 # Button Setup
-button_up = DigitalInOut(board.GP10)
-button_down = DigitalInOut(board.GP11)
-button_confirm = DigitalInOut(board.GP12)
-
-button_up.switch_to_input(pull=digitalio.Pull.DOWN)
-button_down.switch_to_input(pull=digitalio.Pull.DOWN)
-button_confirm.switch_to_input(pull=digitalio.Pull.DOWN)
+# Scanned and debounced in the background (pressed = high, pulled down)
+buttons = ButtonEvents((board.GP10, board.GP11, board.GP12), ("up", "down", "confirm"), value_when_pressed=True)
 
 # Buzzer Setup
 buzzer = pwmio.PWMOut(board.GP13, variable_frequency=True)
+player = BuzzerPlayer(buzzer)
 
 
 # -------------
@@ -391,88 +425,148 @@ runnning = True
 
 check_card_feed = aio_user + "/feeds/scanner.checkcard"
 action_feed = aio_user + "/feeds/scanner.action"
+reply_feed = aio_user + "/feeds/scanner.action-" + scanner_id
 ip = str(wifi.radio.ipv4_address)
 key_a = StringToByteArray(os.getenv("CARD_KEY_A"), max_len=6)
 pass_block=os.getenv("CARD_PASS_BLOCK")
+pass_blocks = os.getenv("CARD_PASS_BLOCKS", 1)
+pass_data = bytearray(16*pass_blocks)
+pass_text = bytearray(16*pass_blocks)
 options = ["Start Scanner", "Card Info", ip]  # "Create Card" option removed
-
-while runnning:
-    choice = options[navigate_options(options)]
-
-    if choice == "Start Scanner":
-        while runnning:
-            lcd.clear()
-            lcd.message = "Scan Your\nAccess Card"
-            
-            uid = GetCardUID(scanner=nfc)
-            card_uid = f"{[i for i in uid]}".replace(" ", "")
-            card_pass = getCardPass(scanner=nfc)
+# Every publish goes through the rate governor: door commands first, then taps, telemetry is batched
+governor = PublishGovernor(mqtt_client, aio_user, rate=os.getenv("PUBLISH_RATE", 30), burst=os.getenv("PUBLISH_BURST", 5), priorities=((aio_user + "/feeds/lock.open", COMMAND), (check_card_feed, REQUEST)))
+# Payloads are compact JSON, PAYLOAD_FORMAT="binary" for a backend that reads lib/payload_codec.py
+binary_payloads = os.getenv("PAYLOAD_FORMAT") == "binary"
+if binary_payloads and max(16*pass_blocks, len(reply_feed.encode())) > MAX_STR:
+    print(f"[MQTT] Card pass or reply feed longer than {MAX_STR} bytes, sending JSON instead of binary")
+    binary_payloads = False
+encoder = PayloadEncoder(binary=binary_payloads, size=CheckcardSize(16*pass_blocks, len(reply_feed)))
+error_id = f"{scanner_id}-error"
+rpc = MqttRpc(governor, check_card_feed, reply_feed, scanner_id, deadline=os.getenv("ACTION_DEADLINE", 5), retries=os.getenv("ACTION_RETRIES", 2),
+              encode=lambda request_id, reply, tap: encoder.checkcard(tap[0], tap[1], ip, request_id=request_id, reply=reply), check=ValidAction)
+session = CardSession(nfc, watcher=nfc_watcher)
+card_wanted = asyncio.Event()
+card_found = asyncio.Event()
+monitor = LoopMonitor(budget_ms=os.getenv("LOOP_BUDGET", 50), report_every=os.getenv("LOOP_REPORT", 60))
+# Flash folder for events that couldn't be published (needs a writable CIRCUITPY, see lib/event_queue.py)
+events = EventQueue((check_card_feed, action_feed), folder=os.getenv("EVENT_QUEUE_DIR", "/queue"))
+access_cache = AccessCache(max_bytes=os.getenv("ACCESS_CACHE_BYTES", 8192), ttl=os.getenv("ACCESS_CACHE_TTL", 3600))
+
+async def scanner_task():
+    while runnning:
+        choice = options[await navigate_options(options)]
+
+        if choice == "Start Scanner":
+            keepalive.enter("scanner")
+            while runnning:
+                lcd.clear()
+                lcd.message = "Scan Your\nAccess Card"
             
-            if card_pass:
-                print(f"[DEBUG] Found card_pass for {card_uid}: {card_pass}")
-                mqtt_client.publish(check_card_feed, str({"uid":card_uid.replace(",", "."), "pass":card_pass, "ip":ip}).replace("'", '"'))
+                uid = await wait_for_card()
+                card_uid = f"{[i for i in uid]}".replace(" ", "")
+                card_pass = getCardPass(session)
             
+                if card_pass and not keepalive.connected:
+                    # The door can't be reached, the tap is only kept for the backend log ("queued").
+                    # The queue is on flash (readable over USB), so the pass is left out
+                    events.put(check_card_feed, encoder.queued_tap(uid, ip, int(time.time())))
+                    print(f"[QUEUE] No connection, tap of {card_uid} queued")
+                    lcd.clear()
+                    lcd.message = "No connection\nTry again"
+                    toneFail()
+                    await asyncio.sleep(2)
+                elif card_pass:
+                    print(f"[DEBUG] Found card_pass for {card_uid}: {card_pass}")
+                    # The backend always gets the tap, a cached decision is only answered sooner
+                    key = access_cache.key(uid, card_pass)
+                    cached = access_cache.get(key)
+                    started = time.monotonic_ns()
+                    request_id = rpc.request((uid, card_pass), context={"key": key, "shown": cached[0] if cached else None})
+                    session.mark("publish", started)
+
+                    started = time.monotonic_ns()
+                    if cached:
+                        # Answer from the cache, the backend reply confirms it in the background
+                        action_id, door_ip, expires = cached
+                        if action_id == ACTION_SUCCESSFUL and door_ip:
+                            governor.publish(OpenTopic(aio_user, DoorId(door_ip)), door_ip)
+                        showAction(action_id)
+                        session.mark("cache", started)
+                        print(f"[CACHE] {access_cache.stats()}")
+                    else:
+                        lcd.clear()
+                        lcd.message = "Loading...\nPlease wait"
+                        await wait_for_action(request_id)
+                        session.mark("action", started)
+                    session.report()
+                    await asyncio.sleep(2)
+                else:
+                    print("[ERROR] No Pass Found!")
+                    # Our own failure message comes back on scanner.action, the id keeps it from answering a pending tap
+                    events.send(governor.hand_over, action_feed, encoder.action(error_id, 0, 0), connected=keepalive.connected)
+                    lcd.clear()
+                    lcd.message = f"ERROR\nTry again"
+                    toneFail()
+                    await asyncio.sleep(0.5)
+        elif choice == "Create Card":
+            keepalive.enter("create card")
+            card = await configureNewCard(session)
+            card_pass = getCardPass(session)
+            if card and card_pass == card["pass"]:
                 lcd.clear()
-                lcd.message = "Loading...\nPlease wait"
-                wait_for_action()
-                time.sleep(2)
+                lcd.message = f"{card['uid']}\n{card['pass']}"
+            
+                print("[DEBUG] New card created succesfully!")
+                print("[INFO] Go to the web panel and create a new keycard with following info:")
+                print(f"CardUID: {card['uid']}")
+                print(f"UniquePass: {card['pass']}")
+                await asyncio.sleep(2)
             else:
-                print("[ERROR] No Pass Found!")
-                mqtt_client.publish(action_feed, str({"user":0,"action":0,"door_ip":0}).replace("'", '"'))
-                lcd.clear()
-                lcd.message = f"ERROR\nTry again"
                 toneFail()
-                time.sleep(0.5)
-    elif choice == "Create Card":
-        card = configureNewCard()
-        card_pass = getCardPass(scanner=nfc)
-        if card and card_pass == card["pass"]:
-            lcd.clear()
-            lcd.message = f"{card["uid"]}\n{card["pass"]}"
-            
-            print("[DEBUG] New card created succesfully!")
-            print("[INFO] Go to the web panel and create a new keycard with following info:")
-            print(f"CardUID: {card["uid"]}")
-            print(f"UniquePass: {card["pass"]}")
-            time.sleep(2)
-        else:
-            toneFail()
-            print("[DEBUG] New card creation failed! Password was not set correctly.")
+                print("[DEBUG] New card creation failed! Password was not set correctly.")
+                lcd.clear()
+                lcd.message = "Failed to\nSet Pass!"
+        elif choice == "Card Info":
+            keepalive.enter("card info")
             lcd.clear()
-            lcd.message = "Failed to\nSet Pass!"
-    elif choice == "Card Info":
-        lcd.clear()
-        lcd.message = "Connect to PC\n& Enter Key!"
+            lcd.message = "Connect to PC\n& Enter Key!"
         
-        key_b = None
-        while not key_b:
-            user_input = input("Enter Admin key (key_b): ")
-            key_b = StringToByteArray(user_input, max_len=6)
+            key_b = None
+            while not key_b:
+                user_input = await ask("Enter Admin key (key_b): ")
+                key_b = StringToByteArray(user_input, max_len=6)
         
-        lcd.clear()
-        lcd.message = "Scan Your\nAccess Card"
-        if AuthBlock(scanner=nfc, block=pass_block, key=key_b, b=True):
             lcd.clear()
-            lcd.message = "Auth Success!"
-            toneSuccess()
-
-            uid = GetCardUID(scanner=nfc)
-            card_uid = f"{[i for i in uid]}".replace(" ", "").replace("[", "").replace("]", "")
-            card_pass = getCardPass(scanner=nfc)
-
-            if card_pass:
+            lcd.message = "Scan Your\nAccess Card"
+            uid = await wait_for_card()
+            with monitor.timed("nfc"):
+                authenticated = session.authenticate(block=pass_block, key=key_b, b=True)
+            if authenticated:
                 lcd.clear()
-                lcd.message = f"{card_uid}\n{card_pass}"
-                print("[DEBUG] Card info read succesfully!")
-                print("[INFO] Go to the web panel and create a new keycard with following info:")
-                print(f"CardUID: [{card_uid}]")
-                print(f"UniquePass: {card_pass}")
-                time.sleep(2)
+                lcd.message = "Auth Success!"
+                toneSuccess()
+
+                card_uid = f"{[i for i in uid]}".replace(" ", "").replace("[", "").replace("]", "")
+                card_pass = getCardPass(session)
+
+                if card_pass:
+                    lcd.clear()
+                    lcd.message = f"{card_uid}\n{card_pass}"
+                    print("[DEBUG] Card info read succesfully!")
+                    print("[INFO] Go to the web panel and create a new keycard with following info:")
+                    print(f"CardUID: [{card_uid}]")
+                    print(f"UniquePass: {card_pass}")
+                    await asyncio.sleep(2)
+                else:
+                    lcd.clear()
+                    lcd.message = "Reading Failed!"
+                    toneFail()
             else:
                 lcd.clear()
-                lcd.message = "Reading Failed!"
+                lcd.message = "Auth Failed!"
                 toneFail()
-        else:
-            lcd.clear()
-            lcd.message = "Auth Failed!"
-            toneFail()
+
+async def main():
+    await asyncio.gather(scanner_task(), nfc_task(), mqtt_task(), lcd.run(), player.run(), monitor.run())
+
+asyncio.run(main())
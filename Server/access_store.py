@@ -0,0 +1,82 @@
+import json, os
+from card_store import CardStore
+from door_permissions import DoorPermissions
+
+# -------------
+# Access Store
+# -------------
+# Everything the decision service needs to answer a tap, in memory: the cards
+# (card_store.CardStore, keyed by UID with pass digests), the door every
+# scanner is mounted at (scanner ip -> door ip) and which doors a user may open
+# (door_permissions.DoorPermissions, own grants + groups; without any grants
+# every known card opens every door, as before). A lookup is one dict access,
+# nothing is scanned per tap.
+#
+# The store file is JSON, the cards can be in it as an export of the records
+# API (plain passes, digested while loading) or in a compact card file next
+# to it ("cards_file", see CardStore.save):
+#   {"cards": [{"uid": "[4.213.6.90]", "pass": "DevPass42", "user": 1}, ...],
+#    "cards_file": "store.cards",
+#    "scanners": {"192.168.0.20": "192.168.0.21", ...},
+#    "grants": {"1": ["192.168.0.21"], ...},
+#    "groups": {"staff": {"doors": ["192.168.0.21", ...], "users": [1, 2, ...]}, ...}}
+# card_snapshot.py turns a store into a snapshot file the service can open
+# without loading it.
+
+
+class AccessStore:
+    def __init__(self, cards: CardStore = None):
+        self.cards = cards if cards is not None else CardStore()
+        self.scanners = {}  # scanner ip: door ip
+        self.permissions = DoorPermissions()
+
+    def __len__(self):
+        return len(self.cards)
+
+    def add_card(self, uid, card_pass: str, user: int):
+        self.cards.add(uid, card_pass, user)
+
+    def remove_card(self, uid):
+        self.cards.remove(uid)
+
+    def add_scanner(self, scanner_ip: str, door_ip: str):
+        self.scanners[scanner_ip] = door_ip
+
+    def grant(self, user: int, door_ip: str):
+        self.permissions.grant(user, door_ip)
+
+    def revoke(self, user: int, door_ip: str):
+        self.permissions.revoke(user, door_ip)
+
+    def lookup(self, uid, card_pass: str):
+        # User id of the card, None if the card is unknown or the pass is wrong
+        return self.cards.check(uid, card_pass)
+
+    def door_of(self, scanner_ip: str):
+        return self.scanners.get(scanner_ip)
+
+    def may_open(self, user: int, door_ip: str):
+        return self.permissions.may_open(user, door_ip)
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path) as file:
+            data = json.load(file)
+        cards = None
+        if data.get("cards_file"):
+            cards = CardStore.load(os.path.join(os.path.dirname(os.path.abspath(path)), data["cards_file"]))
+        store = cls(cards)
+        for card in data.get("cards", ()):
+            store.add_card(card["uid"], card["pass"], card.get("user", 0))
+        for scanner_ip, door_ip in data.get("scanners", {}).items():
+            store.add_scanner(scanner_ip, door_ip)
+        store.permissions.load(data.get("grants", {}), data.get("groups", {}))
+        return store
+
+    def save(self, path: str):
+        # The cards go to a compact card file next to the JSON
+        cards_path = os.path.splitext(path)[0] + ".cards"
+        self.cards.save(cards_path)
+        with open(path, "w") as file:
+            grants, groups = self.permissions.save()
+            json.dump({"cards_file": os.path.basename(cards_path), "scanners": self.scanners, "grants": grants, "groups": groups}, file)
@@ -0,0 +1,346 @@
+import argparse, hmac, mmap, os, socket, struct, time, zlib
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+from card_store import DIGEST_SIZE, DigestKey, PassDigest, UidBytes, UidKey
+from access_store import AccessStore
+
+# -------------
+# Card Snapshot
+# -------------
+# The access store as one file the decision service maps into memory instead
+# of loading it: opening a snapshot reads the header and the scanner table,
+# the cards and grants stay on disk and the OS pages in what the taps touch.
+# A restarted service answers its first tap a few ms after it starts, also with
+# a million cards, and nothing has to be fetched from the records API again.
+#
+# Snapshot (big endian, so the records sort as bytes):
+#   "CSNAP1" | card count (4) | grant count (4) | scanner count (4) | salt (16)
+#   cards    : UID key (8) | user (4) | pass digest (16), sorted by UID key
+#   grants   : user (4) | door ip (4), sorted
+#   scanners : scanner ip (4) | door ip (4)
+# A card or grant is found with a binary search over the fixed records.
+#
+# Changes since the snapshot go to a write-ahead log next to it (<snapshot>.wal)
+# and are kept in a small dict that is checked before the snapshot. A WAL
+# record is fixed size with a CRC32, a record that was only half written ends
+# the log. compact() writes a new snapshot with the changes and empties the
+# log; every record is a "set" or "remove", so replaying a log twice (crash
+# between the two steps) gives the same result. Appends and compact() hold an
+# exclusive lock on the WAL, so a change written by another process while a
+# compaction runs waits for it instead of being emptied with the old log.
+# A running service follows the
+# log (and a compacted snapshot) of the provisioning commands below.
+#   python Server/card_snapshot.py build store.json store.snap
+#   python Server/card_snapshot.py add store.snap "[4.213.6.90]" DevPass42 --user 7
+#   python Server/card_snapshot.py grant store.snap 7 192.168.0.21
+#   python Server/card_snapshot.py compact store.snap
+MAGIC = b"CSNAP1"
+_HEADER = struct.Struct(">6sIII16s")
+_CARD = struct.Struct(">QI16s")
+_PAIR = struct.Struct(">II")
+_GRANT = struct.Struct(">Q")
+_WAL = struct.Struct(">BQI16s")
+WAL_RECORD_SIZE = _WAL.size + 4
+OP_CARD, OP_REMOVE_CARD, OP_GRANT, OP_REVOKE, OP_SCANNER, OP_REMOVE_SCANNER = 1, 2, 3, 4, 5, 6
+_REMOVED = object()
+
+
+def IpNumber(ip: str):
+    return int.from_bytes(socket.inet_aton(ip), "big")
+
+
+def IpText(number: int):
+    return socket.inet_ntoa(number.to_bytes(4, "big"))
+
+
+@contextmanager
+def LockedWal(path: str):
+    # The WAL opened for appending with an exclusive lock (flock, or byte 0 on Windows)
+    with open(path, "ab") as file:
+        if fcntl:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+        else:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield file
+        finally:
+            if fcntl:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def WriteSnapshot(path: str, salt: bytes, cards, grants, scanners):
+    # cards: packed card records, grants: user << 32 | door ip, scanners: {scanner ip: door ip}
+    cards = sorted(cards)
+    grants = sorted(set(grants))
+    with open(path + ".tmp", "wb") as file:
+        file.write(_HEADER.pack(MAGIC, len(cards), len(grants), len(scanners), salt))
+        file.write(b"".join(cards))
+        file.write(b"".join(_GRANT.pack(grant) for grant in grants))
+        file.write(b"".join(_PAIR.pack(IpNumber(scanner_ip), IpNumber(door_ip)) for scanner_ip, door_ip in sorted(scanners.items())))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def Build(store: AccessStore, path: str):
+    cards = store.cards
+    records = [_CARD.pack(cards.keys[row], cards.users[row], bytes(cards.digests[row * DIGEST_SIZE:(row + 1) * DIGEST_SIZE])) for row in range(len(cards))]
+    # The groups are resolved, the snapshot has the doors of every user
+    grants = [user << 32 | IpNumber(door_ip) for user, door_ip in store.permissions.pairs()]
+    with LockedWal(path + ".wal") as wal:
+        WriteSnapshot(path, cards.salt, records, grants, store.scanners)
+        wal.truncate(0)
+
+
+class CardSnapshot:
+    def __init__(self, path: str, secret: bytes = None, sync: bool = True):
+        self.path = path
+        self.wal_path = path + ".wal"
+        self.secret = secret
+        self.sync = sync  # fsync every WAL record
+        self.file = open(path, "rb")
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.card_count, self.grant_count, scanner_count, self.salt = _HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a card snapshot")
+        self.cards_at = _HEADER.size
+        self.grants_at = self.cards_at + _CARD.size * self.card_count
+        scanners_at = self.grants_at + _GRANT.size * self.grant_count
+        if len(self.map) != scanners_at + _PAIR.size * scanner_count:
+            raise ValueError(f"{path} is cut off")
+        self._key = DigestKey(self.salt, secret)
+        self._dummy = bytes(DIGEST_SIZE)
+        self.scanners = {}  # scanner ip: door ip, small enough to keep in memory
+        for n in range(scanner_count):
+            scanner_ip, door_ip = _PAIR.unpack_from(self.map, scanners_at + n * _PAIR.size)
+            self.scanners[IpText(scanner_ip)] = IpText(door_ip)
+        self.changed_cards = {}  # uid key: (user, digest) or _REMOVED, changes since the snapshot
+        self.changed_grants = {}  # user << 32 | door ip: True (granted) / False (revoked)
+        self.wal_offset = 0
+        self.follow()
+
+    def __len__(self):
+        count = self.card_count
+        for key, change in self.changed_cards.items():
+            count += (change is not _REMOVED) - (self._find(self.cards_at, _CARD.size, self.card_count, key.to_bytes(8, "big")) is not None)
+        return count
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    # Snapshot
+    def _find(self, at: int, size: int, count: int, key: bytes):
+        # Offset of the record starting with `key`, None if it isn't there
+        low, high = 0, count
+        width = len(key)
+        data = self.map
+        while low < high:
+            middle = (low + high) >> 1
+            offset = at + middle * size
+            found = data[offset:offset + width]
+            if found < key:
+                low = middle + 1
+            elif found > key:
+                high = middle
+            else:
+                return offset
+        return None
+
+    def _card(self, key: int):
+        change = self.changed_cards.get(key)
+        if change is not None:
+            return None if change is _REMOVED else change
+        offset = self._find(self.cards_at, _CARD.size, self.card_count, key.to_bytes(8, "big"))
+        if offset is None:
+            return None
+        return _CARD.unpack_from(self.map, offset)[1:]
+
+    def _granted(self, grant: int):
+        change = self.changed_grants.get(grant)
+        if change is not None:
+            return change
+        return self._find(self.grants_at, _GRANT.size, self.grant_count, grant.to_bytes(8, "big")) is not None
+
+    # Same lookups as AccessStore
+    def lookup(self, uid, card_pass):
+        try:
+            key = UidKey(uid)
+        except ValueError:
+            return None
+        if card_pass is None:
+            return None
+        card = self._card(key)
+        stored = self._dummy if card is None else card[1]
+        if not hmac.compare_digest(PassDigest(self._key, key, card_pass), stored) or card is None:
+            return None
+        return card[0]
+
+    def door_of(self, scanner_ip: str):
+        return self.scanners.get(scanner_ip)
+
+    def may_open(self, user: int, door_ip: str):
+        if not self.grant_count and not self.changed_grants:
+            return True
+        return self._granted(user << 32 | IpNumber(door_ip))
+
+    # Write-ahead log
+    def follow(self):
+        # Applies the WAL records added since the last call (by this or another process)
+        try:
+            if os.stat(self.path).st_ino != self.inode:
+                # Compacted by another process: the changes are in the new snapshot now
+                self.close()
+                self.__init__(self.path, self.secret, self.sync)
+                return 1
+            with open(self.wal_path, "rb") as file:
+                if os.fstat(file.fileno()).st_size < self.wal_offset:
+                    self.wal_offset = 0  # emptied by a compaction
+                file.seek(self.wal_offset)
+                data = file.read()
+        except OSError:
+            return 0
+        applied = 0
+        for offset in range(0, len(data) - WAL_RECORD_SIZE + 1, WAL_RECORD_SIZE):
+            record = data[offset:offset + WAL_RECORD_SIZE]
+            if zlib.crc32(record[:_WAL.size]) != int.from_bytes(record[_WAL.size:], "big"):
+                break
+            self._apply(*_WAL.unpack_from(record))
+            self.wal_offset += WAL_RECORD_SIZE
+            applied += 1
+        return applied
+
+    def _apply(self, op: int, a: int, b: int, digest: bytes):
+        if op == OP_CARD:
+            self.changed_cards[a] = (b, digest)
+        elif op == OP_REMOVE_CARD:
+            self.changed_cards[a] = _REMOVED
+        elif op in (OP_GRANT, OP_REVOKE):
+            self.changed_grants[a << 32 | b] = op == OP_GRANT
+        elif op == OP_SCANNER:
+            self.scanners[IpText(a)] = IpText(b)
+        elif op == OP_REMOVE_SCANNER:
+            self.scanners.pop(IpText(a), None)
+
+    def _append(self, op: int, a: int, b: int = 0, digest: bytes = bytes(DIGEST_SIZE)):
+        with LockedWal(self.wal_path) as wal:
+            # Nobody else writes now: catch up, a half written record at the end is cut off
+            self.follow()
+            wal.truncate(self.wal_offset)
+            record = _WAL.pack(op, a, b, digest)
+            wal.write(record + zlib.crc32(record).to_bytes(4, "big"))
+            wal.flush()
+            if self.sync:
+                os.fsync(wal.fileno())
+        self.wal_offset += WAL_RECORD_SIZE
+        self._apply(op, a, b, digest)
+
+    def add_card(self, uid, card_pass, user: int):
+        key = UidKey(uid)
+        self._append(OP_CARD, key, user, PassDigest(self._key, key, card_pass))
+
+    def remove_card(self, uid):
+        self._append(OP_REMOVE_CARD, UidKey(uid))
+
+    def grant(self, user: int, door_ip: str):
+        self._append(OP_GRANT, user, IpNumber(door_ip))
+
+    def revoke(self, user: int, door_ip: str):
+        self._append(OP_REVOKE, user, IpNumber(door_ip))
+
+    def add_scanner(self, scanner_ip: str, door_ip: str):
+        self._append(OP_SCANNER, IpNumber(scanner_ip), IpNumber(door_ip))
+
+    def remove_scanner(self, scanner_ip: str):
+        self._append(OP_REMOVE_SCANNER, IpNumber(scanner_ip))
+
+    def compact(self):
+        # New snapshot = old snapshot + WAL, then an empty WAL. Returns the reopened snapshot.
+        with LockedWal(self.wal_path) as wal:
+            self.follow()
+            self._compact()
+            wal.truncate(0)
+        self.close()
+        return CardSnapshot(self.path, self.secret, self.sync)
+
+    def _compact(self):
+        cards = []
+        for n in range(self.card_count):
+            offset = self.cards_at + n * _CARD.size
+            if int.from_bytes(self.map[offset:offset + 8], "big") not in self.changed_cards:
+                cards.append(self.map[offset:offset + _CARD.size])
+        cards += [_CARD.pack(key, *change) for key, change in self.changed_cards.items() if change is not _REMOVED]
+        grants = [grant for n in range(self.grant_count) for grant in _GRANT.unpack_from(self.map, self.grants_at + n * _GRANT.size) if self.changed_grants.get(grant, True)]
+        grants += [grant for grant, granted in self.changed_grants.items() if granted]
+        WriteSnapshot(self.path, self.salt, cards, grants, self.scanners)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build, change and compact a card snapshot")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="snapshot of an access store (JSON, see access_store.py)")
+    build.add_argument("store")
+    build.add_argument("snapshot")
+    for name in ("info", "compact"):
+        commands.add_parser(name).add_argument("snapshot")
+    add = commands.add_parser("add", help="add a card or change its pass/user")
+    add.add_argument("snapshot")
+    add.add_argument("uid")
+    add.add_argument("card_pass")
+    add.add_argument("--user", type=int, required=True)
+    remove = commands.add_parser("remove", help="remove a card")
+    remove.add_argument("snapshot")
+    remove.add_argument("uid")
+    for name in ("grant", "revoke"):
+        command = commands.add_parser(name, help=f"{name} a user a door")
+        command.add_argument("snapshot")
+        command.add_argument("user", type=int)
+        command.add_argument("door_ip")
+    scanner = commands.add_parser("scanner", help="set the door of a scanner (door ip - to remove the scanner)")
+    scanner.add_argument("snapshot")
+    scanner.add_argument("scanner_ip")
+    scanner.add_argument("door_ip")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.command == "build":
+        Build(AccessStore.load(args.store), args.snapshot)
+        print(f"[SNAPSHOT] Built {args.snapshot} in {time.perf_counter() - started:.1f} s")
+        args.command = "info"
+        started = time.perf_counter()
+    snapshot = CardSnapshot(args.snapshot)
+    print(f"[SNAPSHOT] Opened in {(time.perf_counter() - started) * 1000:.1f} ms, {snapshot.wal_offset // WAL_RECORD_SIZE} WAL records")
+    if args.command == "add":
+        snapshot.add_card(args.uid, args.card_pass, args.user)
+        print(f"[SNAPSHOT] Card {list(UidBytes(args.uid))} -> user {args.user}")
+    elif args.command == "remove":
+        snapshot.remove_card(args.uid)
+        print(f"[SNAPSHOT] Removed {list(UidBytes(args.uid))}")
+    elif args.command == "grant":
+        snapshot.grant(args.user, args.door_ip)
+    elif args.command == "revoke":
+        snapshot.revoke(args.user, args.door_ip)
+    elif args.command == "scanner":
+        if args.door_ip == "-":
+            snapshot.remove_scanner(args.scanner_ip)
+        else:
+            snapshot.add_scanner(args.scanner_ip, args.door_ip)
+    elif args.command == "compact":
+        snapshot = snapshot.compact()
+        print(f"[SNAPSHOT] Compacted in {time.perf_counter() - started:.1f} s")
+    if args.command in ("info", "compact"):
+        print(f"[SNAPSHOT] {len(snapshot)} cards, {snapshot.grant_count} grants, {len(snapshot.scanners)} scanners, {os.path.getsize(args.snapshot)} bytes + {snapshot.wal_offset} bytes WAL")
+    snapshot.close()
+
+
+if __name__ == "__main__":
+    main()
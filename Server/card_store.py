@@ -0,0 +1,165 @@
+import hmac, os, sys, struct, hashlib
+from array import array
+
+# -------------
+# Card Store
+# -------------
+# The cards by UID, kept as numbers instead of the text the scanner sends
+# ("[4.213.6.90]", "[4,213,6,90]" and the UID bytes all give the same key).
+# The pass itself is never stored, only a keyed digest of UID + pass, and it is
+# checked with hmac.compare_digest so the time a check takes doesn't depend on
+# how much of the pass was right. An unknown card is checked against a dummy
+# digest, so it takes the same time as a known card with a wrong pass.
+#
+# In memory: one dict UID key -> row and three columns (keys, users, digests)
+# in flat arrays, ~135 bytes per card (~245 for a dict of UID text and pass).
+# On disk the same columns one after the other, so loading is a few bulk
+# reads plus building the dict:
+#   "CARDS1" | count (4) | salt (16) | keys (8 x count) | users (4 x count) | digests (16 x count)
+# The digest key is the salt of the file plus an optional secret
+# (CARD_DIGEST_SECRET), without the secret a stolen file only allows guessing
+# passes one card at a time.
+MAGIC = b"CARDS1"
+DIGEST_SIZE = 16
+_HEADER = struct.Struct("<6sI16s")
+
+
+def UidBytes(uid):
+    # UID bytes from bytes, a list of numbers or the scanner's text
+    if isinstance(uid, (bytes, bytearray, memoryview)):
+        return bytes(uid)
+    if isinstance(uid, str):
+        text = uid.strip().strip("[]").replace(",", ".").replace(" ", "")
+        return bytes([int(part) for part in text.split(".") if part])
+    if isinstance(uid, (list, tuple)):
+        return bytes(uid)
+    # bytes(5) would be 5 zero bytes, an int (or anything else) is no UID
+    raise ValueError(f"UID as {type(uid).__name__}, give bytes, a list of numbers or the UID text")
+
+
+def UidKey(uid):
+    # The UID length in front keeps [0.1.2.3] and [1.2.3] apart, 4 and 7 byte UIDs fit in 64 bits
+    data = UidBytes(uid)
+    if not 0 < len(data) <= 7:
+        raise ValueError(f"UID of {len(data)} bytes, MIFARE Classic UIDs have 4 or 7")
+    return int.from_bytes(bytes([len(data)]) + data, "big")
+
+
+def UidOfKey(key: int):
+    data = key.to_bytes(8, "big").lstrip(b"\x00")
+    return data[1:1 + data[0]] if data else b""
+
+
+def DigestKey(salt: bytes, secret: bytes = None):
+    if secret is None:
+        secret = (os.getenv("CARD_DIGEST_SECRET") or "").encode()
+    return salt + secret
+
+
+def PassDigest(digest_key: bytes, key: int, card_pass):
+    if isinstance(card_pass, str):
+        card_pass = card_pass.encode("utf-8")
+    return hmac.new(digest_key, key.to_bytes(8, "big") + card_pass, hashlib.sha256).digest()[:DIGEST_SIZE]
+
+
+class CardStore:
+    def __init__(self, salt: bytes = None, secret: bytes = None):
+        self.salt = salt or os.urandom(16)
+        self._key = DigestKey(self.salt, secret)
+        self.index = {}  # uid key: row
+        self.keys = array("Q")
+        self.users = array("I")
+        self.digests = bytearray()
+        self._dummy = bytearray(DIGEST_SIZE)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, uid):
+        return UidKey(uid) in self.index
+
+    def digest(self, key: int, card_pass):
+        return PassDigest(self._key, key, card_pass)
+
+    # Changes
+    def add(self, uid, card_pass, user: int):
+        # New card or new pass/user for a known card
+        key = UidKey(uid)
+        digest = self.digest(key, card_pass)
+        row = self.index.get(key)
+        if row is None:
+            self.index[key] = len(self.keys)
+            self.keys.append(key)
+            self.users.append(user)
+            self.digests += digest
+        else:
+            self.users[row] = user
+            self.digests[row * DIGEST_SIZE:(row + 1) * DIGEST_SIZE] = digest
+
+    def remove(self, uid):
+        # The last row takes the place of the removed one
+        key = UidKey(uid)
+        row = self.index.pop(key, None)
+        if row is None:
+            return False
+        last = len(self.keys) - 1
+        if row != last:
+            self.keys[row] = self.keys[last]
+            self.users[row] = self.users[last]
+            self.digests[row * DIGEST_SIZE:(row + 1) * DIGEST_SIZE] = self.digests[last * DIGEST_SIZE:]
+            self.index[self.keys[row]] = row
+        self.keys.pop()
+        self.users.pop()
+        del self.digests[last * DIGEST_SIZE:]
+        return True
+
+    # Lookups
+    def user(self, uid):
+        row = self.index.get(UidKey(uid))
+        return None if row is None else self.users[row]
+
+    def check(self, uid, card_pass):
+        # User id when the card is known and the pass is right, else None
+        try:
+            key = UidKey(uid)
+        except ValueError:
+            return None
+        if card_pass is None:
+            return None
+        row = self.index.get(key)
+        stored = self._dummy if row is None else self.digests[row * DIGEST_SIZE:(row + 1) * DIGEST_SIZE]
+        if not hmac.compare_digest(self.digest(key, card_pass), stored) or row is None:
+            return None
+        return self.users[row]
+
+    # File
+    def save(self, path: str):
+        # Written next to the old file and renamed, a crash never leaves half a store
+        keys, users = array("Q", self.keys), array("I", self.users)
+        if sys.byteorder != "little":
+            keys.byteswap()
+            users.byteswap()
+        with open(path + ".tmp", "wb") as file:
+            file.write(_HEADER.pack(MAGIC, len(self.keys), self.salt))
+            file.write(keys.tobytes())
+            file.write(users.tobytes())
+            file.write(self.digests)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str, secret: bytes = None):
+        with open(path, "rb") as file:
+            magic, count, salt = _HEADER.unpack(file.read(_HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a card store")
+            store = cls(salt=salt, secret=secret)
+            store.keys.frombytes(file.read(8 * count))
+            store.users.frombytes(file.read(4 * count))
+            store.digests = bytearray(file.read(DIGEST_SIZE * count))
+        if len(store.keys) != count or len(store.users) != count or len(store.digests) != DIGEST_SIZE * count:
+            raise ValueError(f"{path} is cut off")
+        if sys.byteorder != "little":
+            store.keys.byteswap()
+            store.users.byteswap()
+        store.index = dict(zip(store.keys, range(count)))
+        return store
@@ -0,0 +1,95 @@
+import argparse, json, os, secrets, string, sys, time
+from card_store import CardStore, UidBytes
+
+# -------------
+# Card Tool
+# -------------
+# Provisioning on the computer side of the card store the decision service
+# reads. After "Create Card" or "Card Info" on the scanner, the CardUID and
+# UniquePass it prints are added here:
+#   python Server/card_tool.py store.cards add "[4,213,6,90]" DevPass42 --user 7
+#   python Server/card_tool.py store.cards check "[4,213,6,90]" DevPass42
+#   python Server/card_tool.py store.cards remove "[4,213,6,90]"
+#   python Server/card_tool.py store.cards import export.json    (records API export)
+#   python Server/card_tool.py store.cards password              (new random pass for a card)
+#   python Server/card_tool.py store.cards generate 1000000      (test data set)
+_PASS_CHARACTERS = string.ascii_letters + string.digits
+
+
+def NewPass(length: int = 16):
+    # Fills the pass block(s) of the card, 62^16 possibilities
+    return "".join(secrets.choice(_PASS_CHARACTERS) for i in range(length))
+
+
+def Open(path: str):
+    if os.path.exists(path):
+        return CardStore.load(path)
+    print(f"[CARDS] {path} does not exist yet, starting an empty store")
+    return CardStore()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add, remove and check cards in a card store file")
+    parser.add_argument("store", help="card store file (e.g. store.cards)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="add a card or change its pass/user")
+    add.add_argument("uid")
+    add.add_argument("card_pass")
+    add.add_argument("--user", type=int, required=True)
+    remove = commands.add_parser("remove", help="remove a card")
+    remove.add_argument("uid")
+    check = commands.add_parser("check", help="check a UID + pass like the decision service does")
+    check.add_argument("uid")
+    check.add_argument("card_pass")
+    load = commands.add_parser("import", help="add the cards of a records API export (JSON)")
+    load.add_argument("export")
+    password = commands.add_parser("password", help="print a new random card pass")
+    password.add_argument("--length", type=int, default=16)
+    generate = commands.add_parser("generate", help="fill the store with test cards (pass = Pass<n>)")
+    generate.add_argument("count", type=int)
+    commands.add_parser("info", help="number of cards and file size")
+    args = parser.parse_args()
+
+    if args.command == "password":
+        print(NewPass(args.length))
+        return
+
+    started = time.monotonic()
+    cards = Open(args.store)
+    print(f"[CARDS] {len(cards)} cards loaded in {(time.monotonic() - started) * 1000:.0f} ms")
+
+    if args.command == "add":
+        known = args.uid in cards
+        cards.add(args.uid, args.card_pass, args.user)
+        cards.save(args.store)
+        print(f"[CARDS] {'Updated' if known else 'Added'} {list(UidBytes(args.uid))} for user {args.user}")
+    elif args.command == "remove":
+        if cards.remove(args.uid):
+            cards.save(args.store)
+            print(f"[CARDS] Removed {list(UidBytes(args.uid))}")
+        else:
+            print(f"[CARDS] {list(UidBytes(args.uid))} is not in the store")
+    elif args.command == "check":
+        user = cards.check(args.uid, args.card_pass)
+        print(f"[CARDS] {'Allowed, user ' + str(user) if user is not None else 'Refused'}")
+        sys.exit(0 if user is not None else 1)
+    elif args.command == "import":
+        with open(args.export) as file:
+            records = json.load(file)
+        records = records.get("cards", records.get("records", [])) if isinstance(records, dict) else records
+        for card in records:
+            cards.add(card["uid"], card["pass"], card.get("user", 0))
+        cards.save(args.store)
+        print(f"[CARDS] Imported {len(records)} cards, {len(cards)} in the store")
+    elif args.command == "generate":
+        started = time.monotonic()
+        for i in range(args.count):
+            cards.add(bytes([4, i >> 16 & 0xFF, i >> 8 & 0xFF, i & 0xFF]) if i < 1 << 24 else bytes([4]) + i.to_bytes(6, "big"), f"Pass{i}", i + 1)
+        cards.save(args.store)
+        print(f"[CARDS] Generated {args.count} cards in {time.monotonic() - started:.1f} s")
+    if args.command in ("info", "generate", "import"):
+        print(f"[CARDS] {len(cards)} cards, {os.path.getsize(args.store)} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import argparse, asyncio, json, os, sys, time
+
+folder = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(folder, "..", "lib"))
+from payload_codec import DecodePayload
+from door_topics import DoorId, OpenTopic
+from access_store import AccessStore
+from card_snapshot import CardSnapshot
+from door_schedules import DoorSchedules
+
+# -------------
+# Decision Service
+# -------------
+# Answers the taps of the scanners: every scanner.checkcard (JSON or binary,
+# see lib/payload_codec.py) is looked up in the access store and answered with
+# a scanner.action on the reply feed of the scanner, plus lock.open-<door id>
+# for the door of that scanner when the card is allowed.
+#
+# Taps the scanner queued while it was offline ("queued": 1, with the UID, the
+# scanner ip and the time of the tap but no pass) are only logged, they never
+# open a door: the person is long gone by the time they arrive.
+#
+# One asyncio task, no thread per tap: everything the broker sends in one read
+# is decided in one go and all answers go out in one write. It talks to the
+# broker stand-in of Simulation/broker.py (one JSON object per line).
+#
+# With --snapshot the cards are not loaded but mapped from a snapshot
+# (Server/card_snapshot.py), the service answers taps right after a restart
+# and picks up the changes the provisioning tools write to its WAL.
+#
+# With --schedules a door only opens during its hours (Server/door_schedules.py),
+# outside them the tap is refused like a card without rights for the door.
+#
+#   python Server/decision_service.py --store cards.json --port 1883
+#   python Server/decision_service.py --snapshot store.snap --schedules hours.json
+ACTION_FAILED = 0
+ACTION_SUCCESSFUL = 1
+
+
+def ActionJson(request_id, user: int, action: int, door_ip: str = None):
+    # Same JSON as PayloadEncoder.action(), the scanner reads the reply with json.loads
+    door = json.dumps(door_ip) if door_ip else "0"
+    if request_id is None:
+        return f'{{"user":{user},"action":{action},"door_ip":{door}}}'.encode()
+    return f'{{"id":{json.dumps(request_id)},"user":{user},"action":{action},"door_ip":{door}}}'.encode()
+
+
+class DecisionService:
+    def __init__(self, store: AccessStore, aio_user: str, log=None, schedules: DoorSchedules = None):
+        self.store = store
+        self.schedules = schedules  # None = every door can be opened at any time
+        self.aio_user = aio_user
+        self.log = log  # file for the access log, None = no log
+        self.checkcard_topic = aio_user + "/feeds/scanner.checkcard"
+        self.action_topic = aio_user + "/feeds/scanner.action"
+        self.stats = {"taps": 0, "allowed": 0, "refused": 0, "queued": 0, "invalid": 0}
+        self.busy = 0.0  # seconds spent deciding
+        self.connected = False
+
+    def _log(self, data, result: str):
+        if self.log:
+            self.log.write(f"{data.get('time', time.time()):.3f},{data.get('uid')},{data.get('ip')},{data.get('id', '')},{result}\n")
+
+    @staticmethod
+    def _valid(data):
+        # uid, ip (and pass, except for queued taps) have to be text, anything else is dropped
+        if not isinstance(data, dict) or not isinstance(data.get("uid"), str) or not isinstance(data.get("ip"), str):
+            return False
+        if data.get("queued"):
+            return isinstance(data.get("time", 0), (int, float))
+        return isinstance(data.get("pass"), str)
+
+    def decide(self, data):
+        # (user id, door ip) when the card may open the door of its scanner, else None
+        user = self.store.lookup(data["uid"], data["pass"])
+        if user is None:
+            return None
+        door_ip = self.store.door_of(data.get("ip"))
+        if door_ip is None or not self.store.may_open(user, door_ip):
+            return None
+        if self.schedules and not self.schedules.is_open(door_ip):
+            return None
+        return user, door_ip
+
+    def handle(self, topic: str, payload):
+        # The messages to publish for one incoming message: [(topic, payload), ...]
+        if topic != self.checkcard_topic:
+            return ()
+        try:
+            data = DecodePayload(payload)
+        except (ValueError, IndexError, UnicodeDecodeError):
+            self.stats["invalid"] += 1
+            return ()
+        if not self._valid(data):
+            self.stats["invalid"] += 1
+            return ()
+        if data.get("queued"):
+            self.stats["queued"] += 1
+            self._log(data, "queued")
+            return ()
+        self.stats["taps"] += 1
+        reply = data.get("reply")
+        if reply != self.action_topic and not (isinstance(reply, str) and reply.startswith(self.action_topic + "-")):
+            reply = self.action_topic  # only a scanner.action feed, never e.g. a lock.open feed
+        decision = self.decide(data)
+        if decision is None:
+            self.stats["refused"] += 1
+            self._log(data, "refused")
+            return ((reply, ActionJson(data.get("id"), 0, ACTION_FAILED)),)
+        user, door_ip = decision
+        self.stats["allowed"] += 1
+        self._log(data, "allowed")
+        return ((reply, ActionJson(data.get("id"), user, ACTION_SUCCESSFUL, door_ip)), (OpenTopic(self.aio_user, DoorId(door_ip)), door_ip.encode()))
+
+    # Broker connection
+    def _receive(self, lines):
+        # Decides every message of one read, returns the answers as one block of lines
+        started = time.perf_counter()
+        out = []
+        for line in lines:
+            if not line:
+                continue
+            try:
+                message = json.loads(line)
+            except ValueError:
+                self.stats["invalid"] += 1
+                continue
+            if not isinstance(message, dict) or message.get("op") != "pub":
+                continue
+            if not isinstance(message.get("topic"), str) or not isinstance(message.get("payload"), str):
+                self.stats["invalid"] += 1
+                continue
+            try:
+                payload = message["payload"].encode("latin-1")
+            except UnicodeEncodeError:
+                self.stats["invalid"] += 1
+                continue
+            for topic, payload in self.handle(message["topic"], payload):
+                out.append(f'{{"op":"pub","topic":{json.dumps(topic)},"payload":{json.dumps(payload.decode("latin-1"))}}}\n')
+        self.busy += time.perf_counter() - started
+        return "".join(out).encode()
+
+    async def run(self, host: str = "127.0.0.1", port: int = 1883):
+        backoff = 1
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(host, port)
+            except OSError as error:
+                print(f"[DECISION] Broker {host}:{port} not reachable ({error}), retrying in {backoff} s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+            backoff = 1
+            writer.write((json.dumps({"op": "sub", "topic": self.checkcard_topic}) + "\n").encode())
+            self.connected = True
+            print(f"[DECISION] Connected to {host}:{port}, {len(self.store)} cards, {len(self.store.scanners)} scanners")
+            rest = b""
+            while True:
+                chunk = await reader.read(1 << 16)
+                if not chunk:
+                    break
+                lines = (rest + chunk).split(b"\n")
+                rest = lines.pop()
+                answers = self._receive(lines)
+                if answers:
+                    writer.write(answers)
+                    await writer.drain()
+            self.connected = False
+            writer.close()
+            print("[DECISION] Connection to the broker lost")
+
+    async def report(self, every: float = 10):
+        last = dict(self.stats)
+        last_busy = self.busy
+        while True:
+            await asyncio.sleep(every)
+            taps = self.stats["taps"] - last["taps"]
+            busy = self.busy - last_busy
+            print(f"[DECISION] {taps / every:.0f} taps/s, {busy / taps * 1000000 if taps else 0:.1f} us/tap ; {self.stats}")
+            if self.log:
+                self.log.flush()
+            last = dict(self.stats)
+            last_busy = self.busy
+
+
+async def FollowSnapshot(snapshot: CardSnapshot, every: float = 1):
+    while True:
+        await asyncio.sleep(every)
+        changes = snapshot.follow()
+        if changes:
+            print(f"[DECISION] {changes} changes from the snapshot WAL")
+
+
+async def main(args):
+    started = time.monotonic()
+    if args.snapshot:
+        store = CardSnapshot(args.snapshot)
+        tasks = [FollowSnapshot(store)]
+    else:
+        store = AccessStore.load(args.store)
+        tasks = []
+    print(f"[DECISION] Loaded {len(store)} cards in {(time.monotonic() - started) * 1000:.1f} ms")
+    schedules = DoorSchedules.load(args.schedules) if args.schedules else None
+    if schedules:
+        print(f"[DECISION] Schedules for {len(schedules)} doors")
+    log = open(args.log, "a", buffering=1 << 16) if args.log else None
+    service = DecisionService(store, args.user, log=log, schedules=schedules)
+    await asyncio.gather(service.run(args.host, args.port), service.report(args.report), *tasks)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answers scanner.checkcard with scanner.action and lock.open")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--store", help="JSON file with the cards and the scanner doors")
+    source.add_argument("--snapshot", help="card snapshot (Server/card_snapshot.py), mapped instead of loaded")
+    parser.add_argument("--user", default=os.getenv("AIO_USER") or "sim", help="AIO_USER of the feeds")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--schedules", help="JSON file with the hours of the doors (Server/door_schedules.py)")
+    parser.add_argument("--log", help="append every tap to this CSV file (time, uid, scanner ip, id, result)")
+    parser.add_argument("--report", type=float, default=10, help="seconds between reports")
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
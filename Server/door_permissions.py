@@ -0,0 +1,161 @@
+# -------------
+# Door Permissions
+# -------------
+# Which doors every user may open, as one row of bits per user: door n is bit
+# n of the row, all rows are packed one after the other in one bytearray. A
+# check is one dict lookup for the row and one byte test, whatever the number
+# of users, doors or groups (100k users x 200 doors = 2.5 MB).
+#
+# The rights of a user are its own grants plus the doors of its groups. When
+# the door list of a group changes only the members of that group are
+# recomputed, and only a user's own groups are looked at to do it; the other
+# users keep their rows.
+#
+# Without any door in the table every user may open every door, like before
+# there were permissions.
+
+
+class DoorPermissions:
+    def __init__(self, doors: int = 64):
+        self.doors = []  # bit: door ip
+        self.door_bits = {}  # door ip: bit
+        self.stride = max(1, (doors + 7) // 8)  # bytes per user row
+        self.rows = bytearray()
+        self.user_rows = {}  # user: row
+        self.direct = {}  # user: doors granted to the user itself (bitmask)
+        self.groups = {}  # group: doors of the group (bitmask)
+        self.members = {}  # group: set of users
+        self.user_groups = {}  # user: tuple of groups (a user is in a few, a tuple is a quarter of a set)
+        self.stats = {"group_updates": 0, "rows_written": 0}
+
+    def __len__(self):
+        return len(self.user_rows)
+
+    # Bits and rows
+    def _bit(self, door_ip: str):
+        bit = self.door_bits.get(door_ip)
+        if bit is None:
+            bit = len(self.doors)
+            self.doors.append(door_ip)
+            self.door_bits[door_ip] = bit
+            if bit >= self.stride * 8:
+                self._widen(self.stride * 2)
+        return bit
+
+    def _widen(self, stride: int):
+        # More doors than the rows have bits: every row gets wider (rare)
+        rows = bytearray(stride * len(self.user_rows))
+        for row in range(len(self.user_rows)):
+            rows[row * stride:row * stride + self.stride] = self.rows[row * self.stride:(row + 1) * self.stride]
+        self.rows = rows
+        self.stride = stride
+
+    def _mask(self, door_ips):
+        mask = 0
+        for door_ip in door_ips:
+            mask |= 1 << self._bit(door_ip)
+        return mask
+
+    def _refresh(self, user: int):
+        # Writes the row of one user from its own grants and its groups
+        mask = self.direct.get(user, 0)
+        for group in self.user_groups.get(user, ()):
+            mask |= self.groups[group]
+        row = self.user_rows.get(user)
+        if row is None:
+            row = len(self.user_rows)
+            self.user_rows[user] = row
+            self.rows += bytes(self.stride)
+        self.rows[row * self.stride:(row + 1) * self.stride] = mask.to_bytes(self.stride, "little")
+        self.stats["rows_written"] += 1
+
+    # Check
+    def may_open(self, user: int, door_ip: str):
+        bit = self.door_bits.get(door_ip)
+        row = self.user_rows.get(user)
+        if bit is None or row is None:
+            return not self.doors
+        return self.rows[row * self.stride + (bit >> 3)] >> (bit & 7) & 1 == 1
+
+    def doors_of(self, user: int):
+        row = self.user_rows.get(user)
+        if row is None:
+            return []
+        mask = int.from_bytes(self.rows[row * self.stride:(row + 1) * self.stride], "little")
+        return [door_ip for bit, door_ip in enumerate(self.doors) if mask >> bit & 1]
+
+    def pairs(self):
+        # Every (user, door ip) that is allowed
+        for user in self.user_rows:
+            for door_ip in self.doors_of(user):
+                yield user, door_ip
+
+    # Grants of one user
+    def grant(self, user: int, door_ip: str):
+        self.direct[user] = self.direct.get(user, 0) | 1 << self._bit(door_ip)
+        self._refresh(user)
+
+    def revoke(self, user: int, door_ip: str):
+        if door_ip in self.door_bits:
+            self.direct[user] = self.direct.get(user, 0) & ~(1 << self.door_bits[door_ip])
+            self._refresh(user)
+
+    # Groups
+    def set_group(self, group: str, door_ips):
+        # New door list for a group, returns how many users were recomputed
+        mask = self._mask(door_ips)
+        if self.groups.get(group) == mask:
+            return 0
+        self.groups[group] = mask
+        self.members.setdefault(group, set())
+        self.stats["group_updates"] += 1
+        for user in self.members[group]:
+            self._refresh(user)
+        return len(self.members[group])
+
+    def remove_group(self, group: str):
+        if group not in self.groups:
+            return 0
+        members = self.members.pop(group)
+        del self.groups[group]
+        for user in members:
+            self.user_groups[user] = tuple(name for name in self.user_groups[user] if name != group)
+            self._refresh(user)
+        return len(members)
+
+    def add_member(self, group: str, user: int):
+        if group not in self.groups:
+            self.set_group(group, ())
+        if user not in self.members[group]:
+            self.members[group].add(user)
+            self.user_groups[user] = self.user_groups.get(user, ()) + (group,)
+        self._refresh(user)
+
+    def remove_member(self, group: str, user: int):
+        if user in self.members.get(group, ()):
+            self.members[group].discard(user)
+            self.user_groups[user] = tuple(name for name in self.user_groups[user] if name != group)
+            self._refresh(user)
+
+    # Store file (see access_store.py)
+    def load(self, grants, groups):
+        # grants: {user: [door ip, ...]}, groups: {group: {"doors": [...], "users": [...]}}
+        for group, data in groups.items():
+            self.groups[group] = self._mask(data.get("doors", ()))
+            self.members[group] = {int(user) for user in data.get("users", ())}
+            for user in self.members[group]:
+                self.user_groups[user] = self.user_groups.get(user, ()) + (group,)
+        for user, door_ips in grants.items():
+            self.direct[int(user)] = self._mask(door_ips)
+        for user in set(self.direct) | set(self.user_groups):
+            self._refresh(user)
+
+    def save(self):
+        grants = {}
+        for user, mask in self.direct.items():
+            if mask:
+                grants[str(user)] = [door_ip for bit, door_ip in enumerate(self.doors) if mask >> bit & 1]
+        groups = {}
+        for group, mask in self.groups.items():
+            groups[group] = {"doors": [door_ip for bit, door_ip in enumerate(self.doors) if mask >> bit & 1], "users": sorted(self.members[group])}
+        return grants, groups
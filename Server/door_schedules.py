@@ -0,0 +1,131 @@
+import json, time
+from bisect import bisect_right
+
+# -------------
+# Door Schedules
+# -------------
+# The hours a door can be opened with a card. The rules of a door are compiled
+# into a bitmap of the week, one bit per minute (10080 bits = 1260 bytes per
+# door), so a check is one bit test whatever the number of rules. The minutes
+# where the door changes between open and closed are kept sorted, the answer
+# of a door is cached until its next change (found with a binary search) and
+# the taps until then don't even look at the clock fields.
+#
+# Schedules file, door ip -> rules (a door without rules can always be opened):
+#   {"192.168.0.21": [{"days": "mon-fri", "from": "07:30", "to": "18:00"},
+#                     {"days": "sat", "from": "09:00", "to": "12:00"}],
+#    "192.168.0.22": [{"days": "daily", "from": "22:00", "to": "06:00"}]}
+# "to" before "from" runs past midnight into the next day, "to" "24:00" is the
+# end of the day. The times are the local time of the service. The cache is
+# kept for at most an hour, so a daylight saving change is picked up.
+DAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+MAX_CACHE = 3600  # seconds
+
+
+def ParseDays(text: str):
+    # "mon-fri", "sat,sun", "daily" -> [day numbers, monday = 0]
+    text = text.strip().lower()
+    if text in ("daily", "*", ""):
+        return list(range(7))
+    days = []
+    for part in text.split(","):
+        first, _, last = part.strip().partition("-")
+        start = DAYS.index(first[:3])
+        end = DAYS.index(last[:3]) if last else start
+        days += [day % 7 for day in range(start, end + 1 if end >= start else end + 8)]
+    return days
+
+
+def ParseTime(text: str):
+    # "07:30" -> minutes since midnight
+    hours, _, minutes = text.strip().partition(":")
+    minute = int(hours) * 60 + int(minutes or 0)
+    if not 0 <= minute <= MINUTES_PER_DAY:
+        raise ValueError(f"time {text} is not between 00:00 and 24:00")
+    return minute
+
+
+def MinuteOfWeek(now: float):
+    moment = time.localtime(now)
+    return moment.tm_wday * MINUTES_PER_DAY + moment.tm_hour * 60 + moment.tm_min, moment.tm_sec + now % 1
+
+
+class DoorSchedules:
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.rules = {}  # door ip: rules as given
+        self.bitmaps = {}  # door ip: bytearray, bit n = minute n of the week (monday 00:00 = 0)
+        self.boundaries = {}  # door ip: sorted minutes where the door opens or closes
+        self.cache = {}  # door ip: (open, from, until)
+        self.stats = {"checks": 0, "cached": 0, "closed": 0}
+
+    def __len__(self):
+        return len(self.bitmaps)
+
+    def set(self, door_ip: str, rules):
+        week = 0  # the bitmap as one number while it is built
+        for rule in rules:
+            start, end = ParseTime(rule.get("from", "00:00")), ParseTime(rule.get("to", "24:00"))
+            span = (1 << (end - start if end > start else end + MINUTES_PER_DAY - start)) - 1
+            for day in ParseDays(rule.get("days", "daily")):
+                week |= span << (day * MINUTES_PER_DAY + start)
+        week = (week | week >> MINUTES_PER_WEEK) & (1 << MINUTES_PER_WEEK) - 1  # sunday night runs into monday
+        # Bit n of `changes` is set when minute n differs from minute n - 1
+        changes = week ^ ((week << 1 | week >> (MINUTES_PER_WEEK - 1)) & (1 << MINUTES_PER_WEEK) - 1)
+        boundaries = []
+        while changes:
+            lowest = changes & -changes
+            boundaries.append(lowest.bit_length() - 1)
+            changes ^= lowest
+        self.rules[door_ip] = list(rules)
+        self.bitmaps[door_ip] = bytearray(week.to_bytes(MINUTES_PER_WEEK // 8, "little"))
+        self.boundaries[door_ip] = boundaries
+        self.cache.pop(door_ip, None)
+
+    def remove(self, door_ip: str):
+        for table in (self.rules, self.bitmaps, self.boundaries, self.cache):
+            table.pop(door_ip, None)
+
+    @staticmethod
+    def _bit(bitmap, minute: int):
+        minute %= MINUTES_PER_WEEK
+        return bitmap[minute >> 3] >> (minute & 7) & 1
+
+    def is_open(self, door_ip: str, now: float = None):
+        # True when a card may open the door now (always for a door without rules)
+        bitmap = self.bitmaps.get(door_ip)
+        if bitmap is None:
+            return True
+        now = self.clock() if now is None else now
+        self.stats["checks"] += 1
+        cached = self.cache.get(door_ip)
+        if cached and cached[1] <= now < cached[2]:
+            self.stats["cached"] += 1
+            is_open = cached[0]
+        else:
+            minute, seconds = MinuteOfWeek(now)
+            is_open = self._bit(bitmap, minute) == 1
+            boundaries = self.boundaries[door_ip]
+            until = now + MAX_CACHE
+            if boundaries:
+                n = bisect_right(boundaries, minute)
+                change = boundaries[n] if n < len(boundaries) else boundaries[0] + MINUTES_PER_WEEK
+                until = min(until, now - seconds + (change - minute) * 60)
+            self.cache[door_ip] = (is_open, now - seconds, until)
+        if not is_open:
+            self.stats["closed"] += 1
+        return is_open
+
+    @classmethod
+    def load(cls, path: str, clock=time.time):
+        schedules = cls(clock)
+        with open(path) as file:
+            for door_ip, rules in json.load(file).items():
+                schedules.set(door_ip, rules)
+        return schedules
+
+    def save(self, path: str):
+        with open(path, "w") as file:
+            json.dump(self.rules, file, indent=1)
@@ -0,0 +1,133 @@
+import argparse, asyncio, json, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+from payload_codec import DecodePayload, PayloadEncoder
+from door_topics import DoorId, OpenTopic
+
+# -------------
+# Broker Stand-in
+# -------------
+# A small local stand-in for the MQTT broker (Adafruit IO) the simulated
+# devices connect to (see shim/adafruit_minimqtt). Clients send one JSON object
+# per line: {"op": "sub"/"unsub", "topic": ...} or {"op": "pub", "topic": ...,
+# "payload": <bytes as latin-1>}. Topics support the MQTT wildcards + and #.
+# No QoS, retain or authentication.
+#
+# --allow-all <door ip> answers every scanner.checkcard itself (action 1 and a
+# lock.open-<door id> for that door), so a scanner and a door can run without
+# the backend.
+
+
+def TopicMatches(pattern: str, topic: str):
+    pattern_parts = pattern.split("/")
+    topic_parts = topic.split("/")
+    for i, part in enumerate(pattern_parts):
+        if part == "#":
+            return True
+        if i >= len(topic_parts) or (part != "+" and part != topic_parts[i]):
+            return False
+    return len(pattern_parts) == len(topic_parts)
+
+
+class Broker:
+    def __init__(self):
+        self.clients = {}  # writer: [patterns]
+        self.listeners = []  # (pattern, callback(topic, payload)) inside this process
+        self.messages = 0
+        self.per_topic = {}
+        self.started = time.monotonic()
+
+    def listen(self, pattern: str, callback):
+        self.listeners.append((pattern, callback))
+
+    def publish(self, topic: str, payload):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        self.messages += 1
+        # Per feed, the lock.open-<door id> and scanner.action-<scanner id> feeds together
+        key = topic.split("/feeds/")[-1] if "/feeds/" in topic else topic
+        if "-" in key:
+            key = key.split("-")[0] + "-*"
+        self.per_topic[key] = self.per_topic.get(key, 0) + 1
+        line = (json.dumps({"op": "pub", "topic": topic, "payload": payload.decode("latin-1")}) + "\n").encode()
+        for writer, patterns in list(self.clients.items()):
+            for pattern in patterns:
+                if TopicMatches(pattern, topic):
+                    writer.write(line)
+                    break
+        for pattern, callback in self.listeners:
+            if TopicMatches(pattern, topic):
+                callback(topic, payload)
+
+    async def _client(self, reader, writer):
+        self.clients[writer] = []
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                op = message.get("op")
+                if op == "sub":
+                    self.clients[writer].append(message["topic"])
+                elif op == "unsub":
+                    self.clients[writer] = [p for p in self.clients[writer] if p != message["topic"]]
+                elif op == "pub":
+                    self.publish(message["topic"], message["payload"].encode("latin-1"))
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            del self.clients[writer]
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 1883):
+        return await asyncio.start_server(self._client, host, port)
+
+    def report(self):
+        seconds = time.monotonic() - self.started
+        topics = ", ".join([f"{topic} {count}" for topic, count in sorted(self.per_topic.items())])
+        return f"{self.messages} messages ({self.messages / seconds:.1f}/s), {len(self.clients)} clients ; {topics}"
+
+
+def AllowAll(broker: Broker, aio_user: str, door_ip: str):
+    # Backend stand-in: every tap is allowed for `door_ip`
+    encoder = PayloadEncoder()
+
+    def checkcard(topic, payload):
+        try:
+            data = DecodePayload(payload)
+        except ValueError:
+            return
+        if data.get("queued"):
+            return
+        reply = data.get("reply") or aio_user + "/feeds/scanner.action"
+        broker.publish(reply, encoder.action(data.get("id"), 1, 1, door_ip))
+        broker.publish(OpenTopic(aio_user, DoorId(door_ip)), door_ip.encode())
+
+    broker.listen(aio_user + "/feeds/scanner.checkcard", checkcard)
+
+
+async def main(args):
+    broker = Broker()
+    if args.allow_all:
+        AllowAll(broker, args.user, args.allow_all)
+    server = await broker.serve(args.host, args.port)
+    print(f"[BROKER] Listening on {args.host}:{args.port}")
+    async with server:
+        while True:
+            await asyncio.sleep(args.stats)
+            print(f"[BROKER] {broker.report()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local MQTT broker stand-in for the simulated devices")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--user", default="sim", help="AIO_USER of the simulated devices")
+    parser.add_argument("--allow-all", metavar="DOOR_IP", help="answer every tap with an open command for this door")
+    parser.add_argument("--stats", type=float, default=10, help="seconds between message reports")
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,250 @@
+import argparse, asyncio, json, os, random, sys, time
+from collections import deque
+
+folder = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(folder, "..", "lib"))
+sys.path.insert(0, folder)
+from payload_codec import DecodePayload, PayloadEncoder
+from door_topics import DoorId, OpenTopic
+from broker import Broker
+
+# -------------
+# Fleet Load Generator
+# -------------
+# N scanners and M locks in one process, each with its own connection to the
+# broker stand-in (broker.py), using the same topics and payloads as
+# Scanner-Final.py and Deurslot-Final.py:
+#   scanner -> scanner.checkcard          {"uid", "pass", "ip", "id", "reply"}
+#   backend -> scanner.action-<scanner>   {"id", "user", "action", "door_ip"}
+#   backend -> lock.open-<door id>        door ip
+#   lock    -> lock.status                {"door_ip", "status", "age_ms"}
+# Every scanner taps with exponential gaps (Poisson, --rate taps/s each) and
+# belongs to door `scanner % locks`. A tap is matched with the next unlock of
+# its door, so "tap -> unlock" is the time from publishing checkcard until the
+# lock has its open command.
+#
+# --backend fleet runs a stand-in backend here (also a broker client): every
+# known card is allowed on the door of its scanner, --deny of the cards are
+# refused. --backend external leaves the answers to another service, e.g.
+# Server/decision_service.py with the store of --export-store (same options).
+#
+#   python Simulation/broker.py &
+#   python Simulation/load_generator.py --scanners 50 --locks 10 --rate 0.5 --duration 30
+
+
+def Percentile(values, p):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class SimClient:
+    # One broker connection, messages are handed to on_message(topic, payload)
+    def __init__(self, stats, on_message=None):
+        self.stats = stats
+        self.on_message = on_message
+        self.reader = None
+        self.writer = None
+        self.receiving = None
+
+    async def connect(self, host: str, port: int):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        self.receiving = asyncio.create_task(self._receive())
+
+    async def close(self):
+        self.receiving.cancel()
+        self.writer.close()
+        await self.writer.wait_closed()
+
+    def subscribe(self, topic: str):
+        self.writer.write((json.dumps({"op": "sub", "topic": topic}) + "\n").encode())
+
+    def publish(self, topic: str, payload):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        if self.writer.is_closing():
+            return
+        self.stats["sent"] += 1
+        self.writer.write((json.dumps({"op": "pub", "topic": topic, "payload": bytes(payload).decode("latin-1")}) + "\n").encode())
+
+    async def _receive(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                return
+            message = json.loads(line)
+            if message.get("op") == "pub":
+                self.stats["received"] += 1
+                if self.on_message:
+                    self.on_message(message["topic"], message["payload"].encode("latin-1"))
+
+
+class Fleet:
+    def __init__(self, args):
+        self.args = args
+        self.user = args.user
+        self.encoder = PayloadEncoder(binary=args.format == "binary")
+        self.random = random.Random(args.seed)
+        self.stats = {"sent": 0, "received": 0}
+        self.scanner_ips = [f"10.0.{1 + i // 250}.{1 + i % 250}" for i in range(args.scanners)]
+        self.door_ips = [f"10.1.{1 + i // 250}.{1 + i % 250}" for i in range(args.locks)]
+        self.door_of = {ip: self.door_ips[i % args.locks] for i, ip in enumerate(self.scanner_ips)}
+        # Cards: UID -> pass, the first --deny of them are unknown to the backend
+        self.cards = [(bytes([4, i >> 16 & 0xFF, i >> 8 & 0xFF, i & 0xFF]), f"Pass{i:06d}") for i in range(args.cards)]
+        self.denied = set([uid for uid, card_pass in self.cards[:int(args.cards * args.deny)]])
+        self.pending = {}  # request id: tapped, until the action arrives
+        self.queues = {ip: deque() for ip in self.door_ips}  # door ip: (request id, tapped) waiting for an unlock
+        self.refused_ids = set()
+        self.action_ms, self.unlock_ms = [], []
+        self.taps = self.allowed = self.refused = self.unlocks = self.unmatched = 0
+        self.running = True
+        self.clients = []
+
+    # Scanner
+    async def scanner(self, index: int, ip: str):
+        scanner_id = f"{index:06x}"
+        reply_feed = self.user + "/feeds/scanner.action-" + scanner_id
+        client = SimClient(self.stats, lambda topic, payload: self.action(payload))
+        self.clients.append(client)
+        await client.connect(self.args.host, self.args.port)
+        client.subscribe(reply_feed)
+        await asyncio.sleep(self.random.uniform(0, 1 / self.args.rate))
+        counter = 0
+        while self.running:
+            uid, card_pass = self.cards[self.random.randrange(len(self.cards))]
+            counter += 1
+            request_id = f"{scanner_id}-{counter}"
+            tapped = time.monotonic()
+            self.pending[request_id] = tapped
+            self.queues[self.door_of[ip]].append((request_id, tapped))
+            self.taps += 1
+            client.publish(self.user + "/feeds/scanner.checkcard", self.encoder.checkcard(uid, card_pass, ip, request_id=request_id, reply=reply_feed))
+            await asyncio.sleep(self.random.expovariate(self.args.rate))
+
+    def action(self, payload):
+        data = DecodePayload(payload)
+        tapped = self.pending.pop(data.get("id"), None)
+        if tapped is None:
+            return
+        self.action_ms.append((time.monotonic() - tapped) * 1000)
+        if data.get("action") == 1:
+            self.allowed += 1
+        else:
+            # No unlock will come for this tap
+            self.refused += 1
+            self.refused_ids.add(data.get("id"))
+
+    # Lock
+    async def lock(self, ip: str):
+        encoder = PayloadEncoder(binary=self.args.format == "binary")
+        client = SimClient(self.stats)
+
+        def opened(topic, payload):
+            now = time.monotonic()
+            self.unlocks += 1
+            queue = self.queues[ip]
+            while queue and queue[0][0] in self.refused_ids:
+                self.refused_ids.discard(queue.popleft()[0])
+            if queue:
+                request_id, tapped = queue.popleft()
+                self.unlock_ms.append((now - tapped) * 1000)
+            else:
+                self.unmatched += 1
+            # The door is opened right away and closes again (reed contact, see Deurslot-Final.py)
+            client.publish(self.user + "/feeds/lock.status", encoder.lock_status(ip, 2, 0))
+            asyncio.get_running_loop().call_later(self.args.open_time, lambda: client.publish(self.user + "/feeds/lock.status", encoder.lock_status(ip, 1, 0)))
+
+        client.on_message = opened
+        self.clients.append(client)
+        await client.connect(self.args.host, self.args.port)
+        client.subscribe(OpenTopic(self.user, DoorId(ip)))
+        client.publish(self.user + "/feeds/lock.status", encoder.lock_status(ip, 1, 0))
+
+    # Backend stand-in
+    async def backend(self):
+        encoder = PayloadEncoder(binary=self.args.format == "binary")
+        client = SimClient(self.stats)
+
+        def checkcard(topic, payload):
+            data = DecodePayload(payload)
+            if data.get("queued"):
+                return
+            door_ip = self.door_of.get(data.get("ip"))
+            uid = bytes([int(part) for part in data["uid"].strip("[]").split(".")])
+            allowed = door_ip is not None and uid not in self.denied
+            client.publish(data.get("reply") or self.user + "/feeds/scanner.action", encoder.action(data.get("id"), 1 if allowed else 0, 1 if allowed else 0, door_ip if allowed else None))
+            if allowed:
+                client.publish(OpenTopic(self.user, DoorId(door_ip)), door_ip)
+
+        client.on_message = checkcard
+        self.clients.append(client)
+        await client.connect(self.args.host, self.args.port)
+        client.subscribe(self.user + "/feeds/scanner.checkcard")
+
+    def export(self, path: str):
+        # Cards and scanner doors of this fleet for Server/decision_service.py (--backend external)
+        cards = [{"uid": "[" + ".".join([str(x) for x in uid]) + "]", "pass": card_pass, "user": i + 1} for i, (uid, card_pass) in enumerate(self.cards) if uid not in self.denied]
+        with open(path, "w") as file:
+            json.dump({"cards": cards, "scanners": self.door_of}, file)
+
+    def report(self, seconds: float):
+        lost = sum([len([tap for tap in queue if tap[0] not in self.refused_ids]) for queue in self.queues.values()])
+        print(f"[LOAD] {self.args.scanners} scanners, {self.args.locks} locks, {self.taps} taps in {seconds:.1f} s ({self.taps / seconds:.1f} taps/s)")
+        print(f"[LOAD] messages: {self.stats['sent'] / seconds:.1f}/s sent, {self.stats['received'] / seconds:.1f}/s received")
+        print(f"[LOAD] answers: {self.allowed} allowed, {self.refused} refused, {len(self.pending)} unanswered, {self.unlocks} unlocks, {lost} taps without unlock, {self.unmatched} unlocks without tap")
+        for name, values in (("tap -> action", self.action_ms), ("tap -> unlock", self.unlock_ms)):
+            print(f"[LOAD] {name}: p50 {Percentile(values, 50):6.1f} ms   p95 {Percentile(values, 95):6.1f} ms   p99 {Percentile(values, 99):6.1f} ms   max {max(values or [0]):6.1f} ms")
+
+
+async def main(args):
+    if args.spawn_broker:
+        broker = Broker()
+        server = await broker.serve(args.host, args.port)
+    fleet = Fleet(args)
+    if args.export_store:
+        fleet.export(args.export_store)
+        print(f"[LOAD] Store written to {args.export_store}")
+        return
+    # Locks and backend are subscribed before the first tap
+    if args.backend == "fleet":
+        await fleet.backend()
+    await asyncio.gather(*[fleet.lock(ip) for ip in fleet.door_ips])
+    scanners = [asyncio.create_task(fleet.scanner(i, ip)) for i, ip in enumerate(fleet.scanner_ips)]
+    started = time.monotonic()
+    await asyncio.sleep(args.duration)
+    fleet.running = False
+    seconds = time.monotonic() - started
+    for task in scanners:
+        task.cancel()
+    # Answers to the last taps
+    await asyncio.sleep(args.settle)
+    fleet.report(seconds)
+    if args.spawn_broker:
+        print(f"[BROKER] {broker.report()}")
+    for client in fleet.clients:
+        await client.close()
+    if args.spawn_broker:
+        server.close()
+        await server.wait_closed()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulated scanners and locks against the local broker stand-in")
+    parser.add_argument("--scanners", type=int, default=10)
+    parser.add_argument("--locks", type=int, default=5)
+    parser.add_argument("--rate", type=float, default=0.5, help="taps per second per scanner")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of tapping")
+    parser.add_argument("--settle", type=float, default=2, help="seconds to wait for the last answers")
+    parser.add_argument("--cards", type=int, default=1000)
+    parser.add_argument("--deny", type=float, default=0.1, help="part of the cards the backend stand-in refuses")
+    parser.add_argument("--format", choices=("json", "binary"), default="json", help="PAYLOAD_FORMAT of the devices")
+    parser.add_argument("--backend", choices=("fleet", "external"), default="fleet", help="answer the taps here or leave it to another service")
+    parser.add_argument("--open-time", type=float, default=4, help="seconds a door stays open")
+    parser.add_argument("--user", default="sim")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--spawn-broker", action="store_true", help="run the broker stand-in in this process")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--export-store", metavar="PATH", help="only write the cards and doors of the fleet for the decision service")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,88 @@
+import argparse, os, runpy, sys, tempfile, tomllib
+
+# -------------
+# Firmware Runner
+# -------------
+# Runs a firmware file (code.py of the scanner or the door) unmodified on the
+# host: the CircuitPython modules it imports come from shim/, the shared
+# modules from lib/. Everything the Pico would do on the pins, the LCD and the
+# NFC reader ends up in the device records (shim/_sim.py).
+#
+#   python Simulation/broker.py --allow-all 192.168.0.21
+#   python Simulation/run_firmware.py Prototypes/Deurslot-Final.py --ip 192.168.0.21 --script Simulation/scripts/door.txt
+#   python Simulation/run_firmware.py Prototypes/Scanner-Final.py --ip 192.168.0.20 --script Simulation/scripts/scanner.txt
+
+folder = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(folder, "..", "lib"))
+sys.path.insert(0, os.path.join(folder, "shim"))
+
+import supervisor
+from _sim import device
+from microcontroller import Pin
+
+
+def LoadSettings(path: str):
+    # settings.toml like CircuitPython reads it: os.getenv() gives the TOML
+    # value (int or str), unknown names fall back to the real environment
+    with open(path, "rb") as file:
+        settings = tomllib.load(file)
+    environ_getenv = os.getenv
+
+    def getenv(key, default=None):
+        if key in settings:
+            return settings[key]
+        return environ_getenv(key, default)
+
+    os.getenv = getenv
+    return settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a Pico firmware file on the host")
+    parser.add_argument("firmware", help="firmware file, e.g. Prototypes/Scanner-Final.py")
+    parser.add_argument("--ip", default="192.168.0.100", help="IP address of the simulated Pico")
+    parser.add_argument("--name", help="device name in the records (default: firmware file and IP)")
+    parser.add_argument("--mac", help="MAC address, e.g. 28:cd:c1:00:00:01 (default: from the IP)")
+    parser.add_argument("--settings", default=os.path.join(folder, "settings.toml"), help="settings.toml to read")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="override a setting")
+    parser.add_argument("--script", help="file with timed pin, button, card and serial actions")
+    parser.add_argument("--record", help="append the device records (JSON lines) to this file")
+    parser.add_argument("--flash", help="folder that stands in for the flash (default: a temporary folder)")
+    parser.add_argument("--verbose", action="store_true", help="print every record")
+    args = parser.parse_args()
+
+    settings = LoadSettings(args.settings)
+    for override in args.set:
+        name, value = override.split("=", 1)
+        settings[name] = int(value) if value.lstrip("-").isdigit() else value
+    flash = args.flash or tempfile.mkdtemp(prefix="pico-flash-")
+    settings["EVENT_QUEUE_DIR"] = os.path.join(flash, "queue")
+
+    device.ip = args.ip
+    device.name = args.name or f"{os.path.splitext(os.path.basename(args.firmware))[0]}@{args.ip}"
+    if args.mac:
+        device.mac = bytes.fromhex(args.mac.replace(":", ""))
+    else:
+        device.mac = b"\x28\xcd\xc1" + bytes(int(part) for part in args.ip.split(".")[1:])
+    device.verbose = args.verbose
+    if args.record:
+        device.record_file = open(args.record, "a")
+    if args.script:
+        with open(args.script) as file:
+            device.run_script(file.readlines())
+
+    sys.stdin = supervisor._Stdin(sys.stdin)
+    print(f"[SIM] {device.name} running {args.firmware} (flash: {flash})")
+    try:
+        # The scanner annotates with Pin without importing it (CircuitPython
+        # ignores annotations, CPython evaluates them)
+        runpy.run_path(args.firmware, init_globals={"Pin": Pin}, run_name="__main__")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if device.record_file:
+            device.record_file.close()
+
+
+if __name__ == "__main__":
+    main()
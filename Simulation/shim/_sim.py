@@ -0,0 +1,122 @@
+import json, os, sys, threading, time
+
+# -------------
+# Simulated Device
+# -------------
+# State of the one Pico a simulation process plays: the pin levels the script
+# sets, the outputs the firmware switches (recorded with a timestamp), the card
+# in the NFC field and the text typed on the serial console. The shim modules
+# (board, digitalio, pwmio, keypad, ...) all read and write this object.
+#
+# Timestamps are time.monotonic(), the same clock for every process on the
+# machine, so the records of a scanner and a door can be put side by side.
+
+
+class Device:
+    def __init__(self):
+        self.name = "pico"
+        self.ip = "192.168.0.100"
+        self.mac = b"\x28\xcd\xc1\x00\x00\x01"
+        self.started = time.monotonic()
+        self.inputs = {}  # pin name: level set by the script
+        self.keys = []  # keypad.Keys objects that want to hear about input changes
+        self.card = None  # UID (bytes) of the card in the NFC field, None = no card
+        self.cards = {}  # UID: card memory, kept between taps (see adafruit_pn532 shim)
+        self.serial = bytearray()  # typed on the console by the script
+        self.records = []
+        self.record_file = None
+        self.verbose = False
+        self.lock = threading.Lock()
+
+    def now(self):
+        return time.monotonic() - self.started
+
+    def record(self, kind: str, name: str, value):
+        entry = {"t": time.monotonic(), "device": self.name, "kind": kind, "name": name, "value": value}
+        with self.lock:
+            self.records.append(entry)
+            if self.record_file:
+                self.record_file.write(json.dumps(entry) + "\n")
+                self.record_file.flush()
+        if self.verbose:
+            print(f"[SIM] {self.now():8.3f} {kind} {name} = {value}")
+
+    # Inputs
+    def read_input(self, pin: str, default: bool):
+        return self.inputs.get(pin, default)
+
+    def set_input(self, pin: str, value: bool):
+        self.inputs[pin] = value
+        self.record("input", pin, value)
+        for keys in self.keys:
+            keys._changed(pin, value)
+
+    # Cards
+    def provision(self, uid: bytes, block: int, card_pass: str, key_a: str = None, key_b: str = None):
+        # Like a card set up with "Create Card": the pass in `block`, the sector
+        # trailer with the keys and the access bits of the settings
+        from adafruit_pn532.i2c import Card
+        key_a = (key_a or os.getenv("CARD_KEY_A") or "\xff" * 6).encode("latin-1")[:6]
+        key_b = (key_b or os.getenv("CARD_KEY_B") or "\xff" * 6).encode("latin-1")[:6]
+        bits = bytes(map(int, (os.getenv("CARD_BITS") or "8,119,143,255").split(",")))
+        card = Card(uid)
+        data = card_pass.encode()
+        card.blocks[block][:] = data + bytes(16 - len(data))
+        card.trailer(block)[:] = key_a + bytes(6 - len(key_a)) + bits + key_b + bytes(6 - len(key_b))
+        self.record("nfc", "provision", {"uid": uid.hex(), "block": block})
+
+    # Script
+    def run_script(self, lines):
+        # "<seconds> <action> <args>" lines, run in the background:
+        #   1.5 pin GP28 1        set an input level
+        #   2 press GP12 0.1      press a button (input high) for 0.1 s
+        #   3 card 04d5065a       a card enters the NFC field, "remove" takes it away
+        #   4 type 123456         type a line on the serial console
+        #   0 provision 04d5065a 8 DevPass42 [key A] [key B]
+        #                         write a pass on a card, its sector gets the
+        #                         keys (default CARD_KEY_A / CARD_KEY_B)
+        #   60 quit               stop the simulation
+        steps = []
+        for line in lines:
+            line = line.split("#")[0].strip()
+            if line:
+                parts = line.split()
+                steps.append((float(parts[0]), parts[1], parts[2:]))
+        steps.sort(key=lambda step: step[0])
+        thread = threading.Thread(target=self._script, args=(steps,), daemon=True)
+        thread.start()
+        return thread
+
+    def _script(self, steps):
+        for at, action, args in steps:
+            delay = self.started + at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            if action == "pin":
+                self.set_input(args[0], args[1] in ("1", "true", "True", "high"))
+            elif action == "press":
+                self.set_input(args[0], True)
+                time.sleep(float(args[1]) if len(args) > 1 else 0.1)
+                self.set_input(args[0], False)
+            elif action == "card":
+                self.card = bytes.fromhex(args[0])
+                self.record("nfc", "card", args[0])
+            elif action == "remove":
+                self.card = None
+                self.record("nfc", "card", None)
+            elif action == "provision":
+                self.provision(bytes.fromhex(args[0]), int(args[1]), args[2], *args[3:])
+            elif action == "type":
+                self.serial += (" ".join(args) + "\r").encode()
+                self.record("serial", "typed", " ".join(args))
+            elif action == "quit":
+                self.record("sim", "quit", self.now())
+                if self.record_file:
+                    self.record_file.close()
+                sys.stdout.flush()
+                os._exit(0)
+            else:
+                print(f"[SIM] Unknown script action: {action}")
+
+
+device = Device()
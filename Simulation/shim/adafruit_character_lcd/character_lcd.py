@@ -0,0 +1,97 @@
+import time
+from _sim import device
+
+# Shim: adafruit_character_lcd.character_lcd.Character_LCD_Mono
+# Keeps the HD44780 display memory and records the screen when it changes.
+# Same commands as the real driver: clear() and cursor moves are _write8()
+# commands, characters are _write8(value, True).
+_LCD_CLEARDISPLAY = 0x01
+_LCD_SETDDRAMADDR = 0x80
+_LCD_ROW_OFFSETS = (0x00, 0x40, 0x14, 0x54)
+
+
+class Character_LCD_Mono:
+    def __init__(self, rs, en, db4, db5, db6, db7, columns: int, lines: int, backlight_pin=None, backlight_inverted: bool = False):
+        self.columns = columns
+        self.lines = lines
+        self.cells = [[" "] * columns for i in range(lines)]
+        self.address = 0
+        self.writes = 0
+        self._backlight = False
+        self._message = ""
+        self._shown = None
+        self.row = 0
+        self.column = 0
+
+    def _write8(self, value: int, char_mode: bool = False):
+        self.writes += 1
+        if not char_mode:
+            if value == _LCD_CLEARDISPLAY:
+                self.cells = [[" "] * self.columns for i in range(self.lines)]
+                self.address = 0
+                time.sleep(0.003)
+            elif value & _LCD_SETDDRAMADDR:
+                self.address = value & 0x7F
+            self._changed()
+            return
+        # The row whose start address is the closest below the cursor
+        row = 0
+        for i in range(self.lines):
+            if _LCD_ROW_OFFSETS[row] < _LCD_ROW_OFFSETS[i] <= self.address:
+                row = i
+        column = self.address - _LCD_ROW_OFFSETS[row]
+        if column < self.columns:
+            self.cells[row][column] = chr(value)
+        self.address += 1
+        self._changed()
+
+    def _changed(self):
+        screen = self.screen()
+        if screen != self._shown:
+            self._shown = screen
+            device.record("lcd", "screen", screen)
+
+    def screen(self):
+        return "\n".join(["".join(row) for row in self.cells])
+
+    def clear(self):
+        self._write8(_LCD_CLEARDISPLAY)
+
+    def home(self):
+        self.cursor_position(0, 0)
+
+    def cursor_position(self, column: int, row: int):
+        self.row = row
+        self.column = column
+        self._write8(_LCD_SETDDRAMADDR | (column + _LCD_ROW_OFFSETS[row]))
+
+    @property
+    def backlight(self):
+        return self._backlight
+
+    @backlight.setter
+    def backlight(self, value: bool):
+        if value != self._backlight:
+            device.record("lcd", "backlight", bool(value))
+        self._backlight = bool(value)
+
+    @property
+    def message(self):
+        return self._message
+
+    @message.setter
+    def message(self, message: str):
+        self._message = message
+        line = self.row
+        self.cursor_position(self.column, line)
+        for character in message:
+            if character == "\n":
+                line += 1
+                self.cursor_position(0, line)
+            else:
+                self._write8(ord(character), True)
+        # Like the driver: the next message starts at (0, 0) again
+        self.column, self.row = 0, 0
+
+    def create_char(self, location: int, pattern):
+        pass
@@ -0,0 +1,145 @@
+import json, os, select, socket
+
+# Shim: adafruit_minimqtt.adafruit_minimqtt.MQTT
+# Same calls and callbacks as MiniMQTT, but it talks to the broker stand-in of
+# Simulation/broker.py (one JSON object per line over TCP) instead of a real
+# MQTT broker. Username, password and TLS are ignored.
+
+
+class MMQTTException(Exception):
+    pass
+
+
+class MQTT:
+    def __init__(self, *, broker: str, port: int = None, username: str = None, password: str = None, client_id: str = None, is_ssl: bool = None, keep_alive: int = 60, recv_timeout: int = 10, socket_pool=None, ssl_context=None, use_binary_mode: bool = False, socket_timeout: float = 1, connect_retries: int = 5, user_data=None):
+        self.broker = broker or "127.0.0.1"
+        self.port = port or int(os.getenv("PORT") or 1883)
+        self.client_id = client_id or f"sim-{os.getpid()}"
+        self.keep_alive = keep_alive
+        self.use_binary_mode = use_binary_mode
+        self._user_data = user_data
+        self._sock = None
+        self._buffer = b""
+        self._subscribed = []
+        self._pid = 0
+        self.on_connect = None
+        self.on_disconnect = None
+        self.on_subscribe = None
+        self.on_unsubscribe = None
+        self.on_publish = None
+        self.on_message = None
+
+    # Connection
+    def connect(self, clean_session: bool = True, host: str = None, port: int = None, keep_alive: int = None):
+        try:
+            self._sock = socket.create_connection((host or self.broker, port or self.port), timeout=5)
+        except OSError as error:
+            raise MMQTTException(f"Could not connect to the broker stand-in: {error}")
+        self._sock.settimeout(None)
+        self._buffer = b""
+        self._send({"op": "connect", "client": self.client_id})
+        if self.on_connect:
+            self.on_connect(self, self._user_data, 0, 0)
+        return 0
+
+    def is_connected(self):
+        return self._sock is not None
+
+    def _close(self):
+        if self._sock:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+
+    def disconnect(self):
+        self._close()
+        if self.on_disconnect:
+            self.on_disconnect(self, self._user_data, 0)
+
+    def reconnect(self, resub_topics: bool = True):
+        self._close()
+        self.connect()
+        if resub_topics:
+            for topic, qos in self._subscribed:
+                self._send({"op": "sub", "topic": topic})
+
+    def ping(self):
+        self._send({"op": "ping"})
+        return [0xD0]
+
+    def _send(self, message: dict):
+        if self._sock is None:
+            raise MMQTTException("Not connected")
+        try:
+            self._sock.sendall(json.dumps(message).encode() + b"\n")
+        except OSError as error:
+            self._lost()
+            raise MMQTTException(f"Connection lost: {error}")
+
+    def _lost(self):
+        self._close()
+        if self.on_disconnect:
+            self.on_disconnect(self, self._user_data, 1)
+
+    # Topics
+    def subscribe(self, topic, qos: int = 0):
+        topics = topic if isinstance(topic, list) else [(topic, qos)]
+        for name, qos in topics:
+            self._send({"op": "sub", "topic": name})
+            self._subscribed.append((name, qos))
+            if self.on_subscribe:
+                self.on_subscribe(self, self._user_data, name, qos)
+
+    def unsubscribe(self, topic):
+        topics = topic if isinstance(topic, list) else [topic]
+        for name in topics:
+            self._send({"op": "unsub", "topic": name})
+            self._subscribed = [(t, q) for t, q in self._subscribed if t != name]
+            self._pid += 1
+            if self.on_unsubscribe:
+                self.on_unsubscribe(self, self._user_data, name, self._pid)
+
+    def publish(self, topic: str, msg, retain: bool = False, qos: int = 0):
+        if isinstance(msg, (int, float)):
+            msg = str(msg).encode("ascii")
+        elif isinstance(msg, str):
+            msg = msg.encode("utf-8")
+        elif isinstance(msg, (bytes, bytearray)):
+            msg = bytes(msg)
+        else:
+            raise MMQTTException("Invalid message data type.")
+        self._send({"op": "pub", "topic": topic, "payload": msg.decode("latin-1")})
+        self._pid += 1
+        if self.on_publish:
+            self.on_publish(self, self._user_data, topic, self._pid)
+
+    # Receiving
+    def loop(self, timeout: float = 0):
+        if self._sock is None:
+            raise MMQTTException("Not connected")
+        handled = []
+        ready = select.select([self._sock], [], [], timeout)[0]
+        while ready:
+            try:
+                data = self._sock.recv(4096)
+            except OSError:
+                data = b""
+            if not data:
+                self._lost()
+                raise MMQTTException("Connection lost")
+            self._buffer += data
+            ready = select.select([self._sock], [], [], 0)[0]
+        while b"\n" in self._buffer:
+            line, self._buffer = self._buffer.split(b"\n", 1)
+            message = json.loads(line)
+            if message.get("op") != "pub":
+                continue
+            payload = message["payload"].encode("latin-1")
+            if not self.use_binary_mode:
+                payload = payload.decode("utf-8", "replace")
+            handled.append(0x30)
+            if self.on_message:
+                self.on_message(self, message["topic"], payload)
+        return handled or None
@@ -0,0 +1,4 @@
+# Shim: the constants of adafruit_pn532.adafruit_pn532 the programs use
+from adafruit_pn532.i2c import MIFARE_CMD_AUTH_A, MIFARE_CMD_AUTH_B
+
+__all__ = ["MIFARE_CMD_AUTH_A", "MIFARE_CMD_AUTH_B"]
@@ -0,0 +1,148 @@
+import os, time
+from _sim import device
+from pn532_emulator import PN532Emulator, MifareClassic, ParseFrame
+
+# Shim: adafruit_pn532.i2c.PN532_I2C
+# Same calls as the real driver, down to the bytes: every method builds the
+# command frame the real driver sends, polls the status byte every 10 ms and
+# checks the ACK and response frames of the emulated PN532 (pn532_emulator.py).
+# A card is in the field while device.card holds its UID (set by the script),
+# its memory (device.cards) survives between taps.
+#
+# Settings: PN532_LATENCY ("auth=4,read=3" in ms, one number = every command),
+# PN532_RF_ERRORS (same format, chance that an RF command fails), PN532_SEED.
+MIFARE_CMD_AUTH_A = 0x60
+MIFARE_CMD_AUTH_B = 0x61
+MIFARE_CMD_READ = 0x30
+MIFARE_CMD_WRITE = 0xA0
+
+_HOSTTOPN532 = 0xD4
+_PN532TOHOST = 0xD5
+_COMMAND_GETFIRMWAREVERSION = 0x02
+_COMMAND_SAMCONFIGURATION = 0x14
+_COMMAND_INDATAEXCHANGE = 0x40
+_COMMAND_INLISTPASSIVETARGET = 0x4A
+_ACK = b"\x00\x00\xff\x00\xff\x00"
+
+
+def Card(uid: bytes):
+    uid = bytes(uid)
+    if uid not in device.cards:
+        device.cards[uid] = MifareClassic(uid)
+    return device.cards[uid]
+
+
+def _Field():
+    return Card(device.card) if device.card else None
+
+
+class PN532_I2C:
+    def __init__(self, i2c, *, irq=None, reset=None, req=None, debug: bool = False, emulator=None):
+        # `emulator` is shim only: benchmarks bring their own PN532Emulator
+        self.i2c = i2c
+        self.debug = debug
+        if emulator is None:
+            seed = os.getenv("PN532_SEED")
+            emulator = PN532Emulator(_Field, latency=os.getenv("PN532_LATENCY"), rf_errors=os.getenv("PN532_RF_ERRORS"), seed=int(seed) if seed not in (None, "") else None)
+        self.emulator = emulator
+
+    # Transport
+    def _wait_ready(self, timeout: float = 1):
+        started = time.monotonic()
+        while time.monotonic() - started < timeout:
+            if self.emulator.ready():
+                return True
+            time.sleep(0.01)
+        return False
+
+    def _read_data(self, count: int):
+        # The first byte of every read is the status byte
+        frame = self.emulator.read(count)
+        if self.debug:
+            print("Reading: ", [hex(i) for i in frame[1:]])
+        return frame[1:]
+
+    def _write_data(self, framebytes):
+        self.emulator.write(bytes(framebytes))
+
+    def _write_frame(self, data):
+        length = len(data)
+        frame = bytearray([0x00, 0x00, 0xFF, length, (~length + 1) & 0xFF]) + bytearray(data)
+        frame += bytearray([(~sum(data) + 1) & 0xFF, 0x00])
+        if self.debug:
+            print("Write frame: ", [hex(i) for i in frame])
+        self._write_data(frame)
+
+    def _read_frame(self, length: int):
+        try:
+            return ParseFrame(self._read_data(length + 7))
+        except ValueError as error:
+            raise RuntimeError(f"Response frame error: {error}")
+
+    def send_command(self, command: int, params=(), timeout: float = 1):
+        self._write_frame(bytearray([_HOSTTOPN532, command & 0xFF]) + bytearray(params))
+        if not self._wait_ready(timeout):
+            return False
+        if not _ACK == bytes(self._read_data(len(_ACK))):
+            raise RuntimeError("Did not receive expected ACK from PN532!")
+        return True
+
+    def process_response(self, command: int, response_length: int = 0, timeout: float = 1):
+        if not self._wait_ready(timeout):
+            return None
+        response = self._read_frame(response_length + 2)
+        if not (response[0] == _PN532TOHOST and response[1] == (command + 1)):
+            raise RuntimeError("Received unexpected command response!")
+        return bytearray(response[2:])
+
+    def call_function(self, command: int, response_length: int = 0, params=(), timeout: float = 1):
+        if not self.send_command(command, params=params, timeout=timeout):
+            return None
+        return self.process_response(command, response_length=response_length, timeout=timeout)
+
+    # Chip
+    @property
+    def firmware_version(self):
+        response = self.call_function(_COMMAND_GETFIRMWAREVERSION, 4, timeout=0.5)
+        if response is None:
+            raise RuntimeError("Failed to detect the PN532")
+        return tuple(response)
+
+    def SAM_configuration(self):
+        self.call_function(_COMMAND_SAMCONFIGURATION, params=[0x01, 0x14, 0x01])
+
+    # Cards
+    def read_passive_target(self, card_baud: int = 0, timeout: float = 1):
+        if not self.listen_for_passive_target(card_baud=card_baud, timeout=timeout):
+            return None
+        return self.get_passive_target(timeout=timeout)
+
+    def listen_for_passive_target(self, card_baud: int = 0, timeout: float = 1):
+        return self.send_command(_COMMAND_INLISTPASSIVETARGET, params=[0x01, card_baud], timeout=timeout)
+
+    def get_passive_target(self, timeout: float = 1):
+        response = self.process_response(_COMMAND_INLISTPASSIVETARGET, response_length=30, timeout=timeout)
+        if response is None:
+            return None
+        if response[0] != 0x01:
+            raise RuntimeError("More than one card detected!")
+        if response[5] > 7:
+            raise RuntimeError("Found card with unexpectedly long UID!")
+        return response[6:6 + response[5]]
+
+    def mifare_classic_authenticate_block(self, uid, block_number: int, key_number: int, key):
+        params = bytearray([0x01, key_number & 0xFF, block_number & 0xFF]) + bytearray(key) + bytearray(uid)
+        response = self.call_function(_COMMAND_INDATAEXCHANGE, params=params, response_length=1)
+        return response is not None and response[0] == 0x00
+
+    def mifare_classic_read_block(self, block_number: int):
+        response = self.call_function(_COMMAND_INDATAEXCHANGE, params=[0x01, MIFARE_CMD_READ, block_number & 0xFF], response_length=17)
+        if response is None or response[0] != 0x00:
+            return None
+        return response[1:]
+
+    def mifare_classic_write_block(self, block_number: int, data):
+        assert data is not None and len(data) == 16, "Data must be an array of 16 bytes!"
+        params = bytearray([0x01, MIFARE_CMD_WRITE, block_number & 0xFF]) + bytearray(data)
+        response = self.call_function(_COMMAND_INDATAEXCHANGE, params=params, response_length=1)
+        return response is not None and response[0] == 0x00
@@ -0,0 +1,9 @@
+from microcontroller import Pin
+
+# Shim: the Raspberry Pi Pico W pins
+for _i in range(29):
+    globals()[f"GP{_i}"] = Pin(f"GP{_i}")
+LED = Pin("LED")
+SDA = GP4
+SCL = GP5
+del _i
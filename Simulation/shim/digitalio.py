@@ -0,0 +1,67 @@
+from _sim import device
+
+# Shim: digitalio. Outputs are recorded, inputs read the level the script set
+# (or the pull when nothing was set).
+
+
+class Direction:
+    INPUT = "INPUT"
+    OUTPUT = "OUTPUT"
+
+
+class Pull:
+    UP = "UP"
+    DOWN = "DOWN"
+
+
+class DriveMode:
+    PUSH_PULL = "PUSH_PULL"
+    OPEN_DRAIN = "OPEN_DRAIN"
+
+
+class DigitalInOut:
+    def __init__(self, pin):
+        self.pin = pin
+        self._direction = Direction.INPUT
+        self.pull = None
+        self._value = False
+
+    @property
+    def direction(self):
+        return self._direction
+
+    @direction.setter
+    def direction(self, direction):
+        self._direction = direction
+        if direction == Direction.OUTPUT:
+            self.value = False
+
+    def switch_to_input(self, pull=None):
+        self._direction = Direction.INPUT
+        self.pull = pull
+
+    def switch_to_output(self, value: bool = False, drive_mode=None):
+        self._direction = Direction.OUTPUT
+        self.value = value
+
+    @property
+    def value(self):
+        if self._direction == Direction.OUTPUT:
+            return self._value
+        return device.read_input(self.pin.name, self.pull == Pull.UP)
+
+    @value.setter
+    def value(self, value: bool):
+        value = bool(value)
+        if self._direction == Direction.OUTPUT and value != self._value:
+            device.record("pin", self.pin.name, value)
+        self._value = value
+
+    def deinit(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.deinit()
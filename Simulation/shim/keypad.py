@@ -0,0 +1,87 @@
+from collections import deque
+from _sim import device
+import supervisor
+
+# Shim: keypad.Keys. The script changes the pin levels, every change is queued
+# as an event with the time it happened (no real scanning or debouncing).
+
+
+class Event:
+    def __init__(self, key_number: int = 0, pressed: bool = True, timestamp: int = None):
+        self.key_number = key_number
+        self.pressed = pressed
+        self.timestamp = supervisor.ticks_ms() if timestamp is None else timestamp
+
+    @property
+    def released(self):
+        return not self.pressed
+
+    def __repr__(self):
+        return f"<Event: key_number {self.key_number} {'pressed' if self.pressed else 'released'}>"
+
+
+class EventQueue:
+    def __init__(self, max_events: int = 64):
+        self._events = deque()
+        self.max_events = max_events
+        self.overflowed = False
+
+    def _put(self, event: Event):
+        if len(self._events) >= self.max_events:
+            self.overflowed = True
+            return
+        self._events.append(event)
+
+    def get(self):
+        return self._events.popleft() if self._events else None
+
+    def get_into(self, event: Event):
+        if not self._events:
+            return False
+        queued = self._events.popleft()
+        event.key_number, event.pressed, event.timestamp = queued.key_number, queued.pressed, queued.timestamp
+        return True
+
+    def clear(self):
+        self._events.clear()
+        self.overflowed = False
+
+    def __len__(self):
+        return len(self._events)
+
+    def __bool__(self):
+        return len(self._events) > 0
+
+
+class Keys:
+    def __init__(self, pins, *, value_when_pressed: bool, pull: bool = True, interval: float = 0.02, max_events: int = 64, debounce_threshold: int = 1):
+        self.names = [pin.name for pin in pins]
+        self.value_when_pressed = value_when_pressed
+        self.pull = pull
+        self.interval = interval
+        self.events = EventQueue(max_events)
+        # Pulls are the opposite of value_when_pressed
+        idle = not value_when_pressed if pull else False
+        self.pressed = [device.read_input(name, idle) == value_when_pressed for name in self.names]
+        self.key_count = len(self.names)
+        # Keys that are pressed at the start report a press
+        for key_number, pressed in enumerate(self.pressed):
+            if pressed:
+                self.events._put(Event(key_number, True))
+        device.keys.append(self)
+
+    def _changed(self, pin: str, value: bool):
+        if pin not in self.names:
+            return
+        key_number = self.names.index(pin)
+        pressed = value == self.value_when_pressed
+        if pressed != self.pressed[key_number]:
+            self.pressed[key_number] = pressed
+            self.events._put(Event(key_number, pressed))
+
+    def reset(self):
+        self.events.clear()
+
+    def deinit(self):
+        if self in device.keys:
+            device.keys.remove(self)
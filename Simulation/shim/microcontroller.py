@@ -0,0 +1,7 @@
+# Shim: microcontroller.Pin, the pins in board are instances of it
+class Pin:
+    def __init__(self, name: str):
+        self.name = name
+
+    def __repr__(self):
+        return f"board.{self.name}"
@@ -0,0 +1,387 @@
+import random, time
+
+# -------------
+# PN532 Emulator
+# -------------
+# Software PN532 with MIFARE Classic 1K cards. It is talked to with the same
+# bytes as the real chip on I2C: the host writes a command frame (or an ACK
+# frame to abort a command), polls the status byte until the chip is ready and
+# reads the ACK and the response frame. The shim PN532_I2C
+# (adafruit_pn532/i2c.py) builds and parses these frames like the real driver.
+#
+# The cards follow the MIFARE Classic rules: key A and key B per sector, the
+# access bits in the sector trailer decide which key may read or write which
+# block, key B can't be used while it is readable, a failed authentication or a
+# refused read/write halts the card until it is selected again, and a trailer
+# written with malformed access bits blocks its sector for good.
+#
+# Timing is a model and not a measurement of the real chip:
+# - every byte on the bus takes 9 clock cycles at `i2c_hz`
+# - every command takes its `latency` (ms) once its frame is written, a search
+#   (InListPassiveTarget, InAutoPoll) answers latency["detect"] ms after it
+#   saw the card, InAutoPoll only looks every `period` x 150 ms
+# - `rf_errors` is the chance that an RF command (detect, auth, read, write)
+#   fails: a failed activation is retried, the other commands answer with a
+#   time-out and the card is halted
+# `clock` only needs monotonic() and sleep(), benchmarks pass a simulated one.
+_ACK = b"\x00\x00\xff\x00\xff\x00"
+_SYNTAX_ERROR = b"\x00\x00\xff\x01\xff\x7f\x81\x00"
+_HOSTTOPN532 = 0xD4
+_PN532TOHOST = 0xD5
+
+_COMMAND_GETFIRMWAREVERSION = 0x02
+_COMMAND_SAMCONFIGURATION = 0x14
+_COMMAND_INDATAEXCHANGE = 0x40
+_COMMAND_INLISTPASSIVETARGET = 0x4A
+_COMMAND_INRELEASE = 0x52
+_COMMAND_INAUTOPOLL = 0x60
+
+MIFARE_CMD_AUTH_A = 0x60
+MIFARE_CMD_AUTH_B = 0x61
+MIFARE_CMD_READ = 0x30
+MIFARE_CMD_WRITE = 0xA0
+
+ERROR_TIMEOUT = 0x01
+ERROR_AUTH = 0x14
+
+DEFAULT_LATENCY = {"firmware": 1, "sam": 1, "release": 1, "detect": 5, "auth": 4, "read": 3, "write": 6}
+_RF_COMMANDS = ("detect", "auth", "read", "write")
+
+# Factory trailer: key A and key B FF..FF, access bits FF 07 80 (key A does
+# everything, key B is readable and can't be used), GPB 69
+TRANSPORT_TRAILER = b"\xff" * 6 + b"\xff\x07\x80\x69" + b"\xff" * 6
+
+# Access conditions (C1, C2, C3) -> which keys may ...
+# data block: (read, write)
+_DATA = {
+    (0, 0, 0): ("AB", "AB"), (0, 1, 0): ("AB", ""), (1, 0, 0): ("AB", "B"), (1, 1, 0): ("AB", "B"),
+    (0, 0, 1): ("AB", ""), (0, 1, 1): ("B", "B"), (1, 0, 1): ("B", ""), (1, 1, 1): ("", ""),
+}
+# sector trailer: (write key A, read access bits, write access bits, read key B, write key B)
+_TRAILER = {
+    (0, 0, 0): ("A", "A", "", "A", "A"), (0, 1, 0): ("", "A", "", "A", ""),
+    (1, 0, 0): ("B", "AB", "", "", "B"), (1, 1, 0): ("", "AB", "", "", ""),
+    (0, 0, 1): ("A", "A", "A", "A", "A"), (0, 1, 1): ("B", "AB", "B", "", "B"),
+    (1, 0, 1): ("", "AB", "B", "", ""), (1, 1, 1): ("", "AB", "", "", ""),
+}
+
+
+def Frame(data):
+    # 00 00 FF LEN LCS <data> DCS 00
+    length = len(data)
+    return bytes([0x00, 0x00, 0xFF, length, (~length + 1) & 0xFF]) + bytes(data) + bytes([(~sum(data) + 1) & 0xFF, 0x00])
+
+
+def ParseFrame(frame):
+    # Data of a frame (TFI included), ValueError if it is not a valid frame
+    frame = bytes(frame)
+    offset = 0
+    while offset < len(frame) and frame[offset] == 0x00:
+        offset += 1
+    if offset == 0 or offset >= len(frame) or frame[offset] != 0xFF:
+        raise ValueError("Frame does not start with 00 FF")
+    offset += 1
+    if offset + 2 > len(frame):
+        raise ValueError("Frame is too short")
+    length = frame[offset]
+    if (length + frame[offset + 1]) & 0xFF:
+        raise ValueError("Frame length checksum does not match")
+    data = frame[offset + 2:offset + 2 + length]
+    if len(data) != length or offset + 2 + length >= len(frame):
+        raise ValueError("Frame is too short")
+    if (sum(data) + frame[offset + 2 + length]) & 0xFF:
+        raise ValueError("Frame data checksum does not match")
+    return data
+
+
+def ParseRates(text, default=None):
+    # "auth=4,read=3" -> {"auth": 4.0, "read": 3.0}, "0.01" -> {"*": 0.01}
+    rates = dict(default or {})
+    if text in (None, ""):
+        return rates
+    if isinstance(text, (int, float)):
+        rates["*"] = float(text)
+        return rates
+    for part in str(text).split(","):
+        if "=" in part:
+            name, value = part.split("=", 1)
+            rates[name.strip()] = float(value)
+        elif part.strip():
+            rates["*"] = float(part)
+    return rates
+
+
+def AccessConditions(trailer):
+    # (C1, C2, C3) as 4-bit values (bit n = block n of the sector) or None when
+    # the inverted copies in byte 6 and 7 don't match
+    b6, b7, b8 = trailer[6], trailer[7], trailer[8]
+    c1, c2, c3 = b7 >> 4, b8 & 0x0F, b8 >> 4
+    if b6 & 0x0F != c1 ^ 0x0F or b6 >> 4 != c2 ^ 0x0F or b7 & 0x0F != c3 ^ 0x0F:
+        return None
+    return c1, c2, c3
+
+
+def AccessBits(data, trailer):
+    # Bytes 6-8 of a trailer for the same `data` conditions on the three data
+    # blocks and `trailer` conditions on the trailer, e.g. AccessBits((1, 0, 0), (0, 1, 1))
+    c1, c2, c3 = 0, 0, 0
+    for index, (b1, b2, b3) in enumerate((data, data, data, trailer)):
+        c1, c2, c3 = c1 | b1 << index, c2 | b2 << index, c3 | b3 << index
+    return bytes([(c2 ^ 0x0F) << 4 | c1 ^ 0x0F, c1 << 4 | c3 ^ 0x0F, c3 << 4 | c2])
+
+
+class MifareClassic:
+    def __init__(self, uid, trailer: bytes = TRANSPORT_TRAILER):
+        self.uid = bytes(uid)
+        self.blocks = [bytearray(16) for i in range(64)]
+        # Manufacturer block: UID, BCC, SAK, ATQA
+        bcc = 0
+        for byte in self.uid[:4]:
+            bcc ^= byte
+        self.blocks[0][:6] = self.uid[:4] + bytes([bcc, 0x08])
+        self.blocks[0][6:8] = b"\x04\x00"
+        for sector in range(16):
+            self.blocks[4 * sector + 3][:] = trailer
+        self.blocked = set()  # sectors bricked by malformed access bits
+
+    def trailer(self, block: int):
+        return self.blocks[block // 4 * 4 + 3]
+
+    def _conditions(self, block: int):
+        conditions = AccessConditions(self.trailer(block))
+        if conditions is None:
+            return None
+        index = block % 4
+        return tuple((c >> index) & 1 for c in conditions)
+
+    def key_b_readable(self, block: int):
+        conditions = self._conditions(block // 4 * 4 + 3)
+        return conditions is not None and "A" in _TRAILER[conditions][3]
+
+    def authenticate(self, block: int, key_name: str, key):
+        if block // 4 in self.blocked:
+            return False
+        trailer = self.trailer(block)
+        return bytes(key) == bytes(trailer[:6] if key_name == "A" else trailer[10:])
+
+    def _usable(self, block: int, key_name: str):
+        # Key B can't be used in a sector where it can be read
+        return self._conditions(block) is not None and not (key_name == "B" and self.key_b_readable(block))
+
+    def read(self, block: int, key_name: str):
+        if not self._usable(block, key_name):
+            return None
+        if block % 4 == 3:
+            permissions = _TRAILER[self._conditions(block)]
+            data = bytearray(16)  # key A never reads back
+            readable = False
+            if key_name in permissions[1]:
+                data[6:10] = self.blocks[block][6:10]
+                readable = True
+            if key_name in permissions[3]:
+                data[10:] = self.blocks[block][10:]
+                readable = True
+            return data if readable else None
+        if key_name not in _DATA[self._conditions(block)][0]:
+            return None
+        return bytearray(self.blocks[block])
+
+    def write(self, block: int, key_name: str, data):
+        if block == 0 or len(data) != 16 or not self._usable(block, key_name):
+            return False
+        if block % 4 == 3:
+            # Only the parts the key may write change
+            permissions = _TRAILER[self._conditions(block)]
+            trailer = self.blocks[block]
+            written = False
+            for allowed, start, end in ((permissions[0], 0, 6), (permissions[2], 6, 10), (permissions[4], 10, 16)):
+                if key_name in allowed:
+                    trailer[start:end] = data[start:end]
+                    written = True
+            if written and AccessConditions(trailer) is None:
+                self.blocked.add(block // 4)
+            return written
+        if key_name not in _DATA[self._conditions(block)][1]:
+            return False
+        self.blocks[block][:] = data
+        return True
+
+
+class PN532Emulator:
+    def __init__(self, field=None, latency=None, rf_errors=0, i2c_hz: int = 100000, clock=time, seed=None):
+        self.field = field or (lambda: None)  # returns the card in the field, None = no card
+        self.latency = ParseRates(latency, DEFAULT_LATENCY)
+        self.rf_errors = ParseRates(rf_errors)
+        self.i2c_hz = i2c_hz
+        self.clock = clock
+        self.random = random.Random(seed)
+        self._out = None  # frame waiting to be read (ACK or response)
+        self._command = None  # (command, params, started) being executed
+        self._seen = None  # (card, since) of the running search
+        self.target = None  # selected card
+        self._auth = None  # (sector, key name) of the selected card
+        self._halted = False
+        self.commands = {}  # command name: count
+        self.errors = {}  # command name: failures
+        self.i2c_bytes = 0
+        self.status_polls = 0
+
+    # Helpers
+    def _name(self, command: int, params):
+        if command == _COMMAND_INDATAEXCHANGE and len(params) > 1:
+            return {MIFARE_CMD_AUTH_A: "auth", MIFARE_CMD_AUTH_B: "auth", MIFARE_CMD_READ: "read", MIFARE_CMD_WRITE: "write"}.get(params[1], "exchange")
+        return {
+            _COMMAND_GETFIRMWAREVERSION: "firmware", _COMMAND_SAMCONFIGURATION: "sam", _COMMAND_INRELEASE: "release",
+            _COMMAND_INLISTPASSIVETARGET: "detect", _COMMAND_INAUTOPOLL: "detect",
+        }.get(command, hex(command))
+
+    def _latency(self, name: str):
+        return self.latency.get(name, self.latency.get("*", 0)) / 1000
+
+    def _fails(self, name: str):
+        if name not in _RF_COMMANDS:
+            return False
+        rate = self.rf_errors.get(name, self.rf_errors.get("*", 0))
+        if rate and self.random.random() < rate:
+            self.errors[name] = self.errors.get(name, 0) + 1
+            return True
+        return False
+
+    def _bus(self, count: int):
+        # Address byte + `count` bytes, 9 clock cycles each
+        self.i2c_bytes += count
+        self.clock.sleep((count + 1) * 9 / self.i2c_hz)
+
+    # I2C side
+    def write(self, data):
+        self._bus(len(data))
+        if bytes(data) == _ACK:
+            # Aborts the running command (e.g. a search)
+            self._command = None
+            self._out = None
+            return
+        try:
+            frame = ParseFrame(data)
+        except ValueError:
+            return  # the real chip ignores broken frames
+        if len(frame) < 2 or frame[0] != _HOSTTOPN532:
+            return
+        command, params = frame[1], bytes(frame[2:])
+        name = self._name(command, params)
+        self.commands[name] = self.commands.get(name, 0) + 1
+        self._command = (command, params, self.clock.monotonic())
+        self._seen = None
+        self._out = _ACK
+
+    def ready(self):
+        # Status byte: is there something to read?
+        self._bus(1)
+        self.status_polls += 1
+        if self._out is not None:
+            return True
+        return self._command is not None and self._finish()
+
+    def read(self, count: int):
+        # Status byte followed by `count` bytes of the waiting frame
+        self._bus(count + 1)
+        if self._out is None:
+            return bytearray(count + 1)
+        data = bytearray([0x01]) + self._out[:count]
+        if len(data) < count + 1:
+            data += bytearray(count + 1 - len(data))
+        self._out = None
+        return data
+
+    # Chip side
+    def _finish(self):
+        # Runs the command once its time has come, True when the response is waiting
+        command, params, started = self._command
+        now = self.clock.monotonic()
+        if command in (_COMMAND_INLISTPASSIVETARGET, _COMMAND_INAUTOPOLL):
+            card = self.field()
+            if card is None:
+                self._seen = None
+                return False
+            if self._seen is None or self._seen[0] is not card:
+                since = now
+                if command == _COMMAND_INAUTOPOLL and len(params) > 1 and params[1]:
+                    # The next poll of the PN532
+                    period = params[1] * 0.15
+                    since = started + -(-(now - started) // period) * period
+                self._seen = (card, since)
+            if now < self._seen[1] + self._latency("detect"):
+                return False
+            if self._fails("detect"):
+                self._seen = (card, now)
+                return False
+            response = self._select(card, command)
+        else:
+            if now < started + self._latency(self._name(command, params)):
+                return False
+            response = self._execute(command, params)
+        self._command = None
+        if response is None:
+            self._out = _SYNTAX_ERROR
+        else:
+            self._out = Frame(bytes([_PN532TOHOST, command + 1]) + bytes(response))
+        return True
+
+    def _select(self, card, command: int):
+        self.target = card
+        self._auth = None
+        self._halted = False
+        uid = card.uid
+        if command == _COMMAND_INAUTOPOLL:
+            # NbTg, Type, Length, Tg, SENS_RES (2), SEL_RES, UID length, UID
+            return bytes([1, 0x10, 5 + len(uid), 1, 0x00, 0x04, 0x08, len(uid)]) + uid
+        # NbTg, Tg, SENS_RES (2), SEL_RES, UID length, UID
+        return bytes([1, 1, 0x00, 0x04, 0x08, len(uid)]) + uid
+
+    def _execute(self, command: int, params):
+        if command == _COMMAND_GETFIRMWAREVERSION:
+            return bytes([0x32, 0x01, 0x06, 0x07])
+        if command == _COMMAND_SAMCONFIGURATION:
+            return b""
+        if command == _COMMAND_INRELEASE:
+            self.target = None
+            return b"\x00"
+        if command == _COMMAND_INDATAEXCHANGE and len(params) >= 3:
+            status, data = self._exchange(params[1], params[2], params[3:])
+            return bytes([status]) + data
+        return None
+
+    def _halt(self, status: int):
+        self._halted = True
+        self._auth = None
+        return status, b""
+
+    def _exchange(self, operation: int, block: int, data):
+        card = self.field()
+        if self.target is None or card is not self.target or self._halted:
+            return ERROR_TIMEOUT, b""
+        if self._fails(self._name(_COMMAND_INDATAEXCHANGE, bytes([1, operation]))):
+            return self._halt(ERROR_TIMEOUT)
+        if operation in (MIFARE_CMD_AUTH_A, MIFARE_CMD_AUTH_B):
+            # Key (6 bytes) followed by the first 4 bytes of the UID
+            key_name = "A" if operation == MIFARE_CMD_AUTH_A else "B"
+            if len(data) < 10 or bytes(data[6:10]) != card.uid[:4] or not card.authenticate(block, key_name, data[:6]):
+                return self._halt(ERROR_AUTH)
+            self._auth = (block // 4, key_name)
+            return 0x00, b""
+        if self._auth is None or self._auth[0] != block // 4:
+            # The card NAKs, the PN532 reports it as a time-out
+            return self._halt(ERROR_TIMEOUT)
+        if operation == MIFARE_CMD_READ:
+            value = card.read(block, self._auth[1])
+            if value is None:
+                return self._halt(ERROR_TIMEOUT)
+            return 0x00, bytes(value)
+        if operation == MIFARE_CMD_WRITE:
+            if not card.write(block, self._auth[1], data):
+                return self._halt(ERROR_TIMEOUT)
+            return 0x00, b""
+        return self._halt(ERROR_TIMEOUT)
+
+    def report(self):
+        commands = ", ".join([f"{name} {count}" + (f" ({self.errors[name]} failed)" if self.errors.get(name) else "") for name, count in self.commands.items()])
+        return f"{commands} ; I2C {self.i2c_bytes} bytes, {self.status_polls} status polls"
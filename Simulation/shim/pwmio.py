@@ -0,0 +1,34 @@
+from _sim import device
+
+# Shim: pwmio.PWMOut, every change of the duty cycle or frequency is recorded
+
+
+class PWMOut:
+    def __init__(self, pin, duty_cycle: int = 0, frequency: int = 500, variable_frequency: bool = False):
+        self.pin = pin
+        self._duty_cycle = duty_cycle
+        self._frequency = frequency
+        self.variable_frequency = variable_frequency
+
+    @property
+    def duty_cycle(self):
+        return self._duty_cycle
+
+    @duty_cycle.setter
+    def duty_cycle(self, value: int):
+        if value != self._duty_cycle:
+            device.record("pwm", self.pin.name, {"duty_cycle": value, "frequency": self._frequency})
+        self._duty_cycle = value
+
+    @property
+    def frequency(self):
+        return self._frequency
+
+    @frequency.setter
+    def frequency(self, value: int):
+        if not self.variable_frequency:
+            raise AttributeError("Cannot change frequency when variable_frequency is False")
+        self._frequency = value
+
+    def deinit(self):
+        pass
@@ -0,0 +1,17 @@
+import socket
+
+# Shim: socketpool.SocketPool, hands out normal CPython sockets
+
+
+class SocketPool:
+    AF_INET = socket.AF_INET
+    SOCK_STREAM = socket.SOCK_STREAM
+
+    def __init__(self, radio):
+        self.radio = radio
+
+    def socket(self, family=socket.AF_INET, type=socket.SOCK_STREAM, proto=0):
+        return socket.socket(family, type, proto)
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        return socket.getaddrinfo(host, port, family, type, proto, flags)
@@ -0,0 +1,40 @@
+import select, sys, time
+from _sim import device
+
+# Shim: supervisor.ticks_ms() and the serial console. What the script types
+# comes first, after that the real stdin of the process is used.
+_TICKS_PERIOD = 1 << 29
+
+
+def ticks_ms():
+    return int(time.monotonic() * 1000) % _TICKS_PERIOD
+
+
+class _Runtime:
+    @property
+    def serial_bytes_available(self):
+        if device.serial:
+            return len(device.serial)
+        try:
+            return 1 if select.select([sys.stdin], [], [], 0)[0] else 0
+        except (OSError, ValueError):
+            return 0
+
+
+class _Stdin:
+    # sys.stdin.read(1) of the firmware ends up here (see run_firmware.py)
+    def __init__(self, stdin):
+        self.stdin = stdin
+
+    def read(self, count: int = -1):
+        if device.serial:
+            data = device.serial[:count] if count > 0 else device.serial[:]
+            del device.serial[:len(data)]
+            return data.decode()
+        return self.stdin.read(count)
+
+    def readline(self):
+        return self.stdin.readline()
+
+
+runtime = _Runtime()
@@ -0,0 +1,21 @@
+from _sim import device
+
+# Shim: wifi.radio, always connected with the IP and MAC of the simulated device
+
+
+class _Radio:
+    connected = False
+
+    def connect(self, ssid: str, password: str = None, **kwargs):
+        self.connected = True
+
+    @property
+    def ipv4_address(self):
+        return device.ip
+
+    @property
+    def mac_address(self):
+        return device.mac
+
+
+radio = _Radio()
@@ -0,0 +1,34 @@
+import json, sys
+
+# -------------
+# Tap-to-unlock Latency
+# -------------
+# Reads the records of a simulation run (run_firmware.py --record, all devices
+# in one file) and pairs every card that enters a scanner's field with the
+# first unlock (lock pin high) of a door after it.
+#
+#   python Simulation/tap_latency.py records.jsonl [lock pin, default GP22]
+
+
+def TapLatencies(records, lock_pin: str = "GP22"):
+    records = sorted(records, key=lambda record: record["t"])
+    latencies = []
+    tap = None
+    for record in records:
+        if record["kind"] == "nfc" and record["name"] == "card" and record["value"]:
+            tap = record
+        elif tap and record["kind"] == "pin" and record["name"] == lock_pin and record["value"]:
+            latencies.append((tap["device"], record["device"], (record["t"] - tap["t"]) * 1000))
+            tap = None
+    return latencies
+
+
+if __name__ == "__main__":
+    with open(sys.argv[1]) as file:
+        records = [json.loads(line) for line in file if line.strip()]
+    latencies = TapLatencies(records, sys.argv[2] if len(sys.argv) > 2 else "GP22")
+    for scanner, door, ms in latencies:
+        print(f"{scanner} -> {door}: {ms:.1f} ms")
+    if latencies:
+        values = sorted([ms for scanner, door, ms in latencies])
+        print(f"{len(values)} taps, min {values[0]:.1f} ms / median {values[len(values) // 2]:.1f} ms / max {values[-1]:.1f} ms")
@@ -0,0 +1,73 @@
+import time, gc
+from collections import OrderedDict
+
+try:
+    import hashlib
+except ImportError:
+    import adafruit_hashlib as hashlib
+
+# -------------
+# Access Cache
+# -------------
+# Remembers the last decisions of the backend per card so the scanner can answer
+# a tap straight away and let the backend confirm it afterwards.
+# - key: card UID + the first 16 bytes of sha256(card pass), the pass itself is never stored
+# - value: (action, door_ip, expires)
+# - least recently used entries are dropped first, expired entries are never returned
+# - the number of entries follows from a RAM budget (ENTRY_BYTES per entry) and
+#   nothing is added while the heap is below `min_free` bytes
+ENTRY_BYTES = 160  # estimate: key bytes + value tuple + ordered dict slot on the Pico heap
+DIGEST_LEN = 16
+
+ACTION_FAILED = 0
+ACTION_SUCCESSFUL = 1
+ACTION_CHECKOUT = 2
+
+
+class AccessCache:
+    def __init__(self, max_bytes: int = 8192, ttl: int = 3600, deny_ttl: int = 60, min_free: int = 16384):
+        self.max_entries = max(1, max_bytes // ENTRY_BYTES)
+        self.ttl = ttl  # seconds an allowed card is answered from the cache
+        self.deny_ttl = deny_ttl  # seconds a refused card is answered from the cache
+        self.min_free = min_free
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, uid, card_pass: str):
+        digest = hashlib.sha256(card_pass.encode()).digest()
+        return bytes(uid) + digest[:DIGEST_LEN]
+
+    def get(self, key: bytes):
+        entry = self.entries.pop(key, None)
+        if entry is None or entry[2] <= time.monotonic():
+            self.misses += 1
+            return None
+        # Re-insert = most recently used
+        self.entries[key] = entry
+        self.hits += 1
+        return entry
+
+    def put(self, key: bytes, action: int, door_ip=None):
+        self.entries.pop(key, None)
+        if action == ACTION_CHECKOUT:
+            # Check in/out depends on the state in the backend, ask again next time
+            return
+        ttl = self.ttl if action == ACTION_SUCCESSFUL else self.deny_ttl
+        while len(self.entries) >= self.max_entries:
+            self.entries.pop(next(iter(self.entries)))
+        if hasattr(gc, "mem_free") and gc.mem_free() < self.min_free:
+            gc.collect()
+            if gc.mem_free() < self.min_free:
+                print("[CACHE] Low on memory, decision not cached")
+                return
+        self.entries[key] = (action, door_ip, time.monotonic() + ttl)
+
+    def forget(self, key: bytes):
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries = OrderedDict()
+
+    def stats(self):
+        return f"{len(self.entries)}/{self.max_entries} entries, {self.hits} hits, {self.misses} misses"
@@ -0,0 +1,74 @@
+import time
+import asyncio
+
+# -------------
+# Actuator Scheduler
+# -------------
+# Switches outputs (solenoid, LED, buzzer, ...) on for a while without blocking
+# the asyncio loop. hold() switches an output on and returns straight away, the
+# run() task switches it off again once its time is up. Holding an output that is
+# already on only moves its release time further, so overlapping open requests
+# extend the open window instead of queueing.
+class ActuatorScheduler:
+    def __init__(self, tick: float = 0.05):
+        self.tick = tick  # longest sleep while outputs are on
+        self.outputs = {}  # name -> [on, off, release time or None]
+        self._wake = asyncio.Event()
+
+    def add(self, name: str, on, off):
+        # on/off: functions that switch the output
+        self.outputs[name] = [on, off, None]
+        off()
+
+    def add_pin(self, name: str, pin, active: bool = True):
+        # DigitalInOut output, `active` is the value that switches it on
+        def on():
+            pin.value = active
+
+        def off():
+            pin.value = not active
+
+        self.add(name, on, off)
+
+    def hold(self, name: str, seconds: float):
+        output = self.outputs[name]
+        until = time.monotonic() + seconds
+        if output[2] is None:
+            output[0]()
+            output[2] = until
+            self._wake.set()
+        elif until > output[2]:
+            output[2] = until
+
+    def release(self, name: str):
+        output = self.outputs[name]
+        if output[2] is not None:
+            output[2] = None
+            output[1]()
+
+    def active(self, name: str):
+        return self.outputs[name][2] is not None
+
+    def remaining(self, name: str):
+        until = self.outputs[name][2]
+        return 0 if until is None else max(0, until - time.monotonic())
+
+    async def run(self):
+        while True:
+            now = time.monotonic()
+            nearest = None
+            for name, output in self.outputs.items():
+                until = output[2]
+                if until is None:
+                    continue
+                if until <= now:
+                    output[2] = None
+                    output[1]()
+                elif nearest is None or until < nearest:
+                    nearest = until
+            if nearest is None:
+                # Nothing on, sleep until the next hold()
+                self._wake.clear()
+                await self._wake.wait()
+            else:
+                await asyncio.sleep(min(nearest - now, self.tick))
@@ -0,0 +1,87 @@
+import time
+import asyncio
+import keypad
+import supervisor
+
+# -------------
+# Button Events
+# -------------
+# The buttons are scanned and debounced in the background by keypad.Keys, every
+# press ends up in an event queue. Nothing has to busy-poll the pins and no
+# press is lost while the program is doing something else.
+#
+# Presses stay queued until they are taken, also while no screen reads the
+# buttons: clear() drops them when a new screen starts, so it doesn't act on a
+# press that was meant for the one before.
+#
+# For every press handed out, the time between the debounced press (event
+# timestamp) and the moment the program takes it is kept (press-to-action
+# latency). Also how much of the waiting time was handed back: time.sleep() in
+# wait(), asyncio.sleep() in next() (the asyncio version of wait()). With
+# asyncio that includes the time the other tasks ran, so it is not CPU idle
+# time, only how little the wait itself kept the CPU busy.
+_TICKS_PERIOD = 1 << 29
+
+
+class ButtonEvents:
+    def __init__(self, pins, names, value_when_pressed: bool = True, interval: float = 0.02):
+        # Pulls are set opposite to value_when_pressed (pressed = True -> pull down)
+        self.keys = keypad.Keys(pins, value_when_pressed=value_when_pressed, pull=True, interval=interval)
+        self.names = names
+        self.event = keypad.Event()  # reused for every event
+        self.presses = 0
+        self.latency_total = 0
+        self.latency_max = 0
+        self.waited = 0.0
+        self.yielded = 0.0  # seconds in (asyncio.)sleep while waiting
+
+    def get(self):
+        # Name of the next pressed button, or None if nothing was pressed
+        while self.keys.events.get_into(self.event):
+            if self.event.pressed:
+                latency = (supervisor.ticks_ms() - self.event.timestamp) % _TICKS_PERIOD
+                self.presses += 1
+                self.latency_total += latency
+                self.latency_max = max(self.latency_max, latency)
+                return self.names[self.event.key_number]
+
+        return None
+
+    def clear(self):
+        # Drops the presses nobody took yet (call when a new screen starts)
+        self.keys.events.clear()
+
+    def wait(self, service=None, step: float = 0.01):
+        # Sleeps until a button is pressed. `service` is called every round and
+        # may return the seconds until it needs to run again (e.g. player.service).
+        started = time.monotonic()
+        while True:
+            name = self.get()
+            if name is not None:
+                self.waited += time.monotonic() - started
+                return name
+            nap = step
+            if service:
+                due = service()
+                if due is not None and due < nap:
+                    nap = due
+            before = time.monotonic()
+            time.sleep(nap)
+            self.yielded += time.monotonic() - before
+
+    async def next(self, step: float = 0.01):
+        # Like wait(), but the other tasks keep running in the meantime
+        started = time.monotonic()
+        while True:
+            name = self.get()
+            if name is not None:
+                self.waited += time.monotonic() - started
+                return name
+            before = time.monotonic()
+            await asyncio.sleep(step)
+            self.yielded += time.monotonic() - before
+
+    def stats(self):
+        average = self.latency_total // self.presses if self.presses else 0
+        yielded = 100 * self.yielded / self.waited if self.waited else 0
+        return f"{self.presses} presses, latency avg {average} ms / max {self.latency_max} ms, {yielded:.0f}% of the wait yielded"
@@ -0,0 +1,76 @@
+import time
+import asyncio
+
+# -------------
+# Buzzer Player
+# -------------
+# Plays tone patterns on a PWMOut buzzer in the background. play() sets the
+# first tone and returns straight away, the next steps are switched by
+# service() (blocking programs call it from their wait loops) or by the run()
+# task (asyncio programs). Playing a new pattern replaces the current one.
+#
+# A pattern is a precomputed tuple of (frequency, duty_cycle, seconds) steps,
+# duty_cycle 0 is a silent step.
+SUCCESS = ((850, 2**15, 0.06), (850, 0, 0.06))
+FAIL = ((300, 2**15, 0.3),)
+
+
+def Tone(frequency: int, seconds: float, duty_cycle: int = 2**15):
+    return ((frequency, duty_cycle, seconds),)
+
+
+class BuzzerPlayer:
+    def __init__(self, buzzer):
+        self.buzzer = buzzer
+        self.pattern = None
+        self.step = 0
+        self.until = 0  # end of the current step
+        self._wake = asyncio.Event()
+
+    def _start_step(self, now: float):
+        frequency, duty_cycle, seconds = self.pattern[self.step]
+        if duty_cycle:
+            self.buzzer.frequency = frequency
+        self.buzzer.duty_cycle = duty_cycle
+        self.until = now + seconds
+
+    def play(self, pattern):
+        self.pattern = pattern
+        self.step = 0
+        self._start_step(time.monotonic())
+        self._wake.set()
+
+    def stop(self):
+        self.pattern = None
+        self.buzzer.duty_cycle = 0
+
+    def playing(self):
+        return self.pattern is not None
+
+    def service(self):
+        # Moves on to the next step(s) that are due, returns the seconds until
+        # the next change or None when nothing is playing
+        if self.pattern is None:
+            return None
+        now = time.monotonic()
+        while now >= self.until:
+            self.step += 1
+            if self.step >= len(self.pattern):
+                self.stop()
+                return None
+            self._start_step(self.until)
+
+        return self.until - now
+
+    async def run(self):
+        while True:
+            wait = self.service()
+            self._wake.clear()
+            if wait is None:
+                await self._wake.wait()
+            else:
+                # play() wakes us up early when a new pattern starts
+                try:
+                    await asyncio.wait_for(self._wake.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
@@ -0,0 +1,69 @@
+# -------------
+# Card Codec
+# -------------
+# Card blocks hold text padded with zeros. These converters go straight from the
+# block bytes to text (and back) through a buffer instead of building a list of
+# hex strings first. Pass `into` a preallocated bytearray to keep the tap path
+# free of temporary objects; without it a new bytearray is created.
+HEX_DIGITS = "0123456789abcdef"
+
+
+def EncodeText(text: str, max_len: int, into: bytearray = None):
+    # Text -> zero padded bytes (max_len long), None if the text doesn't fit
+    data = text.encode()
+    if len(data) > max_len:
+        print(f"ERROR: Length is longer than the max ({max_len})! \n")
+        return None
+    if into is None:
+        into = bytearray(max_len)
+    view = memoryview(into)
+    view[:len(data)] = data
+    for i in range(len(data), max_len):
+        view[i] = 0
+
+    return view[:max_len] if len(into) != max_len else into
+
+
+def DecodeInto(data, into: bytearray):
+    # Copies the non-zero bytes of `data` into `into`, returns how many were
+    # copied or -1 if they don't fit.
+    n = 0
+    size = len(into)
+    for x in memoryview(data):
+        if x:
+            if n == size:
+                return -1
+            into[n] = x
+            n += 1
+
+    return n
+
+
+def DecodeText(data, into: bytearray = None):
+    # Block bytes -> text without the zero padding, None if it isn't valid text
+    if into is None:
+        into = bytearray(len(data))
+    n = DecodeInto(data, into)
+    if n < 0:
+        print(f"ERROR: Length is longer than the max ({len(into)})! \n")
+        return None
+    try:
+        return str(memoryview(into)[:n], "utf-8")
+    except UnicodeError:
+        print("ERROR: Card data is not valid text.")
+        return None
+
+
+def HexToBytes(array: [], into: bytearray = None):
+    # ["44", "65", "5", ...] -> bytes, every item is one byte (leading zero optional)
+    if into is None:
+        into = bytearray(len(array))
+    for i, value in enumerate(array):
+        into[i] = int(value, 16)
+
+    return into
+
+
+def BytesToHex(data):
+    # Two hex digits per byte, bytes below 0x10 keep their leading zero
+    return " ".join([HEX_DIGITS[x >> 4] + HEX_DIGITS[x & 15] for x in memoryview(data)])
@@ -0,0 +1,268 @@
+import time
+
+# MIFARE authentication commands (same values as adafruit_pn532.adafruit_pn532)
+MIFARE_CMD_AUTH_A = 0x60
+MIFARE_CMD_AUTH_B = 0x61
+
+
+# -------------
+# Card Session
+# -------------
+# One tap = one card detection. The UID found by detect() is reused for every
+# authentication, read and write of that tap instead of calling
+# read_passive_target() again for each block.
+#
+# Sectors are numbered like the rest of the project (MIFARE Classic 1K):
+# sector 1 = blocks 0-3, sector 2 = blocks 4-7, ... The last block of a sector
+# is its trailer. A sector is only authenticated once per key, every other
+# block of that sector reuses the authentication.
+BLOCK_SIZE = 16
+BLOCKS_PER_SECTOR = 4
+
+
+def SectorOf(block: int):
+    return block // BLOCKS_PER_SECTOR + 1
+
+
+def TrailerOf(sector: int):
+    return BLOCKS_PER_SECTOR*sector - 1
+
+
+def DataBlocksOf(sector: int):
+    first = BLOCKS_PER_SECTOR*(sector - 1)
+    # Block 0 holds the manufacturer data and can't be written
+    return [block for block in range(first, TrailerOf(sector)) if block != 0]
+
+
+class CardSession:
+    def __init__(self, scanner, idle=None, watcher=None):
+        self.scanner = scanner
+        self.idle = idle  # called between detection attempts (e.g. mqtt_client.loop)
+        self.watcher = watcher  # CardWatcher for IRQ based detection, None = software polling
+        self.uid = None
+        self.timings = []  # [(stage, ms), ...] in the order they happened
+        self._start = None
+        self._halted = False
+        self._auth = None  # (sector, b, key) of the current authentication
+
+    # Timing helpers
+    def _now(self):
+        return time.monotonic_ns()
+
+    def _stage(self, stage: str, started: int):
+        self.timings.append((stage, (self._now() - started) // 1000000))
+
+    def mark(self, stage: str, started: int):
+        # Record a stage that happened outside the session (e.g. publish)
+        self._stage(stage, started)
+
+    def total(self):
+        if self._start is None:
+            return 0
+        return (self._now() - self._start) // 1000000
+
+    def report(self):
+        # Same stages are summed, e.g. "read: 12 ms (3x)" for a sector read
+        names, totals, counts = [], {}, {}
+        for stage, ms in self.timings:
+            if stage not in totals:
+                names.append(stage)
+                totals[stage], counts[stage] = 0, 0
+            totals[stage] += ms
+            counts[stage] += 1
+        stages = " ; ".join([f"{stage}: {totals[stage]} ms" + (f" ({counts[stage]}x)" if counts[stage] > 1 else "") for stage in names])
+        print(f"[TIMING] {stages} ; total: {self.total()} ms")
+
+    # NFC functions
+    def detect(self, timeout: float = 0.5):
+        print("Waiting for card...")
+        if self.watcher:
+            uid = self.watcher.wait(idle=self.idle)
+        else:
+            while True:
+                uid = self.scanner.read_passive_target(timeout=timeout)
+                if uid is not None:
+                    break
+                if self.idle:
+                    self.idle()
+
+        return self._found(uid)
+
+    async def detect_async(self, step: float = None):
+        # asyncio version of detect(), needs a watcher: the PN532 searches on its
+        # own and the other tasks run while we wait for it
+        print("Waiting for card...")
+        uid = await self.watcher.wait_async(step=step)
+
+        return self._found(uid)
+
+    def _found(self, uid):
+        # The tap starts when the card is seen, not when we started waiting
+        self._start = self._now()
+        self.timings = []
+        self.uid = uid
+        self._halted = False
+        self._auth = None
+        print(f"\nFound card with UID: {[i for i in uid]}")
+
+        return uid
+
+    def _reselect(self):
+        # A failed authentication halts the card, it has to be selected again
+        started = self._now()
+        uid = self.scanner.read_passive_target(timeout=0.5)
+        self._stage("reselect", started)
+        if uid is None or bytes(uid) != bytes(self.uid):
+            print("ERROR: Card left the field.")
+            return False
+        self._halted = False
+        return True
+
+    def authenticate(self, block: int, key: bytearray, b: bool = False):
+        if self.uid is None:
+            self.detect()
+        if self._halted and not self._reselect():
+            return False
+        auth = (SectorOf(block), b, bytes(key))
+        if self._auth == auth:
+            return True
+        print(f"Authenticating block {block} ...")
+        started = self._now()
+        authenticated = self.scanner.mifare_classic_authenticate_block(self.uid, block, MIFARE_CMD_AUTH_B if b else MIFARE_CMD_AUTH_A, key)
+        self._stage("auth", started)
+        if authenticated:
+            self._auth = auth
+            print("Authentication SUCCESFUL! \n")
+        else:
+            self._auth = None
+            self._halted = True
+            print("Authentication FAILED!")
+
+        return authenticated
+
+    def _read(self, block: int):
+        started = self._now()
+        try:
+            data = self.scanner.mifare_classic_read_block(block)
+        except:
+            data = None
+        self._stage("read", started)
+        if data is None:
+            print(f"ERROR: Something went wrong while reading block {block}.")
+        return data
+
+    def _write(self, block: int, data: bytearray):
+        started = self._now()
+        try:
+            written = self.scanner.mifare_classic_write_block(block, data)
+        except:
+            written = False
+        self._stage("write", started)
+        if not written:
+            print(f"ERROR: Something went wrong while writing block {block}.")
+        return written
+
+    def read_block(self, block: int, key_a: bytearray):
+        if not self.authenticate(block=block, key=key_a):
+            return None
+        print(f"Reading block {block}...")
+        return self._read(block)
+
+    def write_block(self, block: int, key_b: bytearray, data: bytearray):
+        if not self.authenticate(block=block, key=key_b, b=True):
+            return False
+        print(f"Writing data to block {block}...")
+        if not self._write(block, data):
+            return False
+        print(f"Wrote to block {block}")
+        if block == TrailerOf(SectorOf(block)):
+            # The sector now uses the new keys
+            self._auth = None
+        return True
+
+    def create_trailer(self, sector: int, key_b: bytearray, new_key_a: bytearray, new_key_b: bytearray, access_bits: bytearray):
+        trailer = new_key_a + access_bits + new_key_b
+        print(f"Writing new trailer for sector {sector}...")
+        if self.write_block(block=TrailerOf(sector), key_b=key_b, data=trailer):
+            print("Key A\t Access Bits\t Key B")
+            print(f"{new_key_a}\t {access_bits}\t {new_key_b}")
+            return True
+        return False
+
+    # Sector functions
+    def read_blocks(self, block: int, count: int, key_a: bytearray, b: bool = False, into: bytearray = None):
+        # Reads `count` data blocks starting at `block`, trailers are skipped.
+        # Returns all the data in one buffer (`into` if given, it has to hold
+        # count*16 bytes) or None if a block failed.
+        data = bytearray(count*BLOCK_SIZE) if into is None else into
+        view = memoryview(data)
+        offset = 0
+        while count > 0:
+            if block == TrailerOf(SectorOf(block)):
+                block += 1
+                continue
+            if not self.authenticate(block=block, key=key_a, b=b):
+                return None
+            value = self._read(block)
+            if value is None:
+                return None
+            view[offset:offset + BLOCK_SIZE] = value
+            offset += BLOCK_SIZE
+            block += 1
+            count -= 1
+
+        return view[:offset]
+
+    def write_blocks(self, block: int, key_b: bytearray, data: bytearray):
+        # Writes `data` over as many data blocks as needed starting at `block`,
+        # trailers are skipped and the last block is padded with zeros.
+        data = bytearray(data)
+        if len(data) % BLOCK_SIZE:
+            data += bytearray(BLOCK_SIZE - len(data) % BLOCK_SIZE)
+        offset = 0
+        while offset < len(data):
+            if block == TrailerOf(SectorOf(block)):
+                block += 1
+                continue
+            if not self.authenticate(block=block, key=key_b, b=True):
+                return False
+            if not self._write(block, data[offset:offset + BLOCK_SIZE]):
+                return False
+            block += 1
+            offset += BLOCK_SIZE
+
+        return True
+
+    def read_sector(self, sector: int, key: bytearray, b: bool = False, trailer: bool = False):
+        # All data blocks of the sector with one authentication, optionally
+        # followed by the trailer (key A always reads back as zeros).
+        blocks = DataBlocksOf(sector)
+        if trailer:
+            blocks.append(TrailerOf(sector))
+        print(f"Reading sector {sector} (blocks {blocks[0]}-{blocks[-1]})...")
+        data = bytearray()
+        for block in blocks:
+            if not self.authenticate(block=block, key=key, b=b):
+                return None
+            value = self._read(block)
+            if value is None:
+                return None
+            data += value
+
+        return data
+
+    def write_sector(self, sector: int, key_b: bytearray, data: bytearray, trailer: bytearray = None):
+        # Fills the data blocks of the sector with one authentication. The
+        # trailer is written last so the new keys only apply after the data.
+        blocks = DataBlocksOf(sector)
+        if len(data) > len(blocks)*BLOCK_SIZE:
+            print(f"ERROR: Length is longer than the max ({len(blocks)*BLOCK_SIZE})! \n")
+            return False
+        print(f"Writing sector {sector} (blocks {blocks[0]}-{blocks[-1]})...")
+        if not self.write_blocks(block=blocks[0], key_b=key_b, data=data):
+            return False
+        if trailer is not None and not self.write_block(block=TrailerOf(sector), key_b=key_b, data=trailer):
+            return False
+        print(f"Wrote sector {sector}")
+
+        return True
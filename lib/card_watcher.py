@@ -0,0 +1,133 @@
+import time
+import asyncio
+
+try:
+    import alarm
+except ImportError:
+    alarm = None
+
+# -------------
+# Card Watcher
+# -------------
+# Hardware card detection: the PN532 searches the field on its own and pulls its
+# IRQ pin low once a card shows up, so the Pico only reads one GPIO instead of
+# sending read_passive_target() over I2C every 0.5 s. Without anything else to
+# do (no idle callback) and with `irq_pin` given, the Pico light sleeps until the
+# IRQ pin wakes it up.
+#
+# Two ways to let the PN532 search:
+# - autopoll=False: one InListPassiveTarget that keeps retrying until a card is
+#   found (default, RF field always on)
+# - autopoll=True: InAutoPoll, the PN532 polls every `period` x 150 ms and
+#   switches the RF field off in between (less power, up to one period later)
+#
+# A found card is only noticed at the next ready() check: after the idle
+# callback returns in wait(), after `step` in wait_async(). That time comes on
+# top of the PN532 selecting the card. With the IRQ pin wired (the default
+# setup, NFC_IRQ_PIN) a check is one GPIO read, so wait_async() looks every
+# 1 ms: as fast as the blocking read_passive_target() loop, while MQTT keeps
+# running and the bus carries ~1 instead of ~100 I2C frames per second (see
+# Benchmarks/bench_card_detect.py). With a 50 ms mqtt_client.loop() as idle
+# callback, wait() can only notice the card after the callback (p50 ~30 ms).
+#
+# Without an IRQ pin (irq=None) ready() reads the PN532 status byte over I2C,
+# one frame per check, so wait_async() only looks every 20 ms then.
+_COMMAND_INAUTOPOLL = 0x60
+STEP_IRQ = 0.001  # seconds between checks of the IRQ pin
+STEP_I2C = 0.02  # seconds between status reads without an IRQ pin
+
+POLL_FOREVER = 0xFF
+TYPE_MIFARE = 0x10  # Passive 106 kbps ISO/IEC14443-A (MIFARE Classic)
+
+
+class CardWatcher:
+    def __init__(self, scanner, irq, irq_pin=None, autopoll: bool = False, period: int = 1, interval: float = 0.005, step: float = None):
+        self.scanner = scanner
+        self.autopoll = autopoll
+        self.irq = irq  # DigitalInOut input connected to the PN532 IRQ pin, None = ask over I2C
+        self.irq_pin = irq_pin  # board pin of `irq`, only needed for light sleep
+        self.period = period  # PN532 poll period in units of 150 ms (1-15)
+        self.interval = interval  # pin check interval when there is no idle callback
+        self.step = step if step is not None else (STEP_IRQ if irq is not None else STEP_I2C)  # wait_async()
+        self.armed = False
+
+    def arm(self):
+        # Start the PN532 search, returns straight away
+        if self.armed:
+            return True
+        try:
+            if self.autopoll:
+                self.armed = self.scanner.send_command(_COMMAND_INAUTOPOLL, params=[POLL_FOREVER, self.period, TYPE_MIFARE], timeout=1)
+            else:
+                self.armed = self.scanner.listen_for_passive_target(timeout=1)
+        except RuntimeError:
+            self.armed = False
+        if not self.armed:
+            print("ERROR: PN532 did not start searching for cards.")
+        return self.armed
+
+    def ready(self):
+        # IRQ is active low: low = the PN532 has a response (a card) waiting
+        if not self.armed:
+            return False
+        if self.irq is None:
+            return self.scanner._wait_ready(timeout=0.001)
+        return not self.irq.value
+
+    def read(self):
+        self.armed = False
+        if not self.autopoll:
+            try:
+                return self.scanner.get_passive_target(timeout=0.1)
+            except RuntimeError:
+                return None
+        # Response: NbTg, Type, Length, Tg, SENS_RES (2), SEL_RES, UID length, UID...
+        try:
+            response = self.scanner.process_response(_COMMAND_INAUTOPOLL, response_length=32, timeout=0.1)
+        except RuntimeError:
+            return None
+        if response is None or response[0] < 1:
+            return None
+        uid_len = response[7]
+        if uid_len > 7:
+            return None
+
+        return response[8:8 + uid_len]
+
+    def _sleep(self):
+        # Light sleep until the PN532 pulls IRQ low, the pin has to be released for the alarm
+        import digitalio
+        self.irq.deinit()
+        alarm.light_sleep_until_alarms(alarm.pin.PinAlarm(pin=self.irq_pin, value=False, pull=True))
+        self.irq = digitalio.DigitalInOut(self.irq_pin)
+        self.irq.switch_to_input(pull=digitalio.Pull.UP)
+
+    def wait(self, idle=None):
+        # Blocks until a card is in the field and returns its UID
+        while True:
+            if not self.arm():
+                time.sleep(0.5)
+                continue
+            while not self.ready():
+                if idle:
+                    idle()
+                elif alarm and self.irq_pin is not None:
+                    self._sleep()
+                else:
+                    time.sleep(self.interval)
+            uid = self.read()
+            if uid is not None:
+                return uid
+
+    async def wait_async(self, step: float = None):
+        # Same as wait() for asyncio programs, the PN532 is checked every `step` seconds
+        step = step or self.step
+        while True:
+            if not self.arm():
+                await asyncio.sleep(0.5)
+                continue
+            while not self.ready():
+                await asyncio.sleep(step)
+            uid = self.read()
+            if uid is not None:
+                return uid
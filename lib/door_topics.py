@@ -0,0 +1,19 @@
+# -------------
+# Door Topics
+# -------------
+# Every lock listens on its own command feed, lock.open-<door id>, instead of
+# all locks listening on lock.open and comparing the payload with their IP.
+# The door id is the IP address with dashes ("192.168.0.11" -> "192-168-0-11")
+# so the backend and the scanners build the topic from the door_ip they already
+# know, there is no separate id to keep the same on both sides.
+def DoorId(door_ip: str):
+    return str(door_ip).replace(".", "-")
+
+
+def OpenTopic(aio_user: str, door_id: str):
+    return aio_user + "/feeds/lock.open-" + door_id
+
+
+def BroadcastTopic(aio_user: str):
+    # Old shared feed, the payload is the IP of the door that has to open
+    return aio_user + "/feeds/lock.open"
@@ -0,0 +1,256 @@
+import os
+import time
+
+# -------------
+# Event Queue
+# -------------
+# Keeps the messages that couldn't be published (no connection) on the flash
+# of the Pico and publishes them once the connection is back.
+#
+# - put() adds a record to a RAM buffer, the buffer is written to flash with one
+#   append once it holds `flush_every` records or after `flush_after` seconds
+#   (a few big writes instead of one per event, less flash wear)
+# - the records go into segment files (<folder>/<n>.q) of at most
+#   `segment_bytes`; with more than `segments` files the oldest one is dropped
+#   (ring buffer, the flash use stays bounded)
+# - drain() publishes at most `batch` records per call and stores how far it got
+#   in <folder>/ack, a drained segment is deleted
+#
+# Record: magic, topic index, payload length, payload, CRC-8. A record that was
+# only half written when the power went away fails the CRC and ends its segment,
+# new records then go to a new segment. After a crash a batch can be sent twice,
+# but nothing is lost.
+#
+# CIRCUITPY is read-only for code unless boot.py remounts it with
+# storage.remount("/", readonly=False). Without that the queue only lives in RAM.
+MAGIC = 0xE7
+HEADER_SIZE = 3
+MAX_PAYLOAD = 255
+
+
+def Crc8(data, crc: int = 0):
+    for byte in data:
+        crc ^= byte
+        for i in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return crc
+
+
+def ParseRecord(data, offset: int):
+    # Returns (topic index, payload, end offset) or None for a missing or broken record
+    if offset + HEADER_SIZE > len(data) or data[offset] != MAGIC:
+        return None
+    end = offset + HEADER_SIZE + data[offset + 2]
+    if end + 1 > len(data) or Crc8(data[offset:end]) != data[end]:
+        return None
+    return data[offset + 1], bytes(data[offset + HEADER_SIZE:end]), end + 1
+
+
+class EventQueue:
+    def __init__(self, topics, folder: str = "/queue", segment_bytes: int = 1024, segments: int = 8, flush_every: int = 8, flush_after: float = 5, batch: int = 8):
+        self.topics = list(topics)  # only these topics can be queued, a record stores the index
+        self.folder = folder
+        self.segment_bytes = segment_bytes
+        self.segments = segments
+        self.flush_every = flush_every
+        self.flush_after = flush_after
+        self.batch = batch
+        self.buffer = bytearray()  # records that aren't on flash yet
+        self.buffered = 0
+        self.buffered_since = 0
+        self.files = []  # segment numbers on flash, oldest first
+        self.offset = 0  # drained bytes of the oldest segment
+        self.write_n = 0
+        self.write_size = 0
+        self.stats = {"queued": 0, "writes": 0, "sent": 0, "dropped": 0}
+        self.flash = self._open()
+
+    def _path(self, n: int):
+        return f"{self.folder}/{n}.q"
+
+    def _read(self, n: int):
+        with open(self._path(n), "rb") as file:
+            return file.read()
+
+    def _open(self):
+        try:
+            try:
+                os.stat(self.folder)
+            except OSError:
+                os.mkdir(self.folder)
+            self.files = sorted([int(name[:-2]) for name in os.listdir(self.folder) if name.endswith(".q")])
+        except OSError as error:
+            print(f"[QUEUE] No flash ({error}), events are only kept in RAM")
+            return False
+        try:
+            with open(self.folder + "/ack") as file:
+                n, offset = file.read().split()
+            if self.files and int(n) == self.files[0]:
+                self.offset = int(offset)
+        except (OSError, ValueError):
+            pass
+        if self.files:
+            # Never append behind a half written record, start a new segment instead
+            self.write_n = self.files[-1]
+            data = self._read(self.write_n)
+            offset = 0
+            while offset < len(data):
+                record = ParseRecord(data, offset)
+                if record is None:
+                    break
+                offset = record[2]
+            self.write_size = len(data)
+            if offset < len(data):
+                self.write_n += 1
+                self.write_size = 0
+            print(f"[QUEUE] {len(self.files)} segment(s) with queued events on flash")
+        return True
+
+    def waiting(self):
+        # True while there are events that weren't published yet
+        return self.buffered > 0 or len(self.files) > 0
+
+    def put(self, topic: str, payload):
+        # `payload` is str or bytes, it comes back from drain() as bytes
+        data = payload.encode("utf-8") if isinstance(payload, str) else payload
+        if len(data) > MAX_PAYLOAD:
+            print(f"[QUEUE] Payload of {len(data)} bytes is too long to queue")
+            return False
+        record = bytearray(HEADER_SIZE + len(data) + 1)
+        record[0] = MAGIC
+        record[1] = self.topics.index(topic)
+        record[2] = len(data)
+        record[HEADER_SIZE:HEADER_SIZE + len(data)] = data
+        record[-1] = Crc8(memoryview(record)[:-1])
+        if not self.flash and len(self.buffer) + len(record) > self.segment_bytes:
+            self.stats["dropped"] += 1
+            return False
+        if self.buffered == 0:
+            self.buffered_since = time.monotonic()
+        self.buffer += record
+        self.buffered += 1
+        self.stats["queued"] += 1
+        if self.flash and (self.buffered >= self.flush_every or len(self.buffer) >= self.segment_bytes):
+            self.flush()
+        return True
+
+    def flush(self):
+        # Appends the RAM buffer to the newest segment (one write)
+        if not self.flash or not self.buffered:
+            return
+        if self.write_size and self.write_size + len(self.buffer) > self.segment_bytes:
+            self.write_n += 1
+            self.write_size = 0
+        try:
+            with open(self._path(self.write_n), "ab") as file:
+                file.write(self.buffer)
+        except OSError as error:
+            print(f"[QUEUE] Writing to flash failed ({error})")
+            return
+        self.stats["writes"] += 1
+        self.write_size += len(self.buffer)
+        if not self.files or self.files[-1] != self.write_n:
+            self.files.append(self.write_n)
+        self.buffer = bytearray()
+        self.buffered = 0
+        while len(self.files) > self.segments:
+            # Full: the oldest events go
+            self.stats["dropped"] += self._count(self.files[0], self.offset)
+            self._remove(self.files[0])
+
+    def _count(self, n: int, offset: int):
+        data = self._read(n)
+        count = 0
+        record = ParseRecord(data, offset)
+        while record is not None:
+            count += 1
+            record = ParseRecord(data, record[2])
+        return count
+
+    def _remove(self, n: int):
+        try:
+            os.remove(self._path(n))
+        except OSError:
+            pass
+        self.files.remove(n)
+        self.offset = 0
+        if n == self.write_n:
+            self.write_n += 1
+            self.write_size = 0
+
+    def _save_ack(self):
+        try:
+            with open(self.folder + "/ack", "w") as file:
+                file.write(f"{self.files[0] if self.files else self.write_n} {self.offset}")
+        except OSError:
+            pass
+
+    def drain(self, publish):
+        # Publishes the oldest events with publish(topic, payload), returns how many were sent.
+        # publish() returns False when the event did not go out (it is tried again later),
+        # so it must not keep the event itself (PublishGovernor.send_now, not .publish):
+        # the ack only moves past events that really went out.
+        sent = 0
+        if not self.flash:
+            offset = 0
+            while sent < self.batch:
+                record = ParseRecord(self.buffer, offset)
+                if record is None:
+                    break
+                try:
+                    if publish(self.topics[record[0]], record[1]) is False:
+                        break
+                except Exception as error:
+                    print(f"[QUEUE] Publish failed ({error})")
+                    break
+                offset = record[2]
+                sent += 1
+            self.buffer = self.buffer[offset:]
+            self.buffered -= sent
+            self.stats["sent"] += sent
+            return sent
+
+        self.flush()
+        data, data_n = None, None
+        while sent < self.batch and self.files:
+            n = self.files[0]
+            if data_n != n:
+                data, data_n = self._read(n), n
+            record = ParseRecord(data, self.offset)
+            if record is None:
+                # Drained (or the rest of the segment is broken)
+                self._remove(n)
+                continue
+            try:
+                if publish(self.topics[record[0]], record[1]) is False:
+                    break  # not sent (e.g. no token), stays on flash
+            except Exception as error:
+                print(f"[QUEUE] Publish failed ({error})")
+                break
+            self.offset = record[2]
+            sent += 1
+        if sent:
+            self._save_ack()
+            self.stats["sent"] += sent
+        return sent
+
+    def send(self, publish, topic: str, payload: str, connected: bool = True):
+        # Publishes straight away when possible, otherwise it is queued. While older
+        # events are still waiting new ones are queued too, so the order stays the same.
+        if connected and not self.waiting():
+            try:
+                if publish(topic, payload) is not False:
+                    return True
+            except Exception as error:
+                print(f"[QUEUE] Publish failed ({error}), queued")
+        self.put(topic, payload)
+        return False
+
+    def service(self, publish=None):
+        # Call regularly: writes the RAM buffer when it is due and drains one batch
+        # when `publish` is given (only pass it while connected)
+        if self.buffered and time.monotonic() - self.buffered_since >= self.flush_after:
+            self.flush()
+        if publish and self.waiting():
+            return self.drain(publish)
+        return 0
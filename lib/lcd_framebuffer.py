@@ -0,0 +1,127 @@
+import asyncio
+
+# -------------
+# LCD Framebuffer
+# -------------
+# Sits in front of a Character_LCD_Mono and remembers what is on the screen.
+# clear() and message work like on the LCD itself, but only the cells that
+# really change are sent: one cursor move per changed run of characters and one
+# write per changed character. clear() is only sent to the LCD when the new
+# screen is empty and a lot of cells would have to be blanked.
+#
+# `writes` counts every byte sent over the 4-bit bus (commands + characters).
+#
+# With auto_flush=False clear() and setting message only update the framebuffer,
+# the run() task sends it to the LCD (asyncio programs, the LCD is written from
+# one task).
+#
+# Cursor moves and characters go through lcd._write8(), a private method of
+# adafruit_character_lcd (there is no public call for a single cell). It has to
+# be checked again when the library is updated.
+_LCD_SETDDRAMADDR = 0x80
+_LCD_ROW_OFFSETS = (0x00, 0x40, 0x14, 0x54)
+
+
+class FramebufferLCD:
+    def __init__(self, lcd, columns: int = 16, rows: int = 2, auto_flush: bool = True):
+        self.lcd = lcd
+        self.auto_flush = auto_flush
+        self.columns = columns
+        self.rows = rows
+        self.shown = [bytearray(b" " * columns) for i in range(rows)]  # on the LCD now
+        self.target = [bytearray(b" " * columns) for i in range(rows)]  # what it should show
+        self.cursor = None  # (column, row) the LCD writes to next, None = unknown
+        self.writes = 0
+        self._message = ""
+        self._wake = asyncio.Event()
+        # Start from a known (empty) screen
+        self.lcd.clear()
+        self.writes += 1
+
+    # Same interface as Character_LCD_Mono
+    @property
+    def backlight(self):
+        return self.lcd.backlight
+
+    @backlight.setter
+    def backlight(self, value):
+        self.lcd.backlight = value
+
+    def clear(self):
+        # Only blanks the framebuffer, the next message (or flush) sends the difference
+        for row in self.target:
+            for i in range(self.columns):
+                row[i] = 32
+        self._message = ""
+        if not self.auto_flush:
+            self._wake.set()
+
+    @property
+    def message(self):
+        return self._message
+
+    @message.setter
+    def message(self, message: str):
+        # Like the LCD: starts at (0, 0), "\n" goes to the start of the next line
+        self._message = message
+        row, column = 0, 0
+        for character in message:
+            if character == "\n":
+                row += 1
+                column = 0
+            elif row < self.rows and column < self.columns:
+                self.target[row][column] = ord(character) if ord(character) < 256 else 63  # "?"
+                column += 1
+        if self.auto_flush:
+            self.flush()
+        else:
+            self._wake.set()
+
+    def flush(self):
+        changed = 0
+        blank = True
+        for row in range(self.rows):
+            target = self.target[row]
+            shown = self.shown[row]
+            for i in range(self.columns):
+                if target[i] != shown[i]:
+                    changed += 1
+                if target[i] != 32:
+                    blank = False
+        if changed == 0:
+            return
+        if blank and changed > 2:
+            # One clear command is cheaper than blanking the cells one by one
+            self.lcd.clear()
+            self.writes += 1
+            self.cursor = None
+            for row in self.shown:
+                for i in range(self.columns):
+                    row[i] = 32
+            return
+
+        for row in range(self.rows):
+            target = self.target[row]
+            shown = self.shown[row]
+            column = 0
+            while column < self.columns:
+                if target[column] == shown[column]:
+                    column += 1
+                    continue
+                if self.cursor != (column, row):
+                    self.lcd._write8(_LCD_SETDDRAMADDR | (column + _LCD_ROW_OFFSETS[row]))
+                    self.writes += 1
+                # Write the run, a single unchanged cell in between costs as much as a cursor move
+                while column < self.columns and (target[column] != shown[column] or (column + 1 < self.columns and target[column + 1] != shown[column + 1])):
+                    self.lcd._write8(target[column], True)
+                    self.writes += 1
+                    shown[column] = target[column]
+                    column += 1
+                self.cursor = (column, row)
+
+    async def run(self):
+        # Render task: flushes once for every (batch of) new message(s)
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            self.flush()
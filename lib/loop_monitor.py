@@ -0,0 +1,81 @@
+import time
+import asyncio
+
+# -------------
+# Loop Monitor
+# -------------
+# Shows that the tasks of an asyncio program share the loop. run() asks to wake
+# up every `period` seconds, how much later it really wakes up (loop lag) is the
+# time another task held the loop without awaiting. A lag above `budget_ms`
+# means some task blocked too long.
+#
+# Blocking calls (I2C, MQTT socket, ...) are wrapped in timed(name), so a lag
+# can be pinned on the part of the program that caused it:
+#
+#     with monitor.timed("nfc"):
+#         session.read_blocks(...)
+
+
+class _Section:
+    def __init__(self, monitor, name: str):
+        self.monitor = monitor
+        self.name = name
+        self.started = 0
+
+    def __enter__(self):
+        self.started = time.monotonic_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.monitor.record(self.name, (time.monotonic_ns() - self.started) // 1000000)
+        return False
+
+
+class LoopMonitor:
+    def __init__(self, budget_ms: int = 50, period: float = 0.01, report_every: float = 60):
+        self.budget_ms = budget_ms
+        self.period = period
+        self.report_every = report_every  # seconds between [LOOP] reports, 0 = never
+        self.samples = 0
+        self.over = 0  # samples with a lag above the budget
+        self.lag_total = 0
+        self.lag_max = 0
+        self.sections = {}  # name: [count, total ms, max ms]
+        self.slowest = None  # (name, ms) of the last section over the budget
+
+    def timed(self, name: str):
+        return _Section(self, name)
+
+    def record(self, name: str, ms: int):
+        if name not in self.sections:
+            self.sections[name] = [0, 0, 0]
+        section = self.sections[name]
+        section[0] += 1
+        section[1] += ms
+        section[2] = max(section[2], ms)
+        if ms > self.budget_ms:
+            self.slowest = (name, ms)
+            print(f"[LOOP] {name} blocked the loop for {ms} ms (budget {self.budget_ms} ms)")
+
+    def report(self):
+        average = self.lag_total // self.samples if self.samples else 0
+        sections = " ; ".join([f"{name} max {section[2]} ms ({section[0]}x)" for name, section in self.sections.items()])
+        return f"lag avg {average} ms / max {self.lag_max} ms, {self.over}/{self.samples} over the {self.budget_ms} ms budget" + (f" ; {sections}" if sections else "")
+
+    async def run(self):
+        period_ms = int(self.period * 1000)
+        reported = time.monotonic()
+        while True:
+            started = time.monotonic_ns()
+            await asyncio.sleep(self.period)
+            lag = max(0, (time.monotonic_ns() - started) // 1000000 - period_ms)
+            self.samples += 1
+            self.lag_total += lag
+            self.lag_max = max(self.lag_max, lag)
+            if lag > self.budget_ms:
+                self.over += 1
+                blamed = f", last slow section: {self.slowest[0]} ({self.slowest[1]} ms)" if self.slowest else ""
+                print(f"[LOOP] Loop lag {lag} ms (budget {self.budget_ms} ms){blamed}")
+            if self.report_every and time.monotonic() - reported >= self.report_every:
+                reported = time.monotonic()
+                print(f"[LOOP] {self.report()}")
@@ -0,0 +1,90 @@
+import time
+
+# -------------
+# MQTT Keepalive
+# -------------
+# service() runs the MQTT loop (which also sends the keepalive pings) from the
+# MQTT task, in every state of the program. When the connection is gone it
+# reconnects (resubscribing the feeds) with a growing wait between the attempts
+# (`backoff`, 2x, 4x, ... up to `max_backoff` seconds) and keeps how long every
+# reconnect took.
+#
+# The program tells which state it is in with enter(state). The old firmware
+# never serviced MQTT in the `unserviced` states (menu, input prompts), so a
+# broker drops the scanner once such a state lasts longer than 1.5x the
+# keepalive. Every time that happens now without a reconnect counts as an
+# avoided reconnect.
+class MqttKeepalive:
+    def __init__(self, mqtt_client, backoff: float = 1, max_backoff: float = 30, unserviced=("menu", "prompt")):
+        self.mqtt_client = mqtt_client
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.unserviced = unserviced
+        self.connected = True
+        self.delay = backoff
+        self.next_try = 0
+        self.state = None
+        self.state_since = time.monotonic()
+        self.state_reconnects = 0  # reconnects since entering the state
+        self.reconnects = 0
+        self.failed = 0  # reconnect attempts that didn't work
+        self.reconnect_ms_total = 0
+        self.reconnect_ms_max = 0
+        self.avoided = 0
+
+    def enter(self, state: str):
+        if state == self.state:
+            return
+        now = time.monotonic()
+        # Brokers drop a client after 1.5x its keepalive without any packet
+        limit = 1.5 * getattr(self.mqtt_client, "keep_alive", 60)
+        if self.state in self.unserviced and now - self.state_since > limit and self.state_reconnects == 0:
+            self.avoided += 1
+        self.state = state
+        self.state_since = now
+        self.state_reconnects = 0
+
+    def lost(self):
+        # on_disconnect or a failed loop/publish
+        if self.connected:
+            print("[MQTT] Connection lost")
+        self.connected = False
+
+    def service(self):
+        # Returns True while connected
+        if self.connected:
+            try:
+                self.mqtt_client.loop()
+                return True
+            except Exception as error:
+                print(f"[MQTT] Loop failed: {error}")
+                self.lost()
+                self.next_try = 0
+                self.delay = self.backoff
+
+        now = time.monotonic()
+        if now < self.next_try:
+            return False
+        started = time.monotonic_ns()
+        try:
+            self.mqtt_client.reconnect()  # also subscribes to the feeds again
+        except Exception as error:
+            self.failed += 1
+            self.next_try = now + self.delay
+            print(f"[MQTT] Reconnect failed ({error}), next try in {self.delay} s")
+            self.delay = min(self.delay * 2, self.max_backoff)
+            return False
+        ms = (time.monotonic_ns() - started) // 1000000
+        self.connected = True
+        self.delay = self.backoff
+        self.reconnects += 1
+        self.state_reconnects += 1
+        self.reconnect_ms_total += ms
+        self.reconnect_ms_max = max(self.reconnect_ms_max, ms)
+        print(f"[MQTT] Reconnected in {ms} ms")
+
+        return True
+
+    def stats(self):
+        average = self.reconnect_ms_total // self.reconnects if self.reconnects else 0
+        return f"{self.reconnects} reconnects (avg {average} ms / max {self.reconnect_ms_max} ms), {self.failed} failed attempts, {self.avoided} reconnects avoided"
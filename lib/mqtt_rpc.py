@@ -0,0 +1,105 @@
+import time, json
+
+# -------------
+# MQTT Request/Response
+# -------------
+# Every request gets a correlation id ("<client id>-<counter>") and the topic
+# the reply has to go to. The backend copies "id" into its reply and publishes
+# it on "reply", so every scanner only listens to its own replies.
+# - a request that doesn't get a reply is published again with the same id
+#   after `backoff`, 2x`backoff`, 4x`backoff`, ... (at most `retries` times)
+# - after `deadline` seconds it is given up and reported by service()
+# - replies without an id (older backend) are only accepted on our own reply
+#   feed and while exactly one request is pending, they can't be matched
+#   otherwise. On the shared feed it could be the reply for another scanner
+#
+# By default a request is the `data` dict as JSON with "id" and "reply" added.
+# `encode(request_id, reply_topic, data)` builds the payload itself instead
+# (e.g. PayloadEncoder.checkcard, then `data` can be anything).
+# `check(data)` is asked before a reply is taken: False ignores it (it doesn't
+# answer the request, the request keeps waiting for a good one).
+class MqttRpc:
+    def __init__(self, mqtt_client, request_topic: str, reply_topic: str, client_id: str, deadline: float = 5, retries: int = 2, backoff: float = 0.5, max_pending: int = 4, encode=None, check=None):
+        self.mqtt_client = mqtt_client
+        self.encode = encode
+        self.check = check
+        self.request_topic = request_topic
+        self.reply_topic = reply_topic
+        self.client_id = client_id
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.max_pending = max_pending
+        self.pending = {}  # id -> [payload, context, deadline, next_retry, attempt, sent]
+        self.counter = 0
+        self.stats = {"sent": 0, "retried": 0, "replied": 0, "expired": 0, "ignored": 0}
+
+    def request(self, data, context=None):
+        # Publishes the request and returns its id, `context` comes back with the reply
+        if len(self.pending) >= self.max_pending:
+            # Drop the oldest request, its reply can't matter anymore
+            oldest = min(self.pending, key=lambda i: self.pending[i][5])
+            del self.pending[oldest]
+            self.stats["expired"] += 1
+        self.counter += 1
+        request_id = f"{self.client_id}-{self.counter}"
+        if self.encode:
+            payload = self.encode(request_id, self.reply_topic, data)
+        else:
+            data["id"] = request_id
+            data["reply"] = self.reply_topic
+            payload = json.dumps(data)
+        now = time.monotonic()
+        self.pending[request_id] = [payload, context, now + self.deadline, now + self.backoff, 0, now]
+        self.mqtt_client.publish(self.request_topic, payload)
+        self.stats["sent"] += 1
+
+        return request_id
+
+    def handle(self, topic: str, message: str):
+        # Returns (id, context, reply data, seconds) when the message answers one of our requests
+        if not self.pending:
+            return None
+        try:
+            data = json.loads(message)
+        except ValueError:
+            return None
+        if not isinstance(data, dict):
+            return None  # valid JSON, but a list, number or string is no reply
+        request_id = data.get("id")
+        if request_id is not None and not isinstance(request_id, str):
+            return None
+        if request_id is None and topic == self.reply_topic and len(self.pending) == 1:
+            request_id = next(iter(self.pending))
+        if request_id not in self.pending or (self.check and not self.check(data)):
+            self.stats["ignored"] += 1
+            return None
+        payload, context, deadline, next_retry, attempt, sent = self.pending.pop(request_id)
+        self.stats["replied"] += 1
+
+        return request_id, context, data, time.monotonic() - sent
+
+    def service(self, send: bool = True):
+        # Retries requests that are due and returns [(id, context), ...] of expired ones.
+        # send=False (no connection) only checks the deadlines.
+        expired = []
+        if not self.pending:
+            return expired
+        now = time.monotonic()
+        for request_id in list(self.pending):
+            request = self.pending[request_id]
+            payload, context, deadline, next_retry, attempt, sent = request
+            if now >= deadline:
+                del self.pending[request_id]
+                self.stats["expired"] += 1
+                expired.append((request_id, context))
+            elif send and now >= next_retry and attempt < self.retries:
+                request[4] = attempt + 1
+                request[3] = now + self.backoff * 2**(attempt + 1)
+                self.mqtt_client.publish(self.request_topic, payload)
+                self.stats["retried"] += 1
+
+        return expired
+
+    def waiting(self, request_id: str):
+        return request_id in self.pending
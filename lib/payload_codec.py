@@ -0,0 +1,225 @@
+import json
+
+# -------------
+# Payload Codec
+# -------------
+# Builds the MQTT payloads of the devices instead of str({...}).replace("'", '"')
+# (a dict, its repr and the replaced copy per message, and a quote in a value
+# broke the JSON).
+#
+# Two formats:
+# - JSON (default, what Adafruit IO and the backend read): compact and escaped,
+#   one formatted str per message (MiniMQTT encodes it). A value is only run
+#   through json.dumps when it holds a quote, a backslash or a control character
+# - binary: written into one reusable buffer, first byte = FORMAT_VERSION << 4 |
+#   message type, then the fields. Strings are length prefixed (1 byte, so at
+#   most MAX_STR bytes, a longer one raises ValueError), IPs are 4 bytes,
+#   numbers big-endian.
+#     checkcard:   flags (1 = queued, 2 = time), id, reply, uid (raw bytes), pass, ip[, time (4)]
+#     action:      id, user (4), action (1), door_ip
+#     lock.status: door_ip, status (1), age_ms (2, max 65535)
+#
+# DecodePayload() reads both formats back into the same dict the JSON has.
+#
+# CheckcardSize() gives the binary buffer for the longest checkcard a device
+# sends, create the encoder with it so only the final bytes are allocated per
+# message. A message that still doesn't fit (longer pass or topic than planned)
+# makes the buffer grow once instead of failing.
+FORMAT_VERSION = 1
+TYPE_CHECKCARD = 1
+TYPE_ACTION = 2
+TYPE_LOCK_STATUS = 3
+MAX_STR = 255  # longest string of the binary format, in bytes
+
+_HEADROOM = 64  # fixed fields (flags, numbers, IPs) written between two strings
+
+
+def CheckcardSize(pass_length: int, topic_length: int = 64, id_length: int = 32):
+    # Worst case: every character of pass, reply topic and id 4 bytes of UTF-8
+    return _HEADROOM + 4 * (pass_length + topic_length + id_length)
+
+
+def _Text(text: str):
+    # Contents of a JSON string: as it is, unless something in it has to be escaped
+    if '"' in text or "\\" in text or (text and min(text) < " "):
+        return json.dumps(text)[1:-1]
+    return text
+
+
+_UID_FORMATS = {}  # UID length: "[%d.%d.%d.%d]"
+
+
+def _UidText(uid):
+    # Same text as before: [4.213.6.90], one format string per UID length
+    form = _UID_FORMATS.get(len(uid))
+    if form is None:
+        form = _UID_FORMATS[len(uid)] = "[" + ".".join(["%d"] * len(uid)) + "]"
+    return form % tuple(uid)
+
+
+class PayloadEncoder:
+    def __init__(self, binary: bool = False, size: int = 192):
+        self.binary = binary
+        self.buffer = bytearray(size if binary else 0)  # only the binary format uses it
+        self.view = memoryview(self.buffer)
+        self.length = 0
+        self._ip_text = None  # last IP parsed for the binary format
+        self._ip_bytes = bytearray(4)
+
+    # Binary writers
+    def _byte(self, value: int):
+        self.buffer[self.length] = value
+        self.length += 1
+
+    def _reserve(self, count: int):
+        # Grows the buffer when `count` bytes (+ the fixed fields after them) don't fit
+        needed = self.length + count + _HEADROOM
+        if needed > len(self.buffer):
+            buffer = bytearray(max(needed, 2 * len(self.buffer)))
+            buffer[:self.length] = self.view[:self.length]
+            self.buffer = buffer
+            self.view = memoryview(buffer)
+
+    def _raw(self, data):
+        self._reserve(len(data))
+        end = self.length + len(data)
+        self.view[self.length:end] = data
+        self.length = end
+
+    def _bin_str(self, text):
+        # `text` is str or bytes, the length byte in front of it
+        data = text.encode("utf-8") if isinstance(text, str) else text
+        if len(data) > MAX_STR:
+            raise ValueError(f"{len(data)} bytes is too long for the binary format (max {MAX_STR})")
+        self._reserve(len(data) + 1)
+        self._byte(len(data))
+        self._raw(data)
+
+    def _bin_ip(self, ip):
+        if not ip:
+            self._raw(b"\x00\x00\x00\x00")
+            return
+        if ip != self._ip_text:
+            parts = ip.split(".")
+            for i in range(4):
+                self._ip_bytes[i] = int(parts[i])
+            self._ip_text = ip
+        self._raw(self._ip_bytes)
+
+    def _bin_int(self, value: int, size: int):
+        for shift in range(8 * (size - 1), -8, -8):
+            self._byte((value >> shift) & 0xFF)
+
+    def _start(self, message_type: int):
+        self.length = 0
+        self._reserve(0)
+        self._byte(FORMAT_VERSION << 4 | message_type)
+
+    def _finish(self):
+        return bytes(self.view[:self.length])
+
+    # Messages (str for JSON, bytes for binary)
+    def checkcard(self, uid, card_pass, ip: str, request_id: str = None, reply: str = None):
+        if self.binary:
+            self._start(TYPE_CHECKCARD)
+            self._byte(0)
+            self._bin_str(request_id or "")
+            self._bin_str(reply or "")
+            self._bin_str(uid)
+            self._bin_str(card_pass)
+            self._bin_ip(ip)
+            return self._finish()
+        if request_id is not None and reply is not None:
+            return f'{{"uid":"{_UidText(uid)}","pass":"{_Text(card_pass)}","ip":"{_Text(ip)}","id":"{_Text(request_id)}","reply":"{_Text(reply)}"}}'
+        text = f'{{"uid":"{_UidText(uid)}","pass":"{_Text(card_pass)}","ip":"{_Text(ip)}"'
+        if request_id is not None:
+            text += f',"id":"{_Text(request_id)}"'
+        if reply is not None:
+            text += f',"reply":"{_Text(reply)}"'
+        return text + "}"
+
+    def queued_tap(self, uid, ip: str, tapped: int):
+        # A tap kept on flash while offline: UID, scanner IP and time, never the pass
+        if self.binary:
+            self._start(TYPE_CHECKCARD)
+            self._byte(3)
+            self._bin_str("")
+            self._bin_str("")
+            self._bin_str(uid)
+            self._bin_str("")
+            self._bin_ip(ip)
+            self._bin_int(tapped, 4)
+            return self._finish()
+        return f'{{"uid":"{_UidText(uid)}","ip":"{_Text(ip)}","queued":1,"time":{int(tapped)}}}'
+
+    def action(self, request_id: str, user: int, action: int, door_ip: str = None):
+        if self.binary:
+            self._start(TYPE_ACTION)
+            self._bin_str(request_id or "")
+            self._bin_int(user, 4)
+            self._byte(action)
+            self._bin_ip(door_ip)
+            return self._finish()
+        if door_ip:
+            return f'{{"id":"{_Text(request_id)}","user":{int(user)},"action":{int(action)},"door_ip":"{_Text(door_ip)}"}}'
+        return f'{{"id":"{_Text(request_id)}","user":{int(user)},"action":{int(action)},"door_ip":0}}'
+
+    def lock_status(self, door_ip: str, status: int, age_ms: int = 0):
+        if self.binary:
+            self._start(TYPE_LOCK_STATUS)
+            self._bin_ip(door_ip)
+            self._byte(status)
+            self._bin_int(min(age_ms, 0xFFFF), 2)
+            return self._finish()
+        return f'{{"door_ip":"{_Text(door_ip)}","status":{int(status)},"age_ms":{int(age_ms)}}}'
+
+
+# Decoding (backend side, or to check a payload)
+def _read_str(data, offset: int):
+    end = offset + 1 + data[offset]
+    return bytes(data[offset + 1:end]), end
+
+
+def _read_ip(data, offset: int):
+    ip = data[offset:offset + 4]
+    return (".".join([str(x) for x in ip]) if any(ip) else 0), offset + 4
+
+
+def DecodePayload(data):
+    # JSON or binary payload -> dict (same keys as the JSON), ValueError if it's neither
+    if isinstance(data, str):
+        return json.loads(data)
+    if data[:1] == b"{":
+        return json.loads(data.decode("utf-8"))
+    if not data or data[0] >> 4 != FORMAT_VERSION:
+        raise ValueError("unknown payload format")
+    message_type = data[0] & 0x0F
+    if message_type == TYPE_CHECKCARD:
+        flags = data[1]
+        request_id, offset = _read_str(data, 2)
+        reply, offset = _read_str(data, offset)
+        uid, offset = _read_str(data, offset)
+        card_pass, offset = _read_str(data, offset)
+        ip, offset = _read_ip(data, offset)
+        result = {"uid": "[" + ".".join([str(x) for x in uid]) + "]", "ip": ip}
+        if flags & 1:
+            result["queued"] = 1
+        else:
+            result["pass"] = card_pass.decode("utf-8")
+        if flags & 2:
+            result["time"] = int.from_bytes(data[offset:offset + 4], "big")
+        if request_id:
+            result["id"] = request_id.decode("utf-8")
+        if reply:
+            result["reply"] = reply.decode("utf-8")
+        return result
+    if message_type == TYPE_ACTION:
+        request_id, offset = _read_str(data, 1)
+        user = int.from_bytes(data[offset:offset + 4], "big")
+        action = data[offset + 4]
+        door_ip, offset = _read_ip(data, offset + 5)
+        return {"id": request_id.decode("utf-8"), "user": user, "action": action, "door_ip": door_ip}
+    if message_type == TYPE_LOCK_STATUS:
+        door_ip, offset = _read_ip(data, 1)
+        return {"door_ip": door_ip, "status": data[offset], "age_ms": int.from_bytes(data[offset + 1:offset + 3], "big")}
+    raise ValueError(f"unknown message type {message_type}")
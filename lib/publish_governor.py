@@ -0,0 +1,193 @@
+import time, json
+
+# -------------
+# Publish Governor
+# -------------
+# Adafruit IO throttles an account that publishes too much (30 data points a
+# minute on a free account), shared by every scanner and lock. Every publish
+# goes through a token bucket of `rate` messages a minute with room for `burst`
+# at once, in three priority classes:
+# - COMMAND: door open commands, always first in line
+# - REQUEST: scanner.checkcard, someone is waiting for it
+# - TELEMETRY: everything else (lock.status, errors, ...). Sent straight away
+#   while the bucket holds more than `reserve` tokens, otherwise it is batched
+#   into one group feed message per group ({"feeds": {"status": ...}} on
+#   <user>/groups/lock) after `batch_after` seconds. A newer value for the same
+#   feed replaces the batched one. Binary payloads (lib/payload_codec.py) can't
+#   go into a JSON group message, they wait in the queue instead.
+#
+# When the broker says it throttles us (<user>/throttle) the rate is halved,
+# it goes back up step by step after `recover_after` quiet seconds.
+#
+# publish(topic, payload) works like mqtt_client.publish, so the governor can be
+# handed to anything that publishes (MqttRpc, EventQueue, ...). It returns True
+# if the message was sent now, False if it waits for service().
+#
+# With an EventQueue (flash) behind it:
+# - new events go through hand_over(): the governor keeps them (sent, queued or
+#   batched), nothing is written to flash while connected
+# - events from flash go through send_now(): only what is really sent is acked
+# - when the connection drops, unsent() gives back the telemetry still waiting
+#   here, so it can go to flash instead of being lost
+COMMAND = 0
+REQUEST = 1
+TELEMETRY = 2
+
+
+class PublishGovernor:
+    def __init__(self, mqtt_client, aio_user: str, rate: float = 30, burst: int = 5, reserve: int = 1, batch_after: float = 2, min_rate: float = 2, recover_after: float = 60, max_queue: int = 16, priorities=()):
+        self.mqtt_client = mqtt_client
+        self.feed_prefix = aio_user + "/feeds/"
+        self.group_prefix = aio_user + "/groups/"
+        self.base_rate = rate / 60  # tokens a second
+        self.rate = self.base_rate
+        self.min_rate = min_rate / 60
+        self.burst = burst
+        self.reserve = reserve  # tokens TELEMETRY leaves for commands and requests
+        self.batch_after = batch_after
+        self.recover_after = recover_after
+        self.max_queue = max_queue
+        self.priorities = priorities  # ((topic prefix, class), ...), first match wins, else TELEMETRY
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.changed = self.updated  # last change of the rate
+        self.queue = []  # [(priority, topic, payload), ...] sorted by priority, oldest first
+        self.batches = {}  # group: {feed: (topic, payload)}
+        self.batch_since = 0
+        self.stats = {"sent": 0, "queued": 0, "batched": 0, "coalesced": 0, "dropped": 0, "throttled": 0}
+
+    def priority_of(self, topic: str):
+        for prefix, priority in self.priorities:
+            if topic.startswith(prefix):
+                return priority
+        return TELEMETRY
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.rate < self.base_rate and now - self.changed >= self.recover_after:
+            self.rate = min(self.base_rate, self.rate + self.base_rate / 4)
+            self.changed = now
+            print(f"[MQTT] Publish rate back up to {self.rate * 60:.0f}/min")
+        return now
+
+    def _send(self, topic: str, payload: str):
+        self.mqtt_client.publish(topic, payload)
+        self.tokens -= 1
+        self.stats["sent"] += 1
+        return True
+
+    def publish(self, topic: str, payload: str):
+        priority = self.priority_of(topic)
+        self._refill()
+        if priority == TELEMETRY:
+            if not self.queue and not self.batches and self.tokens >= self.reserve + 1:
+                return self._send(topic, payload)
+            self._batch(topic, payload)
+            return False
+        # Commands and requests may use the reserve, but don't pass anything more important
+        if self.tokens >= 1 and not [item for item in self.queue if item[0] <= priority]:
+            return self._send(topic, payload)
+        self._enqueue(priority, topic, payload)
+        return False
+
+    def hand_over(self, topic: str, payload: str):
+        # publish() for the caller that lets go of the message: always True, the
+        # governor sends it (or batches it into its group feed) when it can
+        self.publish(topic, payload)
+        return True
+
+    def send_now(self, topic: str, payload: str):
+        # Like publish(), but a message that can't go out right now is not kept:
+        # False and the caller still has it (the flash queue only acks what was sent)
+        priority = self.priority_of(topic)
+        self._refill()
+        if priority == TELEMETRY:
+            if self.queue or self.batches or self.tokens < self.reserve + 1:
+                return False
+        elif self.tokens < 1 or [item for item in self.queue if item[0] <= priority]:
+            return False
+        return self._send(topic, payload)
+
+    def _enqueue(self, priority: int, topic: str, payload: str):
+        index = len(self.queue)
+        while index > 0 and self.queue[index - 1][0] > priority:
+            index -= 1
+        self.queue.insert(index, (priority, topic, payload))
+        self.stats["queued"] += 1
+        if len(self.queue) > self.max_queue:
+            # The newest message of the lowest class goes
+            self.queue.pop()
+            self.stats["dropped"] += 1
+
+    def _batch(self, topic: str, payload):
+        if isinstance(payload, bytes):
+            if payload[:1] != b"{":
+                self._enqueue(TELEMETRY, topic, payload)
+                return
+            payload = payload.decode("utf-8")
+        key = topic[len(self.feed_prefix):] if topic.startswith(self.feed_prefix) else topic
+        group, feed = key.split(".", 1) if "." in key else ("default", key)
+        if not self.batches:
+            self.batch_since = time.monotonic()
+        batch = self.batches.setdefault(group, {})
+        if feed in batch:
+            self.stats["coalesced"] += 1
+        batch[feed] = (topic, payload)
+        self.stats["batched"] += 1
+
+    def unsent(self, topics=None):
+        # Takes the telemetry that is still waiting out of the governor: [(topic, payload), ...]
+        # (e.g. to put it in the flash queue when the connection drops). Only `topics` when given.
+        taken = []
+        for group in list(self.batches):
+            for feed, (topic, payload) in list(self.batches[group].items()):
+                if topics is None or topic in topics:
+                    taken.append((topic, payload))
+                    del self.batches[group][feed]
+            if not self.batches[group]:
+                del self.batches[group]
+        for item in list(self.queue):
+            if item[0] == TELEMETRY and (topics is None or item[1] in topics):
+                taken.append(item[1:])
+                self.queue.remove(item)
+        return taken
+
+    def throttled(self, message: str = ""):
+        # Call when the broker reports throttling (<user>/throttle)
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = min(self.tokens, 0)
+        self.changed = time.monotonic()
+        self.stats["throttled"] += 1
+        print(f"[MQTT] Throttled, publishing at {self.rate * 60:.0f}/min from now on: {message}")
+
+    def idle(self):
+        # True when a new message would go out straight away
+        self._refill()
+        return not self.queue and not self.batches and self.tokens >= self.reserve + 1
+
+    def service(self):
+        # Call regularly (while connected): sends what the bucket allows, most important first
+        now = self._refill()
+        while self.queue and self.tokens >= 1:
+            priority, topic, payload = self.queue[0]
+            try:
+                self._send(topic, payload)
+            except Exception as error:
+                print(f"[MQTT] Publish failed ({error})")
+                return
+            self.queue.pop(0)
+        if self.batches and not self.queue and now - self.batch_since >= self.batch_after:
+            for group in list(self.batches):
+                if self.tokens < self.reserve + 1:
+                    break
+                try:
+                    self._send(self.group_prefix + group, json.dumps({"feeds": {feed: payload for feed, (topic, payload) in self.batches[group].items()}}))
+                except Exception as error:
+                    print(f"[MQTT] Publish failed ({error})")
+                    return
+                del self.batches[group]
+
+    def report(self):
+        return f"{self.rate * 60:.0f}/min, {self.tokens:.1f} tokens, {len(self.queue)} queued, {len(self.batches)} group batches ; " + ", ".join([f"{name} {count}" for name, count in self.stats.items()])
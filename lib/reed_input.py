@@ -0,0 +1,58 @@
+import asyncio
+import keypad
+import supervisor
+from digitalio import DigitalInOut
+
+# -------------
+# Reed Input
+# -------------
+# Watches the reed contact with keypad.Keys, which scans the pin in the
+# background every `interval` seconds and queues every edge with a timestamp.
+# A new state only counts once it stayed the same for `debounce_ms`, shorter
+# bounces are dropped. on_change(value, age_ms) gets the new pin value and how
+# long ago (ms) the edge happened, so the publisher can send the real time of
+# the change instead of the time it got noticed.
+_TICKS_PERIOD = 1 << 29
+
+
+def TicksDiff(later: int, earlier: int):
+    return (later - earlier) % _TICKS_PERIOD
+
+
+class ReedInput:
+    def __init__(self, pin, debounce_ms: int = 30, interval: float = 0.005, pull: bool = False):
+        # Read the starting state before keypad takes the pin over
+        reed = DigitalInOut(pin)
+        self.value = reed.value
+        reed.deinit()
+        # keypad only reports edges, "pressed" = the pin reads True
+        self.keys = keypad.Keys((pin,), value_when_pressed=True, pull=pull, interval=interval)
+        self.event = keypad.Event()
+        self.debounce_ms = debounce_ms
+        self.changes = 0
+        self.bounces = 0
+
+    async def run(self, on_change, step: float = 0.01):
+        candidate = None  # (value, timestamp) of an edge that still has to settle
+        while True:
+            while self.keys.events.get_into(self.event):
+                value = self.event.pressed
+                if value == self.value:
+                    # Went back before it settled
+                    if candidate is not None:
+                        self.bounces += 1
+                    candidate = None
+                else:
+                    candidate = (value, self.event.timestamp)
+
+            nap = step
+            if candidate is not None:
+                settled = TicksDiff(supervisor.ticks_ms(), candidate[1])
+                if settled >= self.debounce_ms:
+                    self.value = candidate[0]
+                    self.changes += 1
+                    on_change(self.value, settled)
+                    candidate = None
+                else:
+                    nap = min(nap, (self.debounce_ms - settled) / 1000)
+            await asyncio.sleep(nap)